@@ -1,5 +1,8 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from .models import Usuario, Aluno, Turma, Mensalidade
 
 
@@ -24,6 +27,7 @@ class AlunoAdmin(admin.ModelAdmin):
     list_filter = ['ativo', 'data_cadastro']
     search_fields = ['nome', 'documento', 'nome_pai', 'nome_mae']
     readonly_fields = ['data_cadastro']
+    change_list_template = 'admin/escola/aluno/change_list.html'
     fieldsets = (
         ('Informações Pessoais', {
             'fields': ('nome', 'documento', 'data_nascimento', 'foto')
@@ -43,6 +47,67 @@ class AlunoAdmin(admin.ModelAdmin):
         }),
     )
 
+    # Quantidade máxima de erros exibidos na página de importação
+    limite_erros_importacao = 200
+
+    def get_urls(self):
+        urls = [
+            path(
+                'importar/',
+                self.admin_site.admin_view(self.importar_view),
+                name='escola_aluno_importar',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def importar_view(self, request):
+        """Importa alunos de uma planilha CSV/XLSX em lote"""
+        from .importacao import ArquivoInvalido, abrir_planilha, importar_alunos
+
+        if not self.has_add_permission(request):
+            return redirect('admin:escola_aluno_changelist')
+
+        erros = []
+        resultado = None
+
+        def registrar(erro):
+            if len(erros) < self.limite_erros_importacao:
+                erros.append(erro)
+
+        if request.method == 'POST' and request.FILES.get('arquivo'):
+            arquivo = request.FILES['arquivo']
+            formato = request.POST.get('formato', 'auto')
+            try:
+                resultado = importar_alunos(
+                    abrir_planilha(arquivo, formato),
+                    formato=formato,
+                    nome_arquivo=arquivo.name,
+                    registrar_erro=registrar,
+                    simular=request.POST.get('simular') == 'on',
+                )
+            except ArquivoInvalido as e:
+                self.message_user(request, str(e), messages.ERROR)
+            else:
+                if not resultado.simulacao:
+                    self.message_user(request, f'{resultado.criados} aluno(s) importado(s).', messages.SUCCESS)
+                if resultado.erros:
+                    self.message_user(request, f'{resultado.erros} linha(s) com erro.', messages.WARNING)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar alunos',
+            'resultado': resultado,
+            'erros': erros,
+            'limite_erros': self.limite_erros_importacao,
+        }
+        return TemplateResponse(request, 'admin/escola/aluno/importar.html', context)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Usa a busca indexada em vez de icontains em cada campo de search_fields"""
+        from .busca import buscar_alunos
+        return buscar_alunos(queryset, search_term), False
+
 
 @admin.register(Turma)
 class TurmaAdmin(admin.ModelAdmin):
@@ -75,7 +140,7 @@ class MensalidadeAdmin(admin.ModelAdmin):
     date_hierarchy = 'vencimento'
     fieldsets = (
         ('Informações da Mensalidade', {
-            'fields': ('aluno', 'valor', 'vencimento', 'status')
+            'fields': ('aluno', 'valor', 'vencimento', 'status', 'turma')
         }),
         ('Pagamento', {
             'fields': ('data_pagamento', 'observacoes')
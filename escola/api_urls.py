@@ -1,12 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .api_views import UsuarioViewSet, AlunoViewSet, TurmaViewSet, MensalidadeViewSet
+from .api_views import UsuarioViewSet, AlunoViewSet, TurmaViewSet, MensalidadeViewSet, RelatorioFinanceiroViewSet
 
 router = DefaultRouter()
 router.register(r'usuarios', UsuarioViewSet, basename='usuario')
 router.register(r'alunos', AlunoViewSet, basename='aluno')
 router.register(r'turmas', TurmaViewSet, basename='turma')
 router.register(r'mensalidades', MensalidadeViewSet, basename='mensalidade')
+router.register(r'relatorios/financeiro', RelatorioFinanceiroViewSet, basename='relatorio-financeiro')
 
 urlpatterns = [
     path('', include(router.urls)),
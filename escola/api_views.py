@@ -1,20 +1,108 @@
-from rest_framework import viewsets, permissions, filters
+from rest_framework import viewsets, permissions, filters, serializers
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Usuario, Aluno, Turma, Mensalidade
 from .serializers import (
     UsuarioSerializer, AlunoSerializer, TurmaSerializer,
-    TurmaSimpleSerializer, MensalidadeSerializer, MensalidadeSimpleSerializer
+    TurmaSimpleSerializer, MensalidadeSerializer, MensalidadeSimpleSerializer,
+    AlteracaoStatusEmLoteSerializer, RelatorioMensalSerializer, campos_solicitados
 )
 
 
+class PlanoDeConsultaMixin:
+    """
+    Aplica select_related/prefetch_related/only() de acordo com a action.
+
+    Cada viewset declara em planos_de_consulta o que cada action precisa;
+    a chave 'default' vale para as actions sem plano próprio. Assim cada
+    endpoint executa um número fixo de queries por página.
+    """
+    planos_de_consulta = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        plano = self.planos_de_consulta.get(self.action, self.planos_de_consulta.get('default', {}))
+        if plano.get('select_related'):
+            queryset = queryset.select_related(*plano['select_related'])
+        if plano.get('prefetch_related'):
+            queryset = queryset.prefetch_related(*plano['prefetch_related'])
+        if plano.get('only'):
+            queryset = queryset.only(*plano['only'])
+
+        colunas = self.colunas_solicitadas(queryset.model)
+        if colunas:
+            # Só colunas simples foram pedidas: relacionamentos não são lidos
+            queryset = queryset.select_related(None).prefetch_related(None).only(*colunas)
+        return queryset
+
+    def colunas_solicitadas(self, model):
+        """
+        Colunas do model necessárias para os campos pedidos em ?fields=.
+
+        Retorna None quando não há ?fields= ou quando algum campo pedido não
+        corresponde a uma coluna do próprio model (campos calculados,
+        aninhados ou com source pontuado), caso em que o plano fica intacto.
+        """
+        if self.action not in ('list', 'retrieve') or not campos_solicitados(self.request):
+            return None
+
+        colunas = []
+        for campo in self.get_serializer().fields.values():
+            if isinstance(campo, (serializers.SerializerMethodField, serializers.BaseSerializer)):
+                return None
+            if campo.source == '*' or '.' in campo.source:
+                return None
+            try:
+                campo_model = model._meta.get_field(campo.source)
+            except FieldDoesNotExist:
+                return None
+            if not campo_model.concrete or campo_model.many_to_many:
+                return None
+            colunas.append(campo_model.name)
+        return colunas
+
+
+class BuscaAlunosFilter(filters.SearchFilter):
+    """
+    ?search= dos alunos usando a busca indexada (veja busca.buscar_alunos).
+
+    Sem ?ordering= explícito, os resultados mais relevantes vêm primeiro.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        from .busca import ORDENACAO_RELEVANCIA, buscar_alunos
+
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        queryset = buscar_alunos(queryset, query)
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by(*ORDENACAO_RELEVANCIA)
+        return queryset
+
+
+def resposta_exportacao_api(request, queryset, colunas, nome):
+    """Exportação em streaming usada pelas actions exportar dos viewsets"""
+    from .exportacao import exportar, resposta_exportacao
+    formato = request.query_params.get('formato', 'csv')
+    try:
+        conteudo = exportar(queryset, colunas, formato)
+    except ValueError as e:
+        raise ValidationError({'formato': str(e)})
+    return resposta_exportacao(conteudo, nome, formato)
+
+
 class UsuarioViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para visualização de usuários.
     Somente leitura - gerenciamento via admin.
     """
-    queryset = Usuario.objects.all()
+    queryset = Usuario.objects.order_by('username')
     serializer_class = UsuarioSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
@@ -22,41 +110,65 @@ class UsuarioViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['tipo', 'is_staff', 'is_active']
 
 
-class AlunoViewSet(viewsets.ModelViewSet):
+class AlunoViewSet(PlanoDeConsultaMixin, viewsets.ModelViewSet):
     """
     ViewSet para CRUD completo de alunos.
     """
     queryset = Aluno.objects.all()
+    planos_de_consulta = {
+        'default': {'select_related': ['resumo_financeiro'], 'prefetch_related': ['turmas']},
+        # As actions abaixo só usam o aluno para filtrar os relacionamentos
+        'turmas': {'only': ['id']},
+        'mensalidades': {'only': ['id', 'nome']},
+    }
     serializer_class = AlunoSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+    # A busca vem depois da ordenação para poder ordenar por relevância
+    filter_backends = [filters.OrderingFilter, BuscaAlunosFilter, DjangoFilterBackend]
     search_fields = ['nome', 'documento', 'nome_pai', 'nome_mae']
     filterset_fields = ['ativo']
     ordering_fields = ['nome', 'data_cadastro']
     ordering = ['nome']
 
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """Exporta os alunos filtrados em CSV ou NDJSON (?formato=)"""
+        from .exportacao import COLUNAS_ALUNOS, alunos_para_exportar
+        return resposta_exportacao_api(request, alunos_para_exportar(request.query_params), COLUNAS_ALUNOS, 'alunos')
+
     @action(detail=True, methods=['get'])
     def turmas(self, request, pk=None):
         """Retorna as turmas de um aluno específico"""
         aluno = self.get_object()
-        turmas = aluno.turmas.all()
-        serializer = TurmaSimpleSerializer(turmas, many=True)
+        turmas = aluno.turmas.com_total_alunos()
+        serializer = TurmaSimpleSerializer(turmas, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'])
     def mensalidades(self, request, pk=None):
         """Retorna as mensalidades de um aluno específico"""
         aluno = self.get_object()
-        mensalidades = aluno.mensalidades.all()
-        serializer = MensalidadeSimpleSerializer(mensalidades, many=True)
+        mensalidades = aluno.mensalidades.only(*MensalidadeViewSet.CAMPOS_LISTAGEM)
+        serializer = MensalidadeSimpleSerializer(mensalidades, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
 
 
-class TurmaViewSet(viewsets.ModelViewSet):
+class TurmaViewSet(PlanoDeConsultaMixin, viewsets.ModelViewSet):
     """
     ViewSet para CRUD completo de turmas.
     """
-    queryset = Turma.objects.all()
+    queryset = Turma.objects.com_total_alunos()
+    planos_de_consulta = {
+        # O TurmaSerializer aninha cada aluno com suas turmas
+        'default': {
+            'prefetch_related': [
+                Prefetch('alunos', queryset=Aluno.objects.select_related('resumo_financeiro').prefetch_related('turmas')),
+            ],
+        },
+        'list': {},
+        'adicionar_aluno': {},
+        'remover_aluno': {},
+    }
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
     search_fields = ['nome']
@@ -97,11 +209,27 @@ class TurmaViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Aluno não encontrado'}, status=404)
 
 
-class MensalidadeViewSet(viewsets.ModelViewSet):
+class MensalidadeViewSet(PlanoDeConsultaMixin, viewsets.ModelViewSet):
     """
     ViewSet para CRUD completo de mensalidades.
     """
+    # Colunas lidas pelo MensalidadeSimpleSerializer (além do nome do aluno)
+    CAMPOS_LISTAGEM = [
+        'id', 'aluno', 'valor', 'vencimento', 'status',
+        'data_pagamento', 'data_cadastro',
+    ]
+
     queryset = Mensalidade.objects.all()
+    planos_de_consulta = {
+        # O MensalidadeSerializer aninha o aluno completo com suas turmas
+        'default': {
+            'select_related': ['aluno__resumo_financeiro'],
+            'prefetch_related': ['aluno__turmas'],
+        },
+        'list': {'select_related': ['aluno'], 'only': CAMPOS_LISTAGEM + ['aluno__nome']},
+        'totais': {},
+        'alterar_status': {},
+    }
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
     search_fields = ['aluno__nome']
@@ -115,6 +243,34 @@ class MensalidadeViewSet(viewsets.ModelViewSet):
             return MensalidadeSimpleSerializer
         return MensalidadeSerializer
 
+    @action(detail=False, methods=['get'])
+    def totais(self, request):
+        """Retorna valores e quantidades por status das mensalidades filtradas"""
+        mensalidades = self.filter_queryset(self.get_queryset())
+        return Response(mensalidades.totais())
+
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """Exporta as mensalidades com os filtros da listagem web em CSV ou NDJSON"""
+        from .exportacao import COLUNAS_MENSALIDADES, mensalidades_para_exportar
+        return resposta_exportacao_api(
+            request, mensalidades_para_exportar(request.query_params), COLUNAS_MENSALIDADES, 'mensalidades'
+        )
+
+    @action(detail=False, methods=['post'])
+    def alterar_status(self, request):
+        """
+        Altera o status de várias mensalidades em um único UPDATE.
+
+        Corpo: {"ids": [1, 2, 3], "status": "pago", "data_pagamento": "2025-01-10"}
+        """
+        from .cobranca import alterar_status_em_lote
+        serializer = AlteracaoStatusEmLoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        dados = serializer.validated_data
+        atualizadas = alterar_status_em_lote(dados['ids'], dados['status'], dados.get('data_pagamento'))
+        return Response({'atualizadas': atualizadas, 'status': dados['status']})
+
     @action(detail=True, methods=['post'])
     def marcar_como_paga(self, request, pk=None):
         """Marca uma mensalidade como paga"""
@@ -125,3 +281,37 @@ class MensalidadeViewSet(viewsets.ModelViewSet):
         mensalidade.save()
         serializer = self.get_serializer(mensalidade)
         return Response(serializer.data)
+
+
+class RelatorioFinanceiroViewSet(viewsets.ViewSet):
+    """
+    Relatório mensal de faturamento e inadimplência (somente leitura).
+
+    Lê a tabela de consolidação mensal. Filtros: ?ano=, ?mes=,
+    ?agrupar=turma|periodo|ano_letivo, ?periodo=, ?ano_letivo= e ?turma=.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def linhas(self, request):
+        from .relatorios import parametros_relatorio, relatorio_mensal
+        try:
+            parametros = parametros_relatorio(request.query_params)
+        except ValueError as e:
+            raise ValidationError({'detail': str(e)})
+        return relatorio_mensal(**parametros)
+
+    def list(self, request):
+        serializer = RelatorioMensalSerializer(self.linhas(request), many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """Exporta o relatório filtrado em CSV ou NDJSON (?formato=)"""
+        from .exportacao import exportar_linhas, resposta_exportacao
+        from .relatorios import COLUNAS_RELATORIO, linhas_para_exportar
+        formato = request.query_params.get('formato', 'csv')
+        try:
+            conteudo = exportar_linhas(COLUNAS_RELATORIO, linhas_para_exportar(self.linhas(request)), formato)
+        except ValueError as e:
+            raise ValidationError({'formato': str(e)})
+        return resposta_exportacao(conteudo, 'relatorio_financeiro', formato)
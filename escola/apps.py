@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class EscolaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'escola'
+
+    def ready(self):
+        from .signals import conectar_signals
+        conectar_signals()
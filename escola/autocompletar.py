@@ -0,0 +1,352 @@
+"""
+Autocompletar de alunos e turmas.
+
+Cada processo mantém em memória um índice de prefixos por tipo: listas
+ordenadas de chaves normalizadas (veja busca.normalizar) consultadas com
+bisect. Cada tecla digitada custa algumas buscas binárias, sem acessar o
+banco.
+
+O índice é montado em segundo plano quando o worker do gunicorn inicia
+(aquecer(); Django não recomenda consultar o banco em AppConfig.ready()) ou,
+sem isso, na primeira consulta, e é atualizado pelos signals de Aluno e
+Turma após o commit. Como cada worker tem o seu índice, toda alteração
+também incrementa uma versão no cache; um worker que encontra uma versão
+que não acompanhou remonta o índice em segundo plano, respondendo com o
+anterior até a troca. Operações em lote, que não disparam
+signals, chamam invalidar_autocompletar().
+
+A versão só chega aos outros workers se o cache for compartilhado (veja
+CACHE_BACKEND). Com o cache na memória de cada processo, o índice é
+remontado em segundo plano a cada ESCOLA_AUTOCOMPLETAR_TTL segundos.
+
+A montagem não segura o lock das buscas: enquanto uma thread monta o índice
+novo, as demais continuam respondendo com o anterior, e a troca é feita de
+uma vez.
+"""
+import bisect
+import logging
+import sys
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from .busca import normalizar
+from .em_cache import cache_compartilhado
+
+
+CHAVE_VERSAO = 'escola:autocompletar:versao'
+
+logger = logging.getLogger(__name__)
+
+LIMITE_PADRAO = 10
+LIMITE_MAXIMO = 50
+
+# Chaves examinadas, no máximo, na busca por palavras do meio do nome; limita
+# a latência de prefixos muito curtos, que casam com boa parte do índice
+MAXIMO_CHAVES_EXAMINADAS = 2000
+
+
+class IndicePrefixos:
+    """Índice de prefixos de um tipo de registro"""
+
+    def __init__(self):
+        self.itens = {}       # id -> (dados, ativo, todas as palavras, frase, chaves em palavras)
+        self.frases = []      # (texto normalizado completo, id), ordenadas
+        self.palavras = []    # (palavra, id), ordenadas
+
+    @staticmethod
+    def _chaves(texto, extras):
+        frase = normalizar(texto)
+        palavras = frase.split()
+        for extra in extras:
+            extra = normalizar(extra)
+            if extra:
+                palavras.append(extra)
+                somente_digitos = ''.join(c for c in extra if c.isdigit())
+                if somente_digitos and somente_digitos != extra:
+                    palavras.append(somente_digitos)
+        palavras = [sys.intern(palavra) for palavra in dict.fromkeys(palavras)]
+        # A primeira palavra já é coberta pelo índice de frases
+        return frase, tuple(palavras), tuple(palavras[1:])
+
+    def carregar(self, registros):
+        """Monta o índice de uma vez a partir de (id, dados, ativo, texto, extras)"""
+        self.itens = {}
+        frases, palavras = [], []
+        for id, dados, ativo, texto, extras in registros:
+            frase, todas, chaves = self._chaves(texto, extras)
+            self.itens[id] = (dados, ativo, todas, frase, chaves)
+            frases.append((frase, id))
+            palavras.extend((chave, id) for chave in chaves)
+        frases.sort()
+        palavras.sort()
+        self.frases, self.palavras = frases, palavras
+
+    @staticmethod
+    def _descartar(lista, chave):
+        i = bisect.bisect_left(lista, chave)
+        if i < len(lista) and lista[i] == chave:
+            del lista[i]
+
+    def remover(self, id):
+        item = self.itens.pop(id, None)
+        if item is None:
+            return
+        _, _, _, frase, chaves = item
+        self._descartar(self.frases, (frase, id))
+        for chave in chaves:
+            self._descartar(self.palavras, (chave, id))
+
+    def adicionar(self, id, dados, ativo, texto, extras=()):
+        self.remover(id)
+        frase, todas, chaves = self._chaves(texto, extras)
+        self.itens[id] = (dados, ativo, todas, frase, chaves)
+        bisect.insort(self.frases, (frase, id))
+        for chave in chaves:
+            bisect.insort(self.palavras, (chave, id))
+
+    def buscar(self, query, limite=LIMITE_PADRAO, somente_ativos=False):
+        """
+        Retorna os dados de até ``limite`` registros que casam com a busca.
+
+        Primeiro os registros cujo texto começa com a busca, em ordem
+        alfabética; depois os que têm alguma outra palavra (ou o documento)
+        começando com o primeiro termo e contêm os demais termos como
+        prefixos de palavras.
+        """
+        termos = normalizar(query).split()
+        if not termos:
+            return []
+        frase = ' '.join(termos)
+        encontrados = []
+        vistos = set()
+
+        i = bisect.bisect_left(self.frases, (frase,))
+        while i < len(self.frases) and len(encontrados) < limite:
+            chave, id = self.frases[i]
+            if not chave.startswith(frase):
+                break
+            i += 1
+            if somente_ativos and not self.itens[id][1]:
+                continue
+            vistos.add(id)
+            encontrados.append(id)
+
+        primeiro, demais = termos[0], termos[1:]
+        i = bisect.bisect_left(self.palavras, (primeiro,))
+        fim = min(len(self.palavras), i + MAXIMO_CHAVES_EXAMINADAS)
+        while i < fim and len(encontrados) < limite:
+            chave, id = self.palavras[i]
+            if not chave.startswith(primeiro):
+                break
+            i += 1
+            if id in vistos:
+                continue
+            _, ativo, todas, _, _ = self.itens[id]
+            if somente_ativos and not ativo:
+                continue
+            if all(any(palavra.startswith(termo) for palavra in todas) for termo in demais):
+                vistos.add(id)
+                encontrados.append(id)
+
+        return [self.itens[id][0] for id in encontrados]
+
+
+def _registro_aluno(id, nome, documento, ativo):
+    dados = {'id': id, 'nome': nome, 'documento': documento, 'ativo': ativo, 'rotulo': f'{nome} ({documento})'}
+    return id, dados, ativo, nome, (documento,)
+
+
+def _registro_turma(id, nome, ano_letivo, periodo, ativa):
+    dados = {
+        'id': id, 'nome': nome, 'ano_letivo': ano_letivo, 'periodo': periodo, 'ativa': ativa,
+        'rotulo': f'{nome} - {ano_letivo}',
+    }
+    return id, dados, ativa, nome, (str(ano_letivo),)
+
+
+CAMPOS_ALUNO = ('id', 'nome', 'documento', 'ativo')
+CAMPOS_TURMA = ('id', 'nome', 'ano_letivo', 'periodo', 'ativa')
+
+
+class Autocompletar:
+    """Índices de alunos e turmas do processo, com controle de versão pelo cache"""
+
+    TIPOS = ('aluno', 'turma')
+
+    def __init__(self):
+        # Protege indices, versao, montado_em e pendentes; as buscas o seguram por microssegundos
+        self.lock = threading.Lock()
+        # Uma montagem por vez no processo
+        self.lock_montagem = threading.Lock()
+        self.indices = None
+        self.versao = None
+        self.montado_em = 0.0
+        # Alterações recebidas durante uma montagem: (versão, alteração)
+        self.pendentes = None
+
+    def _na_versao(self, versao):
+        return self.indices is not None and versao == self.versao
+
+    def _expirado(self):
+        """Com o cache de cada processo, as alterações dos outros workers só chegam pelo TTL"""
+        ttl = settings.ESCOLA_AUTOCOMPLETAR_TTL
+        return bool(ttl) and not cache_compartilhado() and time.monotonic() - self.montado_em > ttl
+
+    def _montar(self, versao):
+        """Monta índices novos sem segurar self.lock e os troca pelos atuais de uma vez"""
+        from .models import Aluno, Turma
+
+        with self.lock:
+            self.pendentes = []
+        try:
+            indices = {tipo: IndicePrefixos() for tipo in self.TIPOS}
+            alunos = Aluno.objects.order_by().values_list(*CAMPOS_ALUNO).iterator(chunk_size=2000)
+            indices['aluno'].carregar(_registro_aluno(*valores) for valores in alunos)
+            turmas = Turma.objects.order_by().values_list(*CAMPOS_TURMA)
+            indices['turma'].carregar(_registro_turma(*valores) for valores in turmas)
+        except BaseException:
+            with self.lock:
+                self.pendentes = None
+            raise
+
+        with self.lock:
+            # A leitura do banco pode ou não ter visto as alterações feitas
+            # durante a montagem; reaplicá-las não muda o resultado
+            for nova, alteracao in self.pendentes:
+                alteracao(indices)
+                if nova is not None and nova == versao + 1:
+                    versao = nova
+            self.pendentes = None
+            self.indices, self.versao, self.montado_em = indices, versao, time.monotonic()
+
+    def _montar_primeiro(self, versao):
+        """Monta o primeiro índice do processo, esperando a montagem de outra thread, se houver"""
+        with self.lock_montagem:
+            with self.lock:
+                montado = self.indices is not None
+            if not montado:
+                self._montar(versao)
+
+    def aquecer(self):
+        """Monta o índice em uma thread, sem esperar (início do worker, versão nova, TTL vencido)"""
+        if self.lock_montagem.locked():
+            return
+        threading.Thread(target=self._aquecer, name='autocompletar', daemon=True).start()
+
+    def _aquecer(self):
+        try:
+            if self.lock_montagem.acquire(blocking=False):
+                try:
+                    self._montar(cache.get(CHAVE_VERSAO, 0))
+                finally:
+                    self.lock_montagem.release()
+        except Exception:
+            logger.exception('Falha ao montar o índice do autocompletar')
+        finally:
+            connections.close_all()
+
+    def _validar_tipo(self, tipo):
+        if tipo not in self.TIPOS:
+            raise ValueError(f'Tipo inválido: {tipo}. Use um de: {", ".join(self.TIPOS)}')
+
+    def _buscar(self, versao, tipo, query, limite, somente_ativos):
+        with self.lock:
+            na_versao = self._na_versao(versao)
+            sem_indice = self.indices is None
+        if sem_indice:
+            # Só monta na requisição quando não há índice antigo para responder
+            self._montar_primeiro(versao)
+        elif not na_versao or self._expirado():
+            self.aquecer()
+        with self.lock:
+            return self.indices[tipo].buscar(query, limite, somente_ativos)
+
+    def sugestoes(self, tipo, query, limite=LIMITE_PADRAO, somente_ativos=False):
+        self._validar_tipo(tipo)
+        return self._buscar(cache.get(CHAVE_VERSAO, 0), tipo, query, limite, somente_ativos)
+
+    async def asugestoes(self, tipo, query, limite=LIMITE_PADRAO, somente_ativos=False):
+        """
+        Versão assíncrona de sugestoes.
+
+        Com o índice em dia a busca roda no próprio loop de eventos (só
+        buscas binárias em memória); montar o índice consulta o banco e vai
+        para uma thread.
+        """
+        self._validar_tipo(tipo)
+        versao = await cache.aget(CHAVE_VERSAO, 0)
+        if not self._expirado() and self.lock.acquire(blocking=False):
+            try:
+                if self._na_versao(versao):
+                    return self.indices[tipo].buscar(query, limite, somente_ativos)
+            finally:
+                self.lock.release()
+        return await sync_to_async(self._buscar)(versao, tipo, query, limite, somente_ativos)
+
+    @staticmethod
+    def _nova_versao():
+        cache.add(CHAVE_VERSAO, 0, timeout=None)
+        try:
+            return cache.incr(CHAVE_VERSAO)
+        except ValueError:
+            # A chave saiu do cache entre o add e o incr
+            return None
+
+    def aplicar(self, alteracao):
+        """Aplica uma alteração incremental e publica a nova versão para os demais processos"""
+        nova = self._nova_versao()
+        with self.lock:
+            if self.pendentes is not None:
+                self.pendentes.append((nova, alteracao))
+            if self.indices is None:
+                return
+            alteracao(self.indices)
+            if nova is not None and self.versao is not None and nova == self.versao + 1:
+                self.versao = nova
+            else:
+                # Outro processo também alterou algo: o índice continua
+                # respondendo, com esta alteração, até ser remontado
+                self.versao = None
+
+    def invalidar(self):
+        """Marca o índice para ser remontado; até lá ele continua respondendo"""
+        self._nova_versao()
+        with self.lock:
+            self.versao = None
+
+
+autocompletar = Autocompletar()
+
+
+def invalidar_autocompletar(**kwargs):
+    """Descarta os índices de todos os processos (usado após operações em lote)"""
+    autocompletar.invalidar()
+
+
+def _apos_commit(alteracao):
+    transaction.on_commit(lambda: autocompletar.aplicar(alteracao))
+
+
+def atualizar_aluno(sender, instance, **kwargs):
+    registro = _registro_aluno(*(getattr(instance, campo) for campo in CAMPOS_ALUNO))
+    _apos_commit(lambda indices: indices['aluno'].adicionar(*registro))
+
+
+def atualizar_turma(sender, instance, **kwargs):
+    registro = _registro_turma(*(getattr(instance, campo) for campo in CAMPOS_TURMA))
+    _apos_commit(lambda indices: indices['turma'].adicionar(*registro))
+
+
+def remover_aluno(sender, instance, **kwargs):
+    id = instance.pk
+    _apos_commit(lambda indices: indices['aluno'].remover(id))
+
+
+def remover_turma(sender, instance, **kwargs):
+    id = instance.pk
+    _apos_commit(lambda indices: indices['turma'].remover(id))
@@ -0,0 +1,62 @@
+"""
+Ajustes de conexão com o banco de dados.
+
+No SQLite cada conexão nova recebe os PRAGMAs de ESCOLA_SQLITE_PRAGMAS
+(WAL, synchronous=NORMAL, mmap, cache e busy_timeout): com WAL leituras
+não bloqueiam escritas e vice-versa, o que importa com vários workers do
+gunicorn. A configuração dos aliases (default e leitura) fica em
+settings.DATABASES.
+"""
+import zlib
+
+from django.conf import settings
+from django.db import connection, connections
+
+
+ALIAS_LEITURA = 'leitura'
+
+
+def banco_leitura():
+    """Alias usado pelos relatórios e exportações: a conexão somente leitura, se configurada"""
+    return ALIAS_LEITURA if ALIAS_LEITURA in connections.settings else 'default'
+
+
+def travar(*chave, compartilhado=False):
+    """
+    Lock exclusivo identificado por `chave`, mantido até o fim da transação.
+
+    Serializa operações que leem e depois gravam o mesmo conjunto de linhas
+    (uma competência, uma célula do relatório). Com `compartilhado=True`
+    o lock só exclui quem pede o mesmo lock exclusivo: serve para uma
+    operação sobre tudo excluir as operações parciais sem que elas se
+    excluam entre si. No PostgreSQL usa um advisory lock; no SQLite a
+    transação já começa com o lock de escrita do banco (transaction_mode
+    IMMEDIATE) e não é preciso fazer nada.
+    """
+    if connection.vendor == 'postgresql':
+        funcao = 'pg_advisory_xact_lock_shared' if compartilhado else 'pg_advisory_xact_lock'
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT {funcao}(%s)', [zlib.crc32(repr(chave).encode())])
+
+
+def somente_leitura(connection):
+    nome = str(connection.settings_dict['NAME'])
+    return nome.startswith('file:') and 'mode=ro' in nome
+
+
+def configurar_sqlite(sender, connection, **kwargs):
+    """Receiver de connection_created: aplica os PRAGMAs do SQLite"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(settings.ESCOLA_SQLITE_PRAGMAS)
+    if somente_leitura(connection):
+        # O modo do journal fica gravado no arquivo; uma conexão somente
+        # leitura não pode alterá-lo
+        pragmas.pop('journal_mode', None)
+    if connection.settings_dict['TEST']['MIRROR'] and connection.is_in_memory_db():
+        # Espelho do banco em memória nos testes: compartilha o cache com a
+        # conexão principal e precisa enxergar a transação aberta pelo teste
+        pragmas['read_uncommitted'] = 'ON'
+    with connection.cursor() as cursor:
+        for nome, valor in pragmas.items():
+            cursor.execute(f'PRAGMA {nome} = {valor}')
@@ -0,0 +1,183 @@
+"""
+Busca indexada de alunos.
+
+Cada aluno guarda na coluna ``busca`` o nome, o documento e os nomes dos
+pais em minúsculas e sem acentos (veja Aluno.atualizar_busca). A busca
+compara os termos digitados, normalizados da mesma forma, com essa única
+coluna, que o banco indexa:
+
+* SQLite: tabela virtual FTS5 com tokenizer trigram (escola_aluno_fts),
+  mantida pelo próprio banco com triggers sobre escola_aluno;
+* PostgreSQL: índice GIN com gin_trgm_ops, usado pelo LIKE '%termo%'.
+
+Em outros bancos, ou em um SQLite sem FTS5, o resultado é o mesmo, só que
+obtido varrendo a coluna.
+"""
+import unicodedata
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+
+TABELA_FTS = 'escola_aluno_fts'
+
+# O tokenizer trigram do FTS5 não encontra termos com menos de 3 caracteres
+TAMANHO_MINIMO_FTS = 3
+
+# Ordenação dos resultados de busca, do mais relevante para o menos relevante
+ORDENACAO_RELEVANCIA = ('-relevancia', 'nome', 'id')
+
+_fts_por_banco = {}
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e com espaços simples"""
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def texto_de_busca(*valores):
+    """Monta o conteúdo da coluna busca a partir dos campos pesquisáveis"""
+    return ' '.join(filter(None, (normalizar(valor) for valor in valores)))
+
+
+def termos_da_busca(query):
+    """Termos normalizados e sem repetição da busca digitada"""
+    return list(dict.fromkeys(normalizar(query).split()))
+
+
+def fts_disponivel(using='default'):
+    """Indica se o banco possui a tabela FTS5 criada pela migração 0006"""
+    conexao = connections[using]
+    if conexao.vendor != 'sqlite':
+        return False
+    chave = (using, str(conexao.settings_dict['NAME']))
+    if chave not in _fts_por_banco:
+        with conexao.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [TABELA_FTS])
+            _fts_por_banco[chave] = cursor.fetchone() is not None
+    return _fts_por_banco[chave]
+
+
+def _expressao_fts(termos):
+    # Cada termo vira uma frase entre aspas; no tokenizer trigram isso é busca por substring
+    return ' AND '.join('"{}"'.format(termo.replace('"', '""')) for termo in termos)
+
+
+def buscar_alunos(alunos, query):
+    """
+    Filtra os alunos pela busca e anota ``relevancia``.
+
+    Todos os termos precisam aparecer (em qualquer ordem) no nome, documento
+    ou nomes dos pais, sem diferenciar maiúsculas nem acentos. Para ordenar
+    pelos mais relevantes use order_by(*ORDENACAO_RELEVANCIA).
+    """
+    termos = termos_da_busca(query)
+    if not termos:
+        return alunos
+
+    longos = [termo for termo in termos if len(termo) >= TAMANHO_MINIMO_FTS]
+    if longos and fts_disponivel(alunos.db):
+        alunos = alunos.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s',
+            [_expressao_fts(longos)],
+        ))
+        termos = [termo for termo in termos if len(termo) < TAMANHO_MINIMO_FTS]
+
+    filtro = Q()
+    for termo in termos:
+        filtro &= Q(busca__contains=termo)
+
+    frase = ' '.join(termos_da_busca(query))
+    return alunos.filter(filtro).annotate(relevancia=Case(
+        When(documento__iexact=query.strip(), then=Value(4)),
+        When(busca__startswith=frase, then=Value(3)),
+        When(busca__contains=f' {frase}', then=Value(2)),
+        default=Value(1),
+        output_field=IntegerField(),
+    ))
+
+
+SQL_FTS_SQLITE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5("
+    f"busca, content='escola_aluno', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON escola_aluno BEGIN "
+    f"INSERT INTO {TABELA_FTS}(rowid, busca) VALUES (new.id, new.busca); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON escola_aluno BEGIN "
+    f"INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, busca) VALUES ('delete', old.id, old.busca); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE OF busca ON escola_aluno BEGIN "
+    f"INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, busca) VALUES ('delete', old.id, old.busca); "
+    f"INSERT INTO {TABELA_FTS}(rowid, busca) VALUES (new.id, new.busca); END",
+]
+TRIGGERS_FTS = {f'{TABELA_FTS}_ai', f'{TABELA_FTS}_ad', f'{TABELA_FTS}_au'}
+
+SQL_TRIGRAMA_POSTGRES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS aluno_busca_trgm_idx ON escola_aluno USING gin (busca gin_trgm_ops)',
+]
+
+
+def instalar_indice_busca(conexao):
+    """
+    Cria o índice da coluna busca conforme o banco. Pode ser chamada várias vezes.
+
+    No SQLite as migrações que alteram escola_aluno recriam a tabela e
+    descartam os triggers; por isso esta função também roda após cada
+    migrate e, se algum trigger estava faltando, reconstrói o índice.
+    Retorna True se o índice existe ao final.
+    """
+    if conexao.vendor == 'sqlite':
+        with conexao.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'escola_aluno'"
+            )
+            faltando = TRIGGERS_FTS - {nome for nome, in cursor.fetchall()}
+            if not faltando:
+                return True
+            try:
+                with transaction.atomic(using=conexao.alias):
+                    for sql in SQL_FTS_SQLITE:
+                        cursor.execute(sql)
+                    cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
+            except DatabaseError:
+                # SQLite compilado sem FTS5 ou sem o tokenizer trigram (< 3.34)
+                return False
+        _fts_por_banco.clear()
+        return True
+
+    if conexao.vendor == 'postgresql':
+        try:
+            with transaction.atomic(using=conexao.alias), conexao.cursor() as cursor:
+                for sql in SQL_TRIGRAMA_POSTGRES:
+                    cursor.execute(sql)
+        except DatabaseError:
+            # Sem permissão para criar a extensão pg_trgm
+            return False
+        return True
+
+    return False
+
+
+def reinstalar_indice_busca(sender, using='default', **kwargs):
+    """Receiver de post_migrate: recria os triggers descartados por migrações"""
+    conexao = connections[using]
+    with conexao.cursor() as cursor:
+        if 'escola_aluno' not in conexao.introspection.table_names(cursor):
+            return
+        colunas = {coluna.name for coluna in conexao.introspection.get_table_description(cursor, 'escola_aluno')}
+    if 'busca' in colunas:
+        instalar_indice_busca(conexao)
+
+
+def remover_indice_busca(conexao):
+    """Desfaz instalar_indice_busca"""
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'sqlite':
+            for trigger in sorted(TRIGGERS_FTS):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            cursor.execute(f'DROP TABLE IF EXISTS {TABELA_FTS}')
+        elif conexao.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS aluno_busca_trgm_idx')
+    _fts_por_banco.clear()
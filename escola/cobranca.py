@@ -0,0 +1,158 @@
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .banco import travar
+from .dashboard import invalidar_dashboard
+from .em_cache import invalidar
+from .models import Aluno, Mensalidade, turmas_unicas
+from .relatorios import celulas_das_mensalidades, consolidar
+from .resumos import alunos_das_mensalidades, recalcular_resumos
+
+
+# Dia do mês usado como vencimento das mensalidades geradas automaticamente
+DIA_VENCIMENTO = 10
+
+# Quantidade de linhas enviadas por INSERT no bulk_create
+BATCH_SIZE_PADRAO = 500
+
+
+@dataclass
+class ResultadoGeracao:
+    """Resumo de uma execução da geração de mensalidades"""
+    mes: int
+    ano: int
+    vencimento: date
+    total_alunos: int = 0
+    criadas: int = 0
+    ja_existentes: int = 0
+    valor_total: Decimal = Decimal('0.00')
+
+
+def gerar_mensalidades_mes(mes, ano, batch_size=BATCH_SIZE_PADRAO, hoje=None):
+    """
+    Gera as mensalidades do mês para todos os alunos ativos.
+
+    Em vez de consultar e inserir aluno por aluno, carrega em uma única
+    consulta os alunos que já possuem mensalidade na competência e insere
+    as que faltam com bulk_create em lotes, dentro de uma única transação.
+    Execuções para a mesma competência são serializadas por um lock, e a
+    inserção ignora conflitos na restrição única (aluno, competência): linhas
+    criadas por outro caminho nesse meio tempo não são duplicadas nem entram
+    nos totais.
+    """
+    hoje = hoje or date.today()
+    vencimento = date(ano, mes, DIA_VENCIMENTO)
+    competencia = Mensalidade.competencia_de(vencimento)
+    status = 'atrasado' if vencimento < hoje else 'pendente'
+    observacoes = f'Mensalidade gerada automaticamente - {mes:02d}/{ano}'
+
+    resultado = ResultadoGeracao(mes=mes, ano=ano, vencimento=vencimento)
+
+    with transaction.atomic():
+        travar('gerar_mensalidades', competencia)
+        cobrados_no_mes = Mensalidade.objects.filter(competencia=competencia)
+        ja_cobrados = set(cobrados_no_mes.values_list('aluno_id', flat=True))
+        ultimo_id = Mensalidade.objects.aggregate(ultimo=Max('pk'))['ultimo'] or 0
+        turmas = turmas_unicas(ano)
+
+        novas = []
+        alunos_ativos = Aluno.objects.filter(ativo=True).values_list('id', 'valor_mensalidade')
+        for aluno_id, valor in alunos_ativos:
+            resultado.total_alunos += 1
+            if aluno_id in ja_cobrados:
+                resultado.ja_existentes += 1
+                continue
+
+            novas.append(Mensalidade(
+                aluno_id=aluno_id,
+                valor=valor,
+                vencimento=vencimento,
+                competencia=competencia,
+                turma_id=turmas.get(aluno_id),
+                status=status,
+                observacoes=observacoes,
+            ))
+
+        if novas:
+            Mensalidade.objects.bulk_create(novas, batch_size=batch_size, ignore_conflicts=True)
+            # Com ignore_conflicts o banco não informa quais linhas entraram:
+            # são as da competência criadas depois do início e com as
+            # observações desta geração (as puladas por conflito ficaram com
+            # os dados de quem as criou)
+            inseridas = cobrados_no_mes.filter(pk__gt=ultimo_id, observacoes=observacoes).aggregate(
+                quantidade=Count('pk'), valor=Sum('valor'),
+            )
+            resultado.criadas = inseridas['quantidade']
+            resultado.valor_total = inseridas['valor'] or Decimal('0.00')
+            resultado.ja_existentes += len(novas) - resultado.criadas
+            recalcular_resumos({mensalidade.aluno_id for mensalidade in novas}, hoje)
+            consolidar(meses=[competencia], hoje=hoje)
+
+    if resultado.criadas:
+        # bulk_create não dispara post_save; o mês pode ser de um ano novo
+        invalidar('dashboard', 'anos')
+
+    return resultado
+
+
+STATUS_VALIDOS = {valor for valor, _ in Mensalidade.STATUS_CHOICES}
+
+
+def alterar_status_em_lote(ids, status, data_pagamento=None):
+    """
+    Altera o status de várias mensalidades com um único UPDATE ... WHERE id IN
+    e recalcula os resumos financeiros dos alunos afetados.
+
+    Ao marcar como pago, registra data_pagamento (hoje, se não informada);
+    para os demais status a data de pagamento é limpa. Retorna a quantidade
+    de mensalidades atualizadas.
+    """
+    if status not in STATUS_VALIDOS:
+        raise ValueError(f'Status inválido: {status}')
+
+    if status == 'pago':
+        data_pagamento = data_pagamento or timezone.localdate()
+    else:
+        data_pagamento = None
+
+    mensalidades = Mensalidade.objects.filter(pk__in=list(ids))
+    with transaction.atomic():
+        alunos = alunos_das_mensalidades(mensalidades)
+        celulas = celulas_das_mensalidades(mensalidades)
+        atualizadas = mensalidades.update(
+            status=status,
+            data_pagamento=data_pagamento,
+        )
+        if atualizadas:
+            # update() não dispara post_save
+            recalcular_resumos(alunos)
+            consolidar(celulas=celulas)
+    if atualizadas:
+        invalidar_dashboard()
+    return atualizadas
+
+
+def marcar_atrasadas(hoje=None):
+    """
+    Marca como atrasadas as mensalidades pendentes já vencidas.
+
+    É um único UPDATE sobre o índice (status, vencimento), seguido do
+    recálculo dos resumos dos alunos afetados, e não altera nada quando não
+    há pendências vencidas, então pode rodar com frequência.
+    """
+    hoje = hoje or timezone.localdate()
+    vencidas = Mensalidade.objects.filter(status='pendente', vencimento__lt=hoje)
+    with transaction.atomic():
+        alunos = alunos_das_mensalidades(vencidas)
+        atualizadas = vencidas.update(status='atrasado')
+        if atualizadas:
+            # Os consolidados mensais não mudam: pendente e atrasado contam igualmente como em aberto
+            recalcular_resumos(alunos, hoje)
+    if atualizadas:
+        invalidar_dashboard()
+    return atualizadas
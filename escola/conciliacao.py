@@ -0,0 +1,382 @@
+"""
+Conciliação bancária: baixa de mensalidades a partir do arquivo de retorno.
+
+O arquivo é lido linha a linha e processado em lotes. Para cada lote é
+montado um índice em memória das mensalidades referenciadas (por id e por
+documento do aluno + competência) com duas consultas, as linhas são
+casadas contra esse índice e as mensalidades encontradas são atualizadas
+com bulk_update. Leitura e gravação de um lote ficam na mesma transação,
+com as mensalidades travadas (SELECT ... FOR UPDATE): um pagamento
+registrado por outra via nesse meio tempo não é sobrescrito. Nenhum
+momento exige o arquivo inteiro em memória.
+
+Formatos aceitos:
+
+CSV (separado por vírgula ou ponto e vírgula) com cabeçalho contendo
+``valor`` e ``data_pagamento`` e, para identificar a mensalidade, ou
+``mensalidade_id`` ou ``documento`` + ``competencia`` (MM/AAAA ou AAAA-MM).
+
+Posicional (estilo CNAB), uma linha por registro; só os registros de
+detalhe (tipo ``1``) são lidos, cabeçalho (``0``) e trailer (``9``) são
+ignorados. Veja LAYOUT_POSICIONAL.
+"""
+import contextlib
+import csv
+import io
+import itertools
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+
+from .dashboard import invalidar_dashboard
+from .models import Mensalidade
+from .relatorios import celulas_das_mensalidades, consolidar
+from .resumos import recalcular_resumos
+
+
+# Layout posicional: campo -> (início, fim), posições 0-based, fim exclusivo
+LAYOUT_POSICIONAL = {
+    'tipo': (0, 1),
+    'mensalidade_id': (1, 11),       # numérico, zeros à esquerda; zeros = ausente
+    'documento': (11, 31),           # alinhado à esquerda, completado com espaços
+    'competencia': (31, 37),         # MMAAAA
+    'data_pagamento': (37, 45),      # DDMMAAAA
+    'valor': (45, 58),               # em centavos, zeros à esquerda
+}
+TAMANHO_LINHA_POSICIONAL = 58
+
+MOTIVOS = {
+    'linha_invalida': 'Linha inválida',
+    'nao_encontrada': 'Mensalidade não encontrada',
+    'ja_paga': 'Mensalidade já estava paga',
+    'valor_divergente': 'Valor pago menor que o da mensalidade',
+    'duplicada_no_arquivo': 'Pagamento repetido no arquivo',
+}
+
+
+class LinhaInvalida(ValueError):
+    """Linha do arquivo de retorno que não pôde ser interpretada"""
+
+
+@dataclass
+class Pagamento:
+    """Pagamento lido de uma linha do arquivo de retorno"""
+    linha: int
+    valor: Decimal
+    data_pagamento: date
+    mensalidade_id: int = None
+    documento: str = ''
+    competencia: date = None
+
+
+@dataclass
+class Divergencia:
+    """Linha do arquivo que não resultou em baixa"""
+    linha: int
+    motivo: str
+    detalhe: str = ''
+    mensalidade_id: int = None
+    documento: str = ''
+    competencia: date = None
+
+    @property
+    def motivo_display(self):
+        return MOTIVOS.get(self.motivo, self.motivo)
+
+
+@dataclass
+class ResultadoConciliacao:
+    """Resumo de uma conciliação"""
+    linhas_lidas: int = 0
+    conciliadas: int = 0
+    valor_conciliado: Decimal = Decimal('0.00')
+    divergencias: Counter = field(default_factory=Counter)
+    simulacao: bool = False
+
+    @property
+    def total_divergencias(self):
+        return sum(self.divergencias.values())
+
+
+def _data(texto):
+    """Aceita AAAA-MM-DD, DD/MM/AAAA ou DDMMAAAA"""
+    texto = texto.strip()
+    for formato in ('%Y-%m-%d', '%d/%m/%Y', '%d%m%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise LinhaInvalida(f'data inválida: {texto!r}')
+
+
+def _competencia(texto):
+    """Aceita MM/AAAA, AAAA-MM, AAAA-MM-DD ou MMAAAA; retorna o 1º dia do mês"""
+    texto = texto.strip()
+    for formato in ('%m/%Y', '%Y-%m', '%Y-%m-%d', '%m%Y'):
+        try:
+            return datetime.strptime(texto, formato).date().replace(day=1)
+        except ValueError:
+            continue
+    raise LinhaInvalida(f'competência inválida: {texto!r}')
+
+
+def _valor(texto):
+    """Aceita 1234.56, 1234,56 ou 1.234,56"""
+    texto = texto.strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        valor = Decimal(texto)
+    except InvalidOperation:
+        raise LinhaInvalida(f'valor inválido: {texto!r}')
+    if valor <= 0:
+        raise LinhaInvalida(f'valor inválido: {texto!r}')
+    return valor
+
+
+def _id(texto):
+    texto = (texto or '').strip()
+    if not texto or not texto.isdigit() or int(texto) == 0:
+        return None
+    return int(texto)
+
+
+def _montar_pagamento(numero, mensalidade_id, documento, competencia, valor, data_pagamento):
+    pagamento = Pagamento(
+        linha=numero,
+        mensalidade_id=_id(mensalidade_id),
+        documento=(documento or '').strip(),
+        valor=_valor(valor or ''),
+        data_pagamento=_data(data_pagamento or ''),
+    )
+    if (competencia or '').strip():
+        pagamento.competencia = _competencia(competencia)
+    if pagamento.mensalidade_id is None and not (pagamento.documento and pagamento.competencia):
+        raise LinhaInvalida('informe mensalidade_id ou documento + competência')
+    return pagamento
+
+
+def ler_csv(linhas):
+    """Gera (número da linha, Pagamento ou LinhaInvalida) a partir de linhas CSV"""
+    linhas = iter(linhas)
+    primeira = next(linhas, '')
+    delimitador = ';' if primeira.count(';') > primeira.count(',') else ','
+    leitor = csv.DictReader(itertools.chain([primeira], linhas), delimiter=delimitador)
+    campos = {campo.strip().lower() for campo in leitor.fieldnames or []}
+    if not {'valor', 'data_pagamento'} <= campos:
+        raise LinhaInvalida('o cabeçalho do CSV precisa das colunas valor e data_pagamento')
+
+    for registro in leitor:
+        registro = {(chave or '').strip().lower(): valor for chave, valor in registro.items()}
+        numero = leitor.line_num
+        try:
+            yield numero, _montar_pagamento(
+                numero,
+                registro.get('mensalidade_id'),
+                registro.get('documento'),
+                registro.get('competencia'),
+                registro.get('valor'),
+                registro.get('data_pagamento'),
+            )
+        except LinhaInvalida as erro:
+            yield numero, erro
+
+
+def ler_posicional(linhas):
+    """Gera (número da linha, Pagamento ou LinhaInvalida) a partir do layout posicional"""
+    for numero, linha in enumerate(linhas, start=1):
+        linha = linha.rstrip('\r\n')
+        if not linha.strip() or linha[0] in '09':
+            continue
+        if linha[0] != '1' or len(linha) < TAMANHO_LINHA_POSICIONAL:
+            yield numero, LinhaInvalida('registro fora do layout')
+            continue
+
+        campos = {nome: linha[inicio:fim] for nome, (inicio, fim) in LAYOUT_POSICIONAL.items()}
+        try:
+            centavos = campos['valor'].strip()
+            if not centavos.isdigit():
+                raise LinhaInvalida(f'valor inválido: {centavos!r}')
+            yield numero, _montar_pagamento(
+                numero,
+                campos['mensalidade_id'],
+                campos['documento'],
+                campos['competencia'] if campos['competencia'].strip('0 ') else '',
+                str(Decimal(centavos) / 100),
+                campos['data_pagamento'],
+            )
+        except LinhaInvalida as erro:
+            yield numero, erro
+
+
+def detectar_formato(primeira_linha, nome_arquivo=''):
+    """Escolhe o leitor pelo nome do arquivo ou pelo conteúdo da primeira linha"""
+    if nome_arquivo.lower().endswith('.csv'):
+        return 'csv'
+    if ',' in primeira_linha or ';' in primeira_linha:
+        return 'csv'
+    return 'posicional'
+
+
+LEITORES = {
+    'csv': ler_csv,
+    'posicional': ler_posicional,
+}
+
+
+def _indexar_lote(pagamentos, travar=False):
+    """
+    Monta o índice em memória das mensalidades referenciadas no lote.
+
+    Retorna (por_id, por_documento) onde por_documento é indexado por
+    (documento, competência). São duas consultas por lote; com travar, as
+    mensalidades ficam travadas até o fim da transação.
+    """
+    ids = {p.mensalidade_id for p in pagamentos if p.mensalidade_id}
+    documentos = {p.documento for p in pagamentos if not p.mensalidade_id}
+    competencias = {p.competencia for p in pagamentos if not p.mensalidade_id}
+    campos = ('id', 'aluno', 'valor', 'status', 'data_pagamento', 'competencia', 'aluno__documento')
+    mensalidades = Mensalidade.objects.select_related('aluno').only(*campos)
+    if travar:
+        # Em ordem de id, para dois lotes concorrentes não travarem um ao outro
+        mensalidades = mensalidades.select_for_update(of=('self',)).order_by('pk')
+
+    por_id = {}
+    if ids:
+        for m in mensalidades.filter(pk__in=ids):
+            por_id[m.pk] = m
+
+    por_documento = {}
+    if documentos:
+        consulta = mensalidades.filter(
+            aluno__documento__in=documentos,
+            competencia__in=competencias,
+        )
+        for m in consulta:
+            por_documento[(m.aluno.documento, m.competencia)] = por_id.setdefault(m.pk, m)
+
+    return por_id, por_documento
+
+
+def _processar_lote(itens, resultado, ja_baixadas, registrar_divergencia, batch_size):
+    pagamentos = [item for _, item in itens if isinstance(item, Pagamento)]
+    divergencias = []
+    baixas = []
+    # A situação das mensalidades é lida e gravada na mesma transação; a
+    # simulação só lê e não trava nada
+    with contextlib.nullcontext() if resultado.simulacao else transaction.atomic():
+        por_id, por_documento = _indexar_lote(pagamentos, travar=not resultado.simulacao)
+        for numero, item in itens:
+            resultado.linhas_lidas += 1
+            if isinstance(item, LinhaInvalida):
+                divergencias.append(Divergencia(numero, 'linha_invalida', str(item)))
+                continue
+            if item.mensalidade_id:
+                mensalidade = por_id.get(item.mensalidade_id)
+            else:
+                mensalidade = por_documento.get((item.documento, item.competencia))
+
+            divergencia = None
+            if mensalidade is None:
+                divergencia = Divergencia(numero, 'nao_encontrada')
+            elif mensalidade.pk in ja_baixadas:
+                divergencia = Divergencia(numero, 'duplicada_no_arquivo')
+            elif mensalidade.status == 'pago':
+                divergencia = Divergencia(numero, 'ja_paga', f'paga em {mensalidade.data_pagamento or "-"}')
+            elif item.valor < mensalidade.valor:
+                divergencia = Divergencia(
+                    numero, 'valor_divergente', f'pago {item.valor}, devido {mensalidade.valor}'
+                )
+
+            if divergencia:
+                divergencia.mensalidade_id = item.mensalidade_id or (mensalidade and mensalidade.pk)
+                divergencia.documento = item.documento
+                divergencia.competencia = item.competencia
+                divergencias.append(divergencia)
+            else:
+                mensalidade.status = 'pago'
+                mensalidade.data_pagamento = item.data_pagamento
+                ja_baixadas.add(mensalidade.pk)
+                baixas.append(mensalidade)
+                resultado.valor_conciliado += item.valor
+
+        if baixas and not resultado.simulacao:
+            Mensalidade.objects.bulk_update(baixas, ['status', 'data_pagamento'], batch_size=batch_size)
+            recalcular_resumos({mensalidade.aluno_id for mensalidade in baixas})
+            consolidar(celulas=celulas_das_mensalidades(
+                Mensalidade.objects.filter(pk__in=[mensalidade.pk for mensalidade in baixas])
+            ))
+    resultado.conciliadas += len(baixas)
+
+    # Entregues só depois do commit do lote
+    for divergencia in divergencias:
+        resultado.divergencias[divergencia.motivo] += 1
+        registrar_divergencia(divergencia)
+
+
+def conciliar(linhas, formato='auto', nome_arquivo='', registrar_divergencia=None,
+              chunk_size=None, batch_size=500, simular=False):
+    """
+    Concilia os pagamentos de um arquivo de retorno com as mensalidades.
+
+    ``linhas`` é qualquer iterável de linhas de texto (um arquivo aberto,
+    por exemplo), consumido uma única vez. Cada divergência é entregue a
+    ``registrar_divergencia`` assim que encontrada, então quem chama decide
+    se grava um relatório, guarda algumas para exibir ou as descarta.
+    Com ``simular=True`` nada é gravado no banco.
+    """
+    chunk_size = chunk_size or settings.ESCOLA_CONCILIACAO_CHUNK_SIZE
+    registrar_divergencia = registrar_divergencia or (lambda divergencia: None)
+    resultado = ResultadoConciliacao(simulacao=simular)
+
+    linhas = iter(linhas)
+    primeira = next(linhas, None)
+    if primeira is None:
+        return resultado
+    if formato == 'auto':
+        formato = detectar_formato(primeira, nome_arquivo)
+    if formato not in LEITORES:
+        raise ValueError(f'Formato inválido: {formato}. Use um de: auto, {", ".join(LEITORES)}')
+
+    registros = LEITORES[formato](itertools.chain([primeira], linhas))
+    ja_baixadas = set()
+    while True:
+        lote = list(itertools.islice(registros, chunk_size))
+        if not lote:
+            break
+        _processar_lote(lote, resultado, ja_baixadas, registrar_divergencia, batch_size)
+
+    if resultado.conciliadas and not simular:
+        # bulk_update não dispara post_save
+        invalidar_dashboard()
+    return resultado
+
+
+def abrir_texto(arquivo, encoding='utf-8'):
+    """Envolve um arquivo binário (upload, por exemplo) para leitura linha a linha"""
+    return io.TextIOWrapper(arquivo, encoding=encoding, errors='replace', newline='')
+
+
+class RelatorioDivergenciasCsv:
+    """Grava as divergências em CSV à medida que são encontradas"""
+
+    CABECALHO = ['linha', 'motivo', 'descricao', 'mensalidade_id', 'documento', 'competencia', 'detalhe']
+
+    def __init__(self, destino):
+        self.writer = csv.writer(destino)
+        self.writer.writerow(self.CABECALHO)
+
+    def __call__(self, divergencia):
+        self.writer.writerow([
+            divergencia.linha,
+            divergencia.motivo,
+            divergencia.motivo_display,
+            divergencia.mensalidade_id or '',
+            divergencia.documento,
+            divergencia.competencia.strftime('%m/%Y') if divergencia.competencia else '',
+            divergencia.detalhe,
+        ])
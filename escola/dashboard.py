@@ -0,0 +1,96 @@
+import asyncio
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .em_cache import aem_cache, em_cache, invalidar
+from .models import Aluno, Turma, Mensalidade
+
+
+def _consultas():
+    """Consultas independentes do dashboard (ainda não executadas)"""
+    return {
+        'mensalidades_atrasadas': (
+            Mensalidade.objects.filter(status='atrasado')
+            .select_related('aluno')
+            .order_by('vencimento', 'id')[:5]
+        ),
+        'turmas_ativas': (
+            Turma.objects.filter(ativa=True)
+            .com_total_alunos()
+            .order_by('-ano_letivo', 'nome')[:5]
+        ),
+    }
+
+
+def contadores():
+    """
+    Contadores do dashboard: um aggregate() por tabela, com COUNT filtrado.
+
+    Retorna pares (queryset, agregações); cada tabela é percorrida uma só vez.
+    """
+    return [
+        (Aluno.objects.all(), {'total_alunos': Count('id', filter=Q(ativo=True))}),
+        (Turma.objects.all(), {'total_turmas': Count('id', filter=Q(ativa=True))}),
+        (Mensalidade.objects.all(), {
+            'mensalidades_pendentes': Count('id', filter=Q(status='pendente')),
+            'mensalidades_pagas': Count('id', filter=Q(status='pago')),
+        }),
+    ]
+
+
+def _montar(contadores, mensalidades_atrasadas, turmas_ativas):
+    return {
+        **contadores,
+        'mensalidades_atrasadas': mensalidades_atrasadas,
+        'turmas_ativas': turmas_ativas,
+    }
+
+
+def calcular_dashboard():
+    """Calcula os dados do dashboard sem passar pelo cache"""
+    consultas = _consultas()
+    totais = {}
+    for queryset, agregacoes in contadores():
+        totais.update(queryset.aggregate(**agregacoes))
+    return _montar(
+        contadores=totais,
+        mensalidades_atrasadas=list(consultas['mensalidades_atrasadas']),
+        turmas_ativas=list(consultas['turmas_ativas']),
+    )
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def acalcular_dashboard():
+    """
+    Versão assíncrona de calcular_dashboard: as consultas são disparadas juntas.
+
+    O ORM do Django ainda executa cada consulta de forma síncrona na thread
+    da requisição, então num mesmo processo elas chegam ao banco uma após a
+    outra; o ganho está em não bloquear o loop de eventos enquanto isso.
+    """
+    consultas = _consultas()
+    *totais, atrasadas, turmas = await asyncio.gather(
+        *(queryset.aaggregate(**agregacoes) for queryset, agregacoes in contadores()),
+        _alist(consultas['mensalidades_atrasadas']),
+        _alist(consultas['turmas_ativas']),
+    )
+    return _montar({chave: valor for total in totais for chave, valor in total.items()}, atrasadas, turmas)
+
+
+def dados_dashboard():
+    """Retorna os dados do dashboard, calculando-os só quando o cache expira"""
+    return em_cache('dashboard', 'dados', calcular_dashboard, settings.ESCOLA_DASHBOARD_CACHE_TTL)
+
+
+async def adados_dashboard():
+    """Versão assíncrona de dados_dashboard"""
+    return await aem_cache('dashboard', 'dados', acalcular_dashboard, settings.ESCOLA_DASHBOARD_CACHE_TTL)
+
+
+def invalidar_dashboard(**kwargs):
+    """Descarta os dados do dashboard em cache (usado após operações em lote)"""
+    invalidar('dashboard')
@@ -0,0 +1,107 @@
+"""
+Dados da escola em cache, com chaves versionadas e invalidação por grupo.
+
+As chaves têm o formato escola:v<VERSAO>:<grupo>:<nome>. VERSAO muda
+quando o formato dos dados guardados muda; cada grupo (dashboard, anos,
+turmas) tem ainda uma geração guardada no próprio cache e passada como
+``version`` nas demais chaves do grupo. Invalidar um grupo incrementa a
+geração: todas as chaves antigas deixam de ser lidas de uma vez, em todos
+os workers que compartilham o cache (veja CACHE_BACKEND nas settings), sem
+precisar listar ou apagar chaves.
+
+Os receivers de signals (invalidar_dependentes) invalidam os grupos que
+dependem de cada model; operações em lote, que não disparam signals,
+chamam invalidar() diretamente.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+# Incrementar ao mudar o formato de algum dado guardado
+VERSAO = 1
+
+# Grupos que dependem de cada model (pelo model_name). O professor exibido
+# nas turmas não entra: Usuario é salvo a cada login, e o TTL limita o atraso.
+DEPENDENCIAS = {
+    'aluno': ('dashboard',),
+    'turma': ('dashboard', 'turmas'),
+    'turma_alunos': ('dashboard', 'turmas'),
+    'mensalidade': ('dashboard', 'anos'),
+}
+
+
+def cache_compartilhado():
+    """Se o cache é visto por todos os workers (não é a memória de cada processo)"""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def chave(grupo, nome):
+    return f'escola:v{VERSAO}:{grupo}:{nome}'
+
+
+def _chave_geracao(grupo):
+    return chave(grupo, 'geracao')
+
+
+def geracao(grupo):
+    """
+    Geração atual do grupo.
+
+    Começa no relógio em nanossegundos: se a geração sair do cache, a nova
+    nunca coincide com uma já usada, cujas chaves ainda podem estar lá.
+    """
+    return cache.get_or_set(_chave_geracao(grupo), time.time_ns, timeout=None)
+
+
+async def ageracao(grupo):
+    return await cache.aget_or_set(_chave_geracao(grupo), time.time_ns, timeout=None)
+
+
+def invalidar(*grupos):
+    """Descarta tudo o que está em cache nos grupos informados"""
+    for grupo in grupos:
+        try:
+            cache.incr(_chave_geracao(grupo))
+        except ValueError:
+            # Geração ausente: a próxima leitura cria uma nova
+            pass
+
+
+def invalidar_dependentes(sender, **kwargs):
+    """Receiver de signals: invalida os grupos que dependem do model alterado"""
+    invalidar(*DEPENDENCIAS.get(sender._meta.model_name, ()))
+
+
+def em_cache(grupo, nome, calcular, timeout=None):
+    """Valor guardado no grupo; calcular() é chamada quando ele não está no cache"""
+    versao = geracao(grupo)
+    valor = cache.get(chave(grupo, nome), version=versao)
+    if valor is None:
+        valor = calcular()
+        cache.set(chave(grupo, nome), valor, timeout or settings.ESCOLA_CACHE_TTL, version=versao)
+    return valor
+
+
+async def aem_cache(grupo, nome, calcular, timeout=None):
+    """Versão assíncrona de em_cache; calcular é uma função assíncrona"""
+    versao = await ageracao(grupo)
+    valor = await cache.aget(chave(grupo, nome), version=versao)
+    if valor is None:
+        valor = await calcular()
+        await cache.aset(chave(grupo, nome), valor, timeout or settings.ESCOLA_CACHE_TTL, version=versao)
+    return valor
+
+
+def queryset_em_cache(grupo, nome, queryset, timeout=None):
+    """Resultado do queryset, como lista, guardado no grupo"""
+    return em_cache(grupo, nome, lambda: list(queryset), timeout)
+
+
+async def aqueryset_em_cache(grupo, nome, queryset, timeout=None):
+    async def calcular():
+        return [obj async for obj in queryset]
+    return await aem_cache(grupo, nome, calcular, timeout)
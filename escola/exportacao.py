@@ -0,0 +1,113 @@
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .banco import banco_leitura
+from .filtros import filtrar_alunos, filtrar_mensalidades
+from .models import Aluno, Mensalidade
+
+
+# Colunas exportadas: (cabeçalho, caminho usado no values_list)
+COLUNAS_MENSALIDADES = [
+    ('id', 'id'),
+    ('aluno_id', 'aluno_id'),
+    ('aluno_nome', 'aluno__nome'),
+    ('aluno_documento', 'aluno__documento'),
+    ('valor', 'valor'),
+    ('vencimento', 'vencimento'),
+    ('competencia', 'competencia'),
+    ('status', 'status'),
+    ('data_pagamento', 'data_pagamento'),
+    ('observacoes', 'observacoes'),
+    ('data_cadastro', 'data_cadastro'),
+]
+
+COLUNAS_ALUNOS = [
+    ('id', 'id'),
+    ('nome', 'nome'),
+    ('documento', 'documento'),
+    ('nome_pai', 'nome_pai'),
+    ('nome_mae', 'nome_mae'),
+    ('data_nascimento', 'data_nascimento'),
+    ('endereco', 'endereco'),
+    ('telefone', 'telefone'),
+    ('email', 'email'),
+    ('valor_mensalidade', 'valor_mensalidade'),
+    ('ativo', 'ativo'),
+    ('data_cadastro', 'data_cadastro'),
+]
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class _Eco:
+    """Buffer mínimo para o csv.writer: devolve a linha em vez de guardá-la"""
+
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(cabecalho, linhas):
+    """Gera o CSV linha a linha, sem montar o arquivo em memória"""
+    writer = csv.writer(_Eco())
+    yield writer.writerow(cabecalho)
+    for linha in linhas:
+        yield writer.writerow(linha)
+
+
+def linhas_ndjson(cabecalho, linhas):
+    """Gera um objeto JSON por linha (NDJSON)"""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for linha in linhas:
+        yield encoder.encode(dict(zip(cabecalho, linha))) + '\n'
+
+
+def exportar(queryset, colunas, formato='csv'):
+    """
+    Retorna um iterador com o conteúdo exportado no formato pedido.
+
+    As linhas são lidas com values_list e iterator(chunk_size=...), então o
+    consumo de memória não depende da quantidade de linhas exportadas.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato inválido: {formato}. Use um de: {", ".join(FORMATOS)}')
+
+    cabecalho = [nome for nome, _ in colunas]
+    linhas = queryset.values_list(*[caminho for _, caminho in colunas]).iterator(
+        chunk_size=settings.ESCOLA_EXPORTACAO_CHUNK_SIZE
+    )
+    return exportar_linhas(cabecalho, linhas, formato)
+
+
+def exportar_linhas(cabecalho, linhas, formato='csv'):
+    """Exporta linhas já montadas (na ordem do cabeçalho) no formato pedido"""
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato inválido: {formato}. Use um de: {", ".join(FORMATOS)}')
+    if formato == 'csv':
+        return linhas_csv(cabecalho, linhas)
+    return linhas_ndjson(cabecalho, linhas)
+
+
+def mensalidades_para_exportar(params):
+    """Mensalidades filtradas como na listagem, em ordem estável, lidas da conexão de leitura"""
+    return filtrar_mensalidades(Mensalidade.objects.using(banco_leitura()), params).order_by('-vencimento', '-id')
+
+
+def alunos_para_exportar(params):
+    """Alunos filtrados como na listagem, em ordem estável, lidos da conexão de leitura"""
+    return filtrar_alunos(Aluno.objects.using(banco_leitura()), params).order_by('nome', 'id')
+
+
+def resposta_exportacao(conteudo, nome, formato):
+    """Monta a StreamingHttpResponse com o cabeçalho de download"""
+    response = StreamingHttpResponse(conteudo, content_type=FORMATOS[formato])
+    data = timezone.localdate().strftime('%Y%m%d')
+    response['Content-Disposition'] = f'attachment; filename="{nome}_{data}.{formato}"'
+    return response
@@ -0,0 +1,128 @@
+"""
+Valores em reais por extenso, para os recibos.
+
+Os números de 0 a 999 são escritos uma única vez, na importação do módulo,
+em uma tabela; um valor qualquer é dividido em grupos de três dígitos
+(unidades, milhares, milhões e bilhões) e cada grupo vira uma consulta à
+tabela. Os valores são tratados como Decimal e arredondados para centavos,
+sem passar por float. Como os recibos repetem poucos valores (o valor das
+mensalidades), os resultados ficam em um cache LRU pelo valor recebido.
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import lru_cache
+
+
+UNIDADES = ['', 'um', 'dois', 'três', 'quatro', 'cinco', 'seis', 'sete', 'oito', 'nove']
+DEZ_A_DEZENOVE = ['dez', 'onze', 'doze', 'treze', 'quatorze', 'quinze', 'dezesseis', 'dezessete', 'dezoito',
+                  'dezenove']
+DEZENAS = ['', '', 'vinte', 'trinta', 'quarenta', 'cinquenta', 'sessenta', 'setenta', 'oitenta', 'noventa']
+CENTENAS = ['', 'cento', 'duzentos', 'trezentos', 'quatrocentos', 'quinhentos', 'seiscentos', 'setecentos',
+            'oitocentos', 'novecentos']
+
+# (singular, plural) de cada grupo de três dígitos, do menos ao mais significativo
+ESCALAS = [('', ''), ('mil', 'mil'), ('milhão', 'milhões'), ('bilhão', 'bilhões')]
+
+# Maior valor inteiro aceito: 999 bilhões...
+LIMITE = 1000 ** len(ESCALAS) - 1
+
+CENTAVO = Decimal('0.01')
+
+
+def _ate_999(n):
+    if n == 0:
+        return ''
+    if n == 100:
+        return 'cem'
+    centena, resto = divmod(n, 100)
+    dezena, unidade = divmod(resto, 10)
+    if 10 <= resto < 20:
+        partes = [CENTENAS[centena], DEZ_A_DEZENOVE[resto - 10]]
+    else:
+        partes = [CENTENAS[centena], DEZENAS[dezena], UNIDADES[unidade]]
+    return ' e '.join(parte for parte in partes if parte)
+
+
+# Tabela de 0 a 999 (0 fica vazio: grupos zerados não são escritos)
+TABELA = tuple(_ate_999(n) for n in range(1000))
+
+
+def inteiro_por_extenso(n):
+    """Escreve um inteiro de 0 até LIMITE por extenso ("mil e um", "dois milhões"...)"""
+    if not 0 <= n <= LIMITE:
+        raise ValueError(f'Valor fora do intervalo suportado (0 a {LIMITE}): {n}')
+    if n == 0:
+        return 'zero'
+
+    grupos = []
+    escala = 0
+    while n:
+        n, grupo = divmod(n, 1000)
+        if grupo:
+            grupos.append((escala, grupo))
+        escala += 1
+
+    partes = []
+    for escala, grupo in reversed(grupos):
+        singular, plural = ESCALAS[escala]
+        if escala == 1 and grupo == 1:
+            partes.append('mil')  # "mil", não "um mil"
+        elif escala:
+            partes.append(f'{TABELA[grupo]} {singular if grupo == 1 else plural}')
+        else:
+            partes.append(TABELA[grupo])
+
+    # O último grupo é ligado por "e" quando é menor que cem ou uma centena
+    # redonda ("mil e cinco", "mil e trezentos", mas "mil trezentos e dez")
+    _, ultimo = grupos[0]
+    if len(partes) > 1 and (ultimo < 100 or ultimo % 100 == 0):
+        return ' '.join(partes[:-1]) + ' e ' + partes[-1]
+    return ' '.join(partes)
+
+
+def para_centavos(valor):
+    """
+    Converte o valor (Decimal, int, float ou texto) em centavos, com arredondamento comercial.
+
+    Texto com vírgula segue o formato brasileiro ("1.234,56").
+    """
+    if isinstance(valor, float):
+        valor = repr(valor)
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if ',' in valor:
+            valor = valor.replace('.', '').replace(',', '.')
+    try:
+        valor = Decimal(valor)
+        return int(valor.quantize(CENTAVO, rounding=ROUND_HALF_UP) * 100)
+    except (InvalidOperation, TypeError):
+        raise ValueError(f'Valor inválido: {valor!r}')
+
+
+def _reais_por_extenso(centavos):
+    if centavos < 0:
+        return 'menos ' + _reais_por_extenso(-centavos)
+
+    reais, centavos = divmod(centavos, 100)
+    if reais == 0 and centavos:
+        texto_reais = ''
+    elif reais == 1:
+        texto_reais = 'um real'
+    elif reais and reais % 1000000 == 0:
+        # "um milhão de reais", mas "um milhão e quinhentos mil reais"
+        texto_reais = inteiro_por_extenso(reais) + ' de reais'
+    else:
+        texto_reais = inteiro_por_extenso(reais) + ' reais'
+
+    if not centavos:
+        return texto_reais
+    texto_centavos = 'um centavo' if centavos == 1 else f'{TABELA[centavos]} centavos'
+    return f'{texto_reais} e {texto_centavos}' if texto_reais else texto_centavos
+
+
+@lru_cache(maxsize=4096)
+def reais_por_extenso(valor):
+    """Valor em reais por extenso: "cento e cinquenta reais e cinquenta centavos" """
+    centavos = para_centavos(valor)
+    if abs(centavos) // 100 > LIMITE:
+        raise ValueError(f'Valor fora do intervalo suportado: {valor}')
+    return _reais_por_extenso(centavos)
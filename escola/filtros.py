@@ -0,0 +1,80 @@
+import calendar
+from datetime import date
+
+from .busca import buscar_alunos
+
+
+def filtrar_alunos(alunos, params):
+    """
+    Aplica os filtros da listagem de alunos (?q= e ?ativo=).
+
+    Com ?q= os alunos recebem a anotação relevancia (veja busca.buscar_alunos).
+    """
+    query = params.get('q')
+    if query:
+        alunos = buscar_alunos(alunos, query)
+
+    ativo = params.get('ativo')
+    if ativo == '1':
+        alunos = alunos.filter(ativo=True)
+    elif ativo == '0':
+        alunos = alunos.filter(ativo=False)
+
+    return alunos
+
+
+def _mes_ano(params, prefixo):
+    """Lê mes_<prefixo> e ano_<prefixo>; retorna None se ausentes ou inválidos"""
+    try:
+        mes = int(params.get(f'mes_{prefixo}') or 0)
+        ano = int(params.get(f'ano_{prefixo}') or 0)
+    except (TypeError, ValueError):
+        return None
+    if not (1 <= mes <= 12 and ano):
+        return None
+    return mes, ano
+
+
+def filtrar_mensalidades(mensalidades, params):
+    """
+    Aplica os filtros da listagem de mensalidades.
+
+    Compartilhado entre a listagem, as exportações e a API, para que todos
+    respondam da mesma forma a q, status, período (mês/ano inicial e final),
+    aluno_ativo e turma (id de uma turma em que o aluno está matriculado).
+    """
+    # Filtro de busca por nome
+    query = params.get('q')
+    if query:
+        mensalidades = mensalidades.filter(aluno__nome__icontains=query)
+
+    # Filtro por status da mensalidade
+    status = params.get('status')
+    if status:
+        mensalidades = mensalidades.filter(status=status)
+
+    # Filtro por período (mês/ano inicial e final)
+    inicial = _mes_ano(params, 'inicial')
+    if inicial:
+        mes, ano = inicial
+        mensalidades = mensalidades.filter(vencimento__gte=date(ano, mes, 1))
+
+    final = _mes_ano(params, 'final')
+    if final:
+        mes, ano = final
+        ultimo_dia = calendar.monthrange(ano, mes)[1]
+        mensalidades = mensalidades.filter(vencimento__lte=date(ano, mes, ultimo_dia))
+
+    # Filtro por status do aluno (ativo/inativo)
+    aluno_ativo = params.get('aluno_ativo')
+    if aluno_ativo == '1':
+        mensalidades = mensalidades.filter(aluno__ativo=True)
+    elif aluno_ativo == '0':
+        mensalidades = mensalidades.filter(aluno__ativo=False)
+
+    # Filtro por turma do aluno
+    turma = params.get('turma')
+    if turma and str(turma).isdigit():
+        mensalidades = mensalidades.filter(aluno__turmas__id=turma)
+
+    return mensalidades
@@ -0,0 +1,331 @@
+"""
+Importação de alunos em lote a partir de planilhas CSV ou XLSX.
+
+As linhas são lidas como fluxo e processadas em lotes. Para cada lote os
+documentos já cadastrados são buscados com uma única consulta (documento
+IN ...), os alunos válidos são inseridos com bulk_create e as matrículas
+nas turmas com bulk_create sobre a tabela intermediária de Turma.alunos.
+Linhas com erro são reportadas e ignoradas, sem interromper a importação.
+
+Colunas reconhecidas (cabeçalho na primeira linha, sem diferenciar
+maiúsculas): nome e documento (obrigatórias), nome_pai, nome_mae,
+data_nascimento, endereco, telefone, email, valor_mensalidade, ativo e
+turmas. A coluna turmas aceita ids ou ``nome/ano_letivo`` separados por
+``|``, por exemplo ``1|5º Ano A/2025``.
+"""
+import csv
+import io
+import itertools
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .autocompletar import invalidar_autocompletar
+from .em_cache import invalidar
+from .models import Aluno, Turma
+
+
+CAMPOS_TEXTO = ['nome', 'documento', 'nome_pai', 'nome_mae', 'endereco', 'telefone', 'email']
+COLUNAS = CAMPOS_TEXTO + ['data_nascimento', 'valor_mensalidade', 'ativo', 'turmas']
+COLUNAS_OBRIGATORIAS = {'nome', 'documento'}
+
+VALORES_VERDADEIROS = {'1', 'sim', 's', 'true', 'verdadeiro', 'ativo', 'x'}
+VALORES_FALSOS = {'0', 'nao', 'não', 'n', 'false', 'falso', 'inativo'}
+
+
+class ArquivoInvalido(ValueError):
+    """Arquivo que não pode ser importado (cabeçalho ausente, formato desconhecido...)"""
+
+
+@dataclass
+class ErroImportacao:
+    """Linha da planilha que não foi importada"""
+    linha: int
+    mensagem: str
+    documento: str = ''
+
+
+@dataclass
+class ResultadoImportacao:
+    """Resumo de uma importação"""
+    linhas_lidas: int = 0
+    criados: int = 0
+    matriculas: int = 0
+    erros: int = 0
+    simulacao: bool = False
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        # Planilhas costumam transformar documentos numéricos em float
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _cabecalho(valores):
+    colunas = [_texto(valor).lower() for valor in valores]
+    faltando = COLUNAS_OBRIGATORIAS - set(colunas)
+    if faltando:
+        raise ArquivoInvalido(f'Colunas obrigatórias ausentes no cabeçalho: {", ".join(sorted(faltando))}')
+    return colunas
+
+
+def ler_csv(arquivo):
+    """Gera (número da linha, dicionário) a partir de um arquivo CSV aberto em modo texto"""
+    linhas = iter(arquivo)
+    primeira = next(linhas, '')
+    delimitador = ';' if primeira.count(';') > primeira.count(',') else ','
+    leitor = csv.reader(itertools.chain([primeira], linhas), delimiter=delimitador)
+    colunas = _cabecalho(next(leitor, []))
+    for registro in leitor:
+        if any(valor.strip() for valor in registro):
+            yield leitor.line_num, dict(zip(colunas, registro))
+
+
+def ler_xlsx(arquivo):
+    """Gera (número da linha, dicionário) a partir da primeira aba de um arquivo XLSX"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ArquivoInvalido('Para importar XLSX instale o pacote openpyxl.')
+
+    try:
+        planilha = load_workbook(arquivo, read_only=True, data_only=True)
+    except Exception as e:
+        raise ArquivoInvalido(f'Não foi possível ler a planilha: {e}')
+
+    try:
+        linhas = planilha.worksheets[0].iter_rows(values_only=True)
+        colunas = _cabecalho(next(linhas, ()))
+        for numero, registro in enumerate(linhas, start=2):
+            if any(_texto(valor) for valor in registro):
+                yield numero, dict(zip(colunas, registro))
+    finally:
+        planilha.close()
+
+
+LEITORES = {
+    'csv': ler_csv,
+    'xlsx': ler_xlsx,
+}
+
+
+def detectar_formato(nome_arquivo):
+    return 'xlsx' if nome_arquivo.lower().endswith(('.xlsx', '.xlsm')) else 'csv'
+
+
+def _data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = _texto(valor)
+    if not texto:
+        return None
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValidationError(f'data de nascimento inválida: {texto!r}')
+
+
+def _decimal(valor):
+    texto = _texto(valor)
+    if not texto:
+        return None
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        raise ValidationError(f'valor da mensalidade inválido: {texto!r}')
+
+
+def _booleano(valor):
+    if isinstance(valor, bool):
+        return valor
+    texto = _texto(valor).lower()
+    if not texto or texto in VALORES_VERDADEIROS:
+        return True
+    if texto in VALORES_FALSOS:
+        return False
+    raise ValidationError(f'valor inválido para ativo: {texto!r}')
+
+
+class IndiceTurmas:
+    """Resolve as referências da coluna turmas com uma única consulta"""
+
+    def __init__(self):
+        self.por_id = {}
+        self.por_nome = {}
+        for turma_id, nome, ano in Turma.objects.values_list('id', 'nome', 'ano_letivo'):
+            self.por_id[turma_id] = turma_id
+            self.por_nome[(nome.strip().lower(), ano)] = turma_id
+
+    def resolver(self, valor):
+        ids = []
+        for referencia in filter(None, (parte.strip() for parte in _texto(valor).split('|'))):
+            if referencia.isdigit():
+                turma_id = self.por_id.get(int(referencia))
+            else:
+                nome, _, ano = referencia.rpartition('/')
+                turma_id = self.por_nome.get((nome.strip().lower(), int(ano))) if ano.strip().isdigit() else None
+            if turma_id is None:
+                raise ValidationError(f'turma não encontrada: {referencia!r}')
+            ids.append(turma_id)
+        return ids
+
+
+def montar_aluno(registro, turmas):
+    """
+    Converte uma linha da planilha em (Aluno, ids das turmas).
+
+    Valida os campos com full_clean, exceto a unicidade do documento, que é
+    verificada para o lote inteiro de uma vez.
+    """
+    dados = {campo: _texto(registro.get(campo)) for campo in CAMPOS_TEXTO}
+    aluno = Aluno(**dados, data_nascimento=_data(registro.get('data_nascimento')),
+                  ativo=_booleano(registro.get('ativo')))
+    valor = _decimal(registro.get('valor_mensalidade'))
+    if valor is not None:
+        aluno.valor_mensalidade = valor
+    aluno.full_clean(exclude=['foto'], validate_unique=False, validate_constraints=False)
+    # bulk_create não chama save()
+    aluno.atualizar_busca()
+    return aluno, turmas.resolver(registro.get('turmas'))
+
+
+def _mensagem(erro):
+    if hasattr(erro, 'message_dict'):
+        return '; '.join(f'{campo}: {" ".join(msgs)}' for campo, msgs in erro.message_dict.items())
+    return ' '.join(erro.messages)
+
+
+def _inserir(novos):
+    """Insere os alunos e as matrículas do lote; retorna a quantidade de matrículas"""
+    Matricula = Turma.alunos.through
+    with transaction.atomic():
+        Aluno.objects.bulk_create([aluno for _, aluno, _ in novos])
+        matriculas = [
+            Matricula(turma_id=turma_id, aluno_id=aluno.pk)
+            for _, aluno, turma_ids in novos
+            for turma_id in dict.fromkeys(turma_ids)
+        ]
+        Matricula.objects.bulk_create(matriculas)
+    return len(matriculas)
+
+
+def _processar_lote(lote, resultado, turmas, vistos, registrar_erro):
+    novos = []
+
+    def erro(numero, mensagem, documento=''):
+        resultado.erros += 1
+        registrar_erro(ErroImportacao(numero, mensagem, documento))
+
+    documentos = {_texto(registro.get('documento')) for _, registro in lote}
+    cadastrados = set(Aluno.objects.filter(documento__in=documentos).values_list('documento', flat=True))
+
+    for numero, registro in lote:
+        resultado.linhas_lidas += 1
+        documento = _texto(registro.get('documento'))
+        if documento in cadastrados:
+            erro(numero, 'documento já cadastrado', documento)
+            continue
+        if documento in vistos:
+            erro(numero, 'documento repetido na planilha', documento)
+            continue
+        try:
+            aluno, turma_ids = montar_aluno(registro, turmas)
+        except ValidationError as e:
+            erro(numero, _mensagem(e), documento)
+            continue
+        vistos.add(documento)
+        novos.append((numero, aluno, turma_ids))
+
+    if not novos or resultado.simulacao:
+        resultado.criados += len(novos)
+        resultado.matriculas += sum(len(set(turma_ids)) for _, _, turma_ids in novos)
+        return
+
+    try:
+        matriculas = _inserir(novos)
+    except IntegrityError:
+        # Algum documento foi cadastrado por outra sessão depois da conferência:
+        # descarta esses alunos e tenta o restante do lote mais uma vez
+        documentos = {aluno.documento for _, aluno, _ in novos}
+        cadastrados = set(Aluno.objects.filter(documento__in=documentos).values_list('documento', flat=True))
+        restantes = []
+        for numero, aluno, turma_ids in novos:
+            if aluno.documento in cadastrados:
+                erro(numero, 'documento já cadastrado', aluno.documento)
+            else:
+                aluno.pk = None
+                restantes.append((numero, aluno, turma_ids))
+        novos = restantes
+        matriculas = _inserir(novos) if novos else 0
+
+    resultado.criados += len(novos)
+    resultado.matriculas += matriculas
+
+
+def importar_alunos(arquivo, formato='auto', nome_arquivo='', registrar_erro=None,
+                    chunk_size=None, simular=False):
+    """
+    Importa os alunos de uma planilha CSV ou XLSX.
+
+    ``arquivo`` é um arquivo aberto em modo texto (CSV) ou binário (XLSX).
+    Cada linha com erro é entregue a ``registrar_erro`` e não impede a
+    importação das demais. Com ``simular=True`` nada é gravado no banco.
+    """
+    if formato == 'auto':
+        formato = detectar_formato(nome_arquivo or getattr(arquivo, 'name', '') or '')
+    if formato not in LEITORES:
+        raise ArquivoInvalido(f'Formato inválido: {formato}. Use um de: auto, {", ".join(LEITORES)}')
+
+    chunk_size = chunk_size or settings.ESCOLA_IMPORTACAO_CHUNK_SIZE
+    registrar_erro = registrar_erro or (lambda erro: None)
+    resultado = ResultadoImportacao(simulacao=simular)
+    turmas = IndiceTurmas()
+    vistos = set()
+
+    registros = LEITORES[formato](arquivo)
+    while True:
+        lote = list(itertools.islice(registros, chunk_size))
+        if not lote:
+            break
+        _processar_lote(lote, resultado, turmas, vistos, registrar_erro)
+
+    if resultado.criados and not simular:
+        # bulk_create não dispara post_save nem m2m_changed
+        invalidar('dashboard', 'turmas')
+        invalidar_autocompletar()
+    return resultado
+
+
+def abrir_planilha(arquivo, formato='auto', encoding='utf-8'):
+    """Prepara um upload para importar_alunos: CSV é lido como texto, XLSX como binário"""
+    if formato == 'auto':
+        formato = detectar_formato(arquivo.name)
+    if formato == 'csv':
+        return io.TextIOWrapper(arquivo, encoding=encoding, errors='replace', newline='')
+    return arquivo
+
+
+class RelatorioErrosCsv:
+    """Grava os erros da importação em CSV à medida que são encontrados"""
+
+    CABECALHO = ['linha', 'documento', 'erro']
+
+    def __init__(self, destino):
+        self.writer = csv.writer(destino)
+        self.writer.writerow(self.CABECALHO)
+
+    def __call__(self, erro):
+        self.writer.writerow([erro.linha, erro.documento, erro.mensagem])
@@ -0,0 +1,200 @@
+"""
+Medição de tempo e de SQL por requisição (opcional, ESCOLA_INSTRUMENTACAO).
+
+InstrumentacaoMiddleware mede cada requisição: duração total, quantidade
+de consultas SQL, tempo gasto nelas e consultas repetidas (mesmo SQL com os
+mesmos parâmetros, sinal de N+1 ou de cache faltando). O resultado vai para
+o cabeçalho Server-Timing (visível nas ferramentas do navegador), para uma
+linha JSON no logger escola.instrumentacao e para as estatísticas do
+processo, com p50/p95/p99 por nome de URL, exibidas em
+/estatisticas/requisicoes/ para a equipe.
+
+As consultas são medidas por um execute_wrapper instalado nas conexões
+enquanto a instrumentação está ligada. Ele encontra a medição da requisição
+por uma ContextVar, que acompanha a requisição também nas threads usadas
+pelas views assíncronas. Desligada, o middleware levanta MiddlewareNotUsed
+e o Django o remove da cadeia: nada é executado por requisição.
+
+Em respostas em streaming (exportações, recibos em lote) só é medido o que
+acontece até a resposta ser devolvida, não a geração do conteúdo.
+"""
+import json
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+logger = logging.getLogger(__name__)
+
+_medicao_atual = ContextVar('medicao_atual', default=None)
+
+
+class Medicao:
+    """Consultas SQL e duração de uma requisição"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.duracao = 0.0
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.repeticoes = Counter()
+
+    def registrar_sql(self, sql, params, many, duracao):
+        self.consultas += 1
+        self.tempo_sql += duracao
+        self.repeticoes[(sql, 'many' if many else repr(params))] += 1
+
+    @property
+    def duplicadas(self):
+        """Execuções além da primeira de cada consulta idêntica"""
+        return sum(vezes - 1 for vezes in self.repeticoes.values())
+
+    def encerrar(self):
+        self.duracao = time.perf_counter() - self.inicio
+
+
+def medir_sql(execute, sql, params, many, context):
+    """execute_wrapper instalado nas conexões: soma a consulta à medição da requisição"""
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.registrar_sql(sql, params, many, time.perf_counter() - inicio)
+
+
+def instalar_medidor(sender=None, connection=None, **kwargs):
+    """Receiver de connection_created (e chamado na ativação): instala medir_sql na conexão"""
+    if medir_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_sql)
+
+
+def ativar_medidor():
+    """Instala medir_sql nas conexões já abertas nesta thread e nas que forem abertas"""
+    connection_created.connect(instalar_medidor, dispatch_uid='instrumentacao_sql')
+    for conexao in connections.all(initialized_only=True):
+        instalar_medidor(connection=conexao)
+
+
+@contextmanager
+def medir():
+    """Mede o bloco como o middleware mede uma requisição; requer ativar_medidor()"""
+    medicao = Medicao()
+    token = _medicao_atual.set(medicao)
+    try:
+        yield medicao
+    finally:
+        _medicao_atual.reset(token)
+        medicao.encerrar()
+
+
+def _percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+class Estatisticas:
+    """Últimas requisições de cada nome de URL no processo, para os percentis"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.por_view = {}
+
+    def adicionar(self, view, medicao):
+        registro = (medicao.duracao * 1000, medicao.consultas, medicao.tempo_sql * 1000, medicao.duplicadas)
+        with self.lock:
+            if view not in self.por_view:
+                self.por_view[view] = deque(maxlen=settings.ESCOLA_INSTRUMENTACAO_JANELA)
+            self.por_view[view].append(registro)
+
+    def limpar(self):
+        with self.lock:
+            self.por_view.clear()
+
+    def resumo(self):
+        """Percentis da duração e médias de SQL por view, das mais lentas (p95) para as mais rápidas"""
+        with self.lock:
+            copias = {view: list(registros) for view, registros in self.por_view.items()}
+        linhas = []
+        for view, registros in copias.items():
+            duracoes = sorted(r[0] for r in registros)
+            quantidade = len(registros)
+            linhas.append({
+                'view': view,
+                'requisicoes': quantidade,
+                'p50_ms': round(_percentil(duracoes, 0.50), 2),
+                'p95_ms': round(_percentil(duracoes, 0.95), 2),
+                'p99_ms': round(_percentil(duracoes, 0.99), 2),
+                'consultas_media': round(sum(r[1] for r in registros) / quantidade, 1),
+                'sql_ms_media': round(sum(r[2] for r in registros) / quantidade, 2),
+                'duplicadas_max': max(r[3] for r in registros),
+            })
+        return sorted(linhas, key=lambda linha: linha['p95_ms'], reverse=True)
+
+
+estatisticas = Estatisticas()
+
+
+class InstrumentacaoMiddleware:
+    """
+    Mede cada requisição quando ESCOLA_INSTRUMENTACAO está ligada.
+
+    Deve ser o primeiro de MIDDLEWARE, para que a duração inclua os demais.
+    Funciona tanto no servidor WSGI quanto no ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.ESCOLA_INSTRUMENTACAO:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+        ativar_medidor()
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        with medir() as medicao:
+            response = self.get_response(request)
+        self.registrar(request, response, medicao)
+        return response
+
+    async def __acall__(self, request):
+        with medir() as medicao:
+            response = await self.get_response(request)
+        self.registrar(request, response, medicao)
+        return response
+
+    def registrar(self, request, response, medicao):
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = (resolver_match.view_name if resolver_match else None) or '(sem rota)'
+        estatisticas.adicionar(view, medicao)
+
+        response['Server-Timing'] = (
+            f'total;dur={medicao.duracao * 1000:.1f}, '
+            f'sql;dur={medicao.tempo_sql * 1000:.1f};desc="{medicao.consultas} consultas", '
+            f'duplicadas;desc="{medicao.duplicadas}"'
+        )
+        logger.info(json.dumps({
+            'view': view,
+            'metodo': request.method,
+            'caminho': request.path,
+            'status': response.status_code,
+            'duracao_ms': round(medicao.duracao * 1000, 2),
+            'consultas': medicao.consultas,
+            'sql_ms': round(medicao.tempo_sql * 1000, 2),
+            'duplicadas': medicao.duplicadas,
+        }, ensure_ascii=False))
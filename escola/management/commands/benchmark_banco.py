@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Tabela com as colunas de escola_mensalidade usadas pela carga simulada
+ESQUEMA = """
+CREATE TABLE mensalidade (
+    id INTEGER PRIMARY KEY,
+    aluno_id INTEGER NOT NULL,
+    competencia DATE NOT NULL,
+    valor DECIMAL NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    data_pagamento DATE NULL
+);
+CREATE INDEX mensalidade_competencia ON mensalidade (competencia);
+"""
+
+LEITURA = """
+SELECT status, COUNT(*), SUM(valor) FROM mensalidade
+WHERE competencia = ? GROUP BY status
+"""
+ESCRITA = "UPDATE mensalidade SET status = 'pago', data_pagamento = '2025-03-05' WHERE id = ?"
+
+MESES = [f'2025-{mes:02d}-01' for mes in range(1, 13)]
+
+
+def _conectar(arquivo, ajustado):
+    if not ajustado:
+        # Como o Django sem configuração: journal padrão e uma conexão por requisição
+        return sqlite3.connect(arquivo, isolation_level='DEFERRED')
+    conexao = sqlite3.connect(arquivo, isolation_level='IMMEDIATE')
+    for nome, valor in settings.ESCOLA_SQLITE_PRAGMAS.items():
+        conexao.execute(f'PRAGMA {nome} = {valor}')
+    return conexao
+
+
+def _trabalhar(parametros):
+    """Executa requisições simuladas até o prazo; retorna (operações, falhas)"""
+    arquivo, ajustado, escritor, prazo, linhas, semente = parametros
+    aleatorio = random.Random(semente)
+    persistente = _conectar(arquivo, ajustado) if ajustado else None
+    operacoes = falhas = 0
+    while time.monotonic() < prazo:
+        conexao = persistente or _conectar(arquivo, ajustado)
+        try:
+            if escritor:
+                with conexao:
+                    conexao.execute(ESCRITA, [aleatorio.randrange(1, linhas + 1)])
+            else:
+                conexao.execute(LEITURA, [aleatorio.choice(MESES)]).fetchall()
+            operacoes += 1
+        except sqlite3.OperationalError:
+            # "database is locked" depois de esgotar o tempo de espera
+            falhas += 1
+        finally:
+            if persistente is None:
+                conexao.close()
+    return escritor, operacoes, falhas
+
+
+class Command(BaseCommand):
+    help = 'Compara leituras e escritas concorrentes no SQLite com a configuração padrão e com a ajustada (WAL etc.)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--leitores', type=int, default=4, help='Processos que só leem (padrão: 4)')
+        parser.add_argument('--escritores', type=int, default=2, help='Processos que só escrevem (padrão: 2)')
+        parser.add_argument('--segundos', type=float, default=5, help='Duração de cada rodada (padrão: 5)')
+        parser.add_argument('--linhas', type=int, default=100000, help='Mensalidades na tabela (padrão: 100000)')
+
+    def handle(self, *args, **options):
+        if min(options['leitores'] + options['escritores'], options['linhas']) < 1 or options['segundos'] <= 0:
+            raise CommandError('Informe ao menos um processo, uma linha e uma duração positiva.')
+
+        with tempfile.TemporaryDirectory() as pasta:
+            self.stdout.write('\n' + '='*70)
+            self.stdout.write(f'🗄️  SQLite: {options["leitores"]} leitor(es), {options["escritores"]} escritor(es), '
+                              f'{options["segundos"]:g} s por rodada, {options["linhas"]} linhas')
+            self.stdout.write('='*70)
+            self.stdout.write(f'{"configuração":<12} {"leituras/s":>12} {"escritas/s":>12} {"falhas":>8}')
+            resultados = {}
+            for ajustado in (False, True):
+                arquivo = os.path.join(pasta, f'bench_{int(ajustado)}.sqlite3')
+                self.preparar(arquivo, options['linhas'], ajustado)
+                resultados[ajustado] = self.rodar(arquivo, ajustado, options)
+                leituras, escritas, falhas = resultados[ajustado]
+                nome = 'ajustada' if ajustado else 'padrão'
+                self.stdout.write(f'{nome:<12} {leituras:>12.0f} {escritas:>12.0f} {falhas:>8}')
+
+            (l0, e0, _), (l1, e1, _) = resultados[False], resultados[True]
+            self.stdout.write('='*70)
+            self.stdout.write(f'Ganho: leituras {l1 / max(l0, 1):.1f}x, escritas {e1 / max(e0, 1):.1f}x')
+            self.stdout.write('='*70 + '\n')
+
+    def preparar(self, arquivo, linhas, ajustado):
+        conexao = _conectar(arquivo, ajustado)
+        conexao.executescript(ESQUEMA)
+        aleatorio = random.Random(42)
+        with conexao:
+            conexao.executemany(
+                'INSERT INTO mensalidade (aluno_id, competencia, valor, status) VALUES (?, ?, ?, ?)',
+                ((i // 12, MESES[i % 12], aleatorio.randrange(300, 900), 'pendente') for i in range(linhas)),
+            )
+        conexao.close()
+
+    def rodar(self, arquivo, ajustado, options):
+        prazo = time.monotonic() + options['segundos']
+        tarefas = [
+            (arquivo, ajustado, escritor, prazo, options['linhas'], semente)
+            for semente, escritor in enumerate([False] * options['leitores'] + [True] * options['escritores'])
+        ]
+        # Processos, como os workers do gunicorn
+        contexto = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+        with contexto.Pool(len(tarefas)) as pool:
+            retornos = pool.map(_trabalhar, tarefas)
+        leituras = sum(ops for escritor, ops, _ in retornos if not escritor) / options['segundos']
+        escritas = sum(ops for escritor, ops, _ in retornos if escritor) / options['segundos']
+        return leituras, escritas, sum(falhas for _, _, falhas in retornos)
@@ -0,0 +1,147 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from escola.autocompletar import autocompletar, invalidar_autocompletar
+from escola.busca import ORDENACAO_RELEVANCIA, buscar_alunos, fts_disponivel
+from escola.models import Aluno
+
+
+PREFIXO_DOCUMENTO = 'BENCH-'
+
+NOMES = ['João', 'Maria', 'José', 'Ana', 'Antônio', 'Francisca', 'Carlos', 'Letícia', 'Paulo', 'Adriana',
+         'Lucas', 'Júlia', 'Pedro', 'Márcia', 'Gabriel', 'Beatriz', 'Rafael', 'Fernanda', 'Thiago', 'Cecília']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Ferreira', 'Conceição', 'Araújo',
+              'Gonçalves', 'Ribeiro', 'Gomes', 'Barbosa', 'Rodrigues', 'Almeida', 'Nascimento', 'Mendonça']
+
+BUSCAS_PADRAO = ['maria', 'conceicao', 'Conceição', 'joao souza', 'mendonca gabriel', 'BENCH-004242', 'zz']
+
+
+def _nome(aleatorio):
+    return f'{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {aleatorio.choice(SOBRENOMES)}'
+
+
+def busca_icontains(query):
+    """Busca anterior: icontains em cada campo de search_fields"""
+    return Aluno.objects.filter(
+        Q(nome__icontains=query) |
+        Q(documento__icontains=query) |
+        Q(nome_pai__icontains=query) |
+        Q(nome_mae__icontains=query)
+    ).order_by('nome', 'id')
+
+
+def busca_indexada(query):
+    return buscar_alunos(Aluno.objects.all(), query).order_by(*ORDENACAO_RELEVANCIA)
+
+
+class Command(BaseCommand):
+    help = 'Compara a busca de alunos por icontains com a busca indexada e mede o autocompletar em uma base sintética'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--alunos',
+            type=int,
+            default=100000,
+            help='Quantidade de alunos sintéticos (padrão: 100000)',
+        )
+        parser.add_argument(
+            '--repeticoes',
+            type=int,
+            default=5,
+            help='Execuções de cada busca; é exibida a mediana (padrão: 5)',
+        )
+        parser.add_argument(
+            '--busca',
+            action='append',
+            dest='buscas',
+            help='Termo a medir (pode repetir); padrão: um conjunto de buscas típicas',
+        )
+        parser.add_argument(
+            '--manter',
+            action='store_true',
+            help=f'Não remove os alunos sintéticos (documento {PREFIXO_DOCUMENTO}...) ao final',
+        )
+
+    def handle(self, *args, **options):
+        if options['alunos'] < 1 or options['repeticoes'] < 1:
+            raise CommandError('--alunos e --repeticoes devem ser maiores que zero.')
+
+        criados = self.preparar_base(options['alunos'])
+        try:
+            self.medir(options['buscas'] or BUSCAS_PADRAO, options['repeticoes'])
+        finally:
+            if criados and not options['manter']:
+                removidos, _ = Aluno.objects.filter(documento__startswith=PREFIXO_DOCUMENTO).delete()
+                invalidar_autocompletar()
+                self.stdout.write(f'🧹 {removidos} registro(s) sintético(s) removido(s).')
+
+    def preparar_base(self, quantidade):
+        existentes = Aluno.objects.filter(documento__startswith=PREFIXO_DOCUMENTO).count()
+        faltando = quantidade - existentes
+        if faltando <= 0:
+            return 0
+
+        self.stdout.write(f'\n⏳ Criando {faltando} aluno(s) sintético(s)...')
+        aleatorio = random.Random(42)
+        lote = []
+        for i in range(existentes, quantidade):
+            aluno = Aluno(
+                nome=_nome(aleatorio),
+                documento=f'{PREFIXO_DOCUMENTO}{i:06d}',
+                nome_pai=_nome(aleatorio),
+                nome_mae=_nome(aleatorio),
+            )
+            aluno.atualizar_busca()
+            lote.append(aluno)
+            if len(lote) == 5000:
+                Aluno.objects.bulk_create(lote)
+                lote = []
+        if lote:
+            Aluno.objects.bulk_create(lote)
+        invalidar_autocompletar()
+        return faltando
+
+    def medir(self, buscas, repeticoes):
+        def mediana(funcao):
+            tempos = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                funcao()
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            return sorted(tempos)[len(tempos) // 2]
+
+        total = Aluno.objects.count()
+        self.stdout.write('\n' + '='*78)
+        self.stdout.write(f'🔎 Busca de alunos em {total} registros (FTS5: {"sim" if fts_disponivel() else "não"})')
+        self.stdout.write('='*78)
+        self.stdout.write(f'{"busca":<20} {"resultados":>10} {"icontains (ms)":>15} {"indexada (ms)":>15} {"1ª pág. (ms)":>13}')
+        for query in buscas:
+            resultados = busca_indexada(query).count()
+            antiga = mediana(lambda: busca_icontains(query).count())
+            nova = mediana(lambda: busca_indexada(query).count())
+            pagina = mediana(lambda: list(busca_indexada(query)[:50]))
+            self.stdout.write(f'{query[:20]:<20} {resultados:>10} {antiga:>15.1f} {nova:>15.1f} {pagina:>13.1f}')
+        self.stdout.write('='*78)
+        self.medir_autocompletar(buscas)
+
+    def medir_autocompletar(self, buscas):
+        inicio = time.perf_counter()
+        autocompletar.sugestoes('aluno', '')
+        montagem = (time.perf_counter() - inicio) * 1000
+
+        # Simula a digitação: cada prefixo de cada busca é uma consulta
+        tempos = []
+        for _ in range(20):
+            for query in buscas:
+                for fim in range(1, len(query) + 1):
+                    inicio = time.perf_counter()
+                    autocompletar.sugestoes('aluno', query[:fim])
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+        tempos.sort()
+        p50 = tempos[len(tempos) // 2]
+        p99 = tempos[min(len(tempos) - 1, int(len(tempos) * 0.99))]
+        self.stdout.write(f'⌨️  Autocompletar: montagem do índice {montagem:.0f} ms; '
+                          f'{len(tempos)} consultas, p50 {p50:.3f} ms, p99 {p99:.3f} ms')
+        self.stdout.write('='*78 + '\n')
@@ -0,0 +1,248 @@
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from escola.instrumentacao import ativar_medidor, medir
+from escola.models import Aluno, Mensalidade, Turma, Usuario
+
+
+USUARIO_BENCHMARK = 'benchmark-endpoints'
+
+
+def _percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))] if valores else 0
+
+
+def endpoints():
+    """(nome, URL) de cada página e rota da API medida, com ids de registros existentes"""
+    aluno = Aluno.objects.filter(mensalidades__isnull=False).order_by('pk').first() or Aluno.objects.order_by('pk').first()
+    turma = Turma.objects.order_by('-ano_letivo', 'pk').first()
+    mensalidade = Mensalidade.objects.order_by('pk').first()
+    ano = Mensalidade.objects.dates('vencimento', 'year', order='DESC').first()
+    ano = ano.year if ano else datetime.now().year
+
+    lista = [
+        ('web:home', '/'),
+        ('web:alunos', '/alunos/'),
+        ('web:alunos_busca', '/alunos/?q=maria'),
+        ('web:turmas', '/turmas/'),
+        ('web:mensalidades', '/mensalidades/'),
+        ('web:mensalidades_filtradas', f'/mensalidades/?status=atrasado&ano={ano}'),
+        ('web:relatorio_financeiro', f'/relatorios/financeiro/?ano={ano}'),
+        ('web:autocompletar', '/autocompletar/?q=mar'),
+        ('api:alunos', '/api/alunos/'),
+        ('api:alunos_busca', '/api/alunos/?search=maria'),
+        ('api:turmas', '/api/turmas/'),
+        ('api:mensalidades', '/api/mensalidades/'),
+        ('api:mensalidades_cursor', '/api/mensalidades/?paginacao=cursor'),
+        ('api:mensalidades_totais', f'/api/mensalidades/totais/?ano={ano}'),
+        ('api:relatorio_financeiro', f'/api/relatorios/financeiro/?ano={ano}'),
+    ]
+    if aluno:
+        lista += [
+            ('web:aluno_detalhe', f'/alunos/{aluno.pk}/'),
+            ('web:historico_pagamentos', f'/alunos/{aluno.pk}/historico/'),
+            ('api:aluno_detalhe', f'/api/alunos/{aluno.pk}/'),
+            ('api:aluno_mensalidades', f'/api/alunos/{aluno.pk}/mensalidades/'),
+        ]
+    if turma:
+        lista += [
+            ('web:turma_detalhe', f'/turmas/{turma.pk}/'),
+            ('api:turma_detalhe', f'/api/turmas/{turma.pk}/'),
+        ]
+    if mensalidade:
+        lista.append(('web:recibo', f'/mensalidades/{mensalidade.pk}/recibo/'))
+    return sorted(lista)
+
+
+def _versao_git():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def comparar(anteriores, atuais, tolerancia):
+    """Endpoints cujo p50 cresceu mais que `tolerancia` % ou que passaram a fazer mais consultas"""
+    regressoes = []
+    for nome, atual in atuais.items():
+        anterior = anteriores.get(nome)
+        if not anterior:
+            continue
+        motivos = []
+        if atual['p50_ms'] > anterior['p50_ms'] * (1 + tolerancia / 100):
+            motivos.append(f'p50 {anterior["p50_ms"]:.1f} → {atual["p50_ms"]:.1f} ms')
+        if atual['consultas'] > anterior['consultas']:
+            motivos.append(f'consultas {anterior["consultas"]} → {atual["consultas"]}')
+        if motivos:
+            regressoes.append((nome, motivos))
+    return regressoes
+
+
+class Command(BaseCommand):
+    help = ('Mede latência, consultas SQL e memória de cada página e rota da API pelo cliente de testes '
+            'e grava o resultado em JSON, para comparar versões')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=20, help='Requisições com o cache quente por endpoint (padrão: 20)')
+        parser.add_argument(
+            '--saida',
+            default='benchmark_endpoints.json',
+            help='Arquivo JSON com os resultados (padrão: benchmark_endpoints.json)',
+        )
+        parser.add_argument('--comparar', help='JSON de uma execução anterior para apontar regressões')
+        parser.add_argument(
+            '--tolerancia',
+            type=float,
+            default=20,
+            help='Aumento do p50, em %%, aceito na comparação (padrão: 20)',
+        )
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            dest='endpoints',
+            help='Mede só os endpoints cujo nome contém o texto (pode repetir)',
+        )
+        parser.add_argument(
+            '--falhar-em-regressao',
+            action='store_true',
+            help='Termina com erro se a comparação apontar regressões (para uso em CI)',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeticoes'] < 1:
+            raise CommandError('--repeticoes deve ser maior que zero.')
+        anteriores = None
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as arquivo:
+                    anteriores = json.load(arquivo)['endpoints']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f'Não foi possível ler {options["comparar"]}: {e}')
+        if not Aluno.objects.exists():
+            self.stdout.write(self.style.WARNING(
+                '⚠️  Banco sem alunos: rode gerar_dados_sinteticos antes para medidas representativas.'
+            ))
+
+        selecionados = [
+            (nome, url) for nome, url in endpoints()
+            if not options['endpoints'] or any(filtro in nome for filtro in options['endpoints'])
+        ]
+        if not selecionados:
+            raise CommandError('Nenhum endpoint corresponde a --endpoint.')
+
+        usuario, criado = Usuario.objects.get_or_create(
+            username=USUARIO_BENCHMARK, defaults={'is_staff': True, 'tipo': 'admin'}
+        )
+        cliente = Client()
+        ativar_medidor()
+        resultados = {}
+        try:
+            # O cliente de testes usa o host testserver
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                cliente.force_login(usuario)
+                self.stdout.write('\n' + '='*70)
+                self.stdout.write(f'⏱️  {len(selecionados)} endpoint(s), {options["repeticoes"]} repetição(ões) com cache quente')
+                self.stdout.write('='*70)
+                self.stdout.write(
+                    f'{"endpoint":<30} {"frio":>7} {"p50":>7} {"p95":>7} {"SQL":>4} {"dup":>4} {"KiB":>7}'
+                )
+                for nome, url in selecionados:
+                    resultado = self.medir(cliente, url, options['repeticoes'])
+                    resultados[nome] = resultado
+                    self.stdout.write(
+                        f'{nome:<30} {resultado["frio_ms"]:>7.1f} {resultado["p50_ms"]:>7.1f} '
+                        f'{resultado["p95_ms"]:>7.1f} {resultado["consultas"]:>4} {resultado["duplicadas"]:>4} '
+                        f'{resultado["memoria_pico_kib"]:>7.0f}'
+                        + ('' if resultado['status'] == 200 else f'  ⚠️ HTTP {resultado["status"]}')
+                    )
+                self.stdout.write('='*70)
+        finally:
+            cliente.logout()
+            if criado:
+                usuario.delete()
+
+        with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+            json.dump({'ambiente': self.ambiente(options), 'endpoints': resultados}, arquivo, ensure_ascii=False, indent=2)
+        self.stdout.write(f'💾 Resultados gravados em {options["saida"]} (tempos em ms)')
+
+        if anteriores is not None:
+            regressoes = comparar(anteriores, resultados, options['tolerancia'])
+            for nome, motivos in regressoes:
+                self.stdout.write(self.style.WARNING(f'📉 {nome}: {"; ".join(motivos)}'))
+            if not regressoes:
+                self.stdout.write(self.style.SUCCESS(f'✅ Nenhuma regressão em relação a {options["comparar"]}'))
+            elif options['falhar_em_regressao']:
+                raise CommandError(f'{len(regressoes)} endpoint(s) com regressão.')
+        self.stdout.write('')
+
+    def requisitar(self, cliente, url):
+        """GET lendo todo o conteúdo, inclusive de respostas em streaming"""
+        response = cliente.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def medir(self, cliente, url, repeticoes):
+        # Primeira requisição com o cache vazio
+        cache.clear()
+        with medir() as medicao:
+            response = self.requisitar(cliente, url)
+        frio = medicao.duracao * 1000
+
+        duracoes = []
+        for _ in range(repeticoes):
+            with medir() as medicao:
+                self.requisitar(cliente, url)
+            duracoes.append(medicao.duracao * 1000)
+        duracoes.sort()
+
+        # Pico de memória alocada em uma requisição a mais (tracemalloc deixa o código mais lento)
+        tracemalloc.start()
+        try:
+            self.requisitar(cliente, url)
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'url': url,
+            'status': response.status_code,
+            'frio_ms': round(frio, 2),
+            'p50_ms': round(_percentil(duracoes, 0.50), 2),
+            'p95_ms': round(_percentil(duracoes, 0.95), 2),
+            'max_ms': round(duracoes[-1], 2),
+            # Consultas da última requisição com o cache quente
+            'consultas': medicao.consultas,
+            'duplicadas': medicao.duplicadas,
+            'sql_ms': round(medicao.tempo_sql * 1000, 2),
+            'memoria_pico_kib': round(pico / 1024, 1),
+        }
+
+    def ambiente(self, options):
+        return {
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+            'commit': _versao_git(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'banco': connection.vendor,
+            'cache': settings.CACHE_BACKEND,
+            'views_assincronas': settings.ESCOLA_VIEWS_ASSINCRONAS,
+            'debug': settings.DEBUG,
+            'repeticoes': options['repeticoes'],
+            'alunos': Aluno.objects.count(),
+            'turmas': Turma.objects.count(),
+            'mensalidades': Mensalidade.objects.count(),
+        }
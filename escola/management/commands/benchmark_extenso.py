@@ -0,0 +1,59 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Context, Template
+from escola.extenso import reais_por_extenso
+
+
+class Command(BaseCommand):
+    help = 'Mede o custo do filtro extenso, com e sem o cache, em valores típicos de mensalidades'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chamadas',
+            type=int,
+            default=100000,
+            help='Chamadas medidas em cada cenário (padrão: 100000)',
+        )
+        parser.add_argument(
+            '--valores',
+            type=int,
+            default=50,
+            help='Valores distintos, como os valores de mensalidade de uma escola (padrão: 50)',
+        )
+
+    def handle(self, *args, **options):
+        if options['chamadas'] < 1 or options['valores'] < 1:
+            raise CommandError('--chamadas e --valores devem ser maiores que zero.')
+
+        aleatorio = random.Random(42)
+        distintos = [Decimal(aleatorio.randrange(10000, 500000)) / 100 for _ in range(options['valores'])]
+        valores = [aleatorio.choice(distintos) for _ in range(options['chamadas'])]
+        arbitrarios = [Decimal(aleatorio.randrange(0, 10 ** 14)) / 100 for _ in range(options['chamadas'])]
+        template = Template('{% load custom_filters %}{{ valor|extenso }}')
+
+        def medir(funcao, entradas):
+            inicio = time.perf_counter()
+            for valor in entradas:
+                funcao(valor)
+            return (time.perf_counter() - inicio) * 1e6 / len(entradas)
+
+        sem_cache = reais_por_extenso.__wrapped__
+        cenarios = [
+            ('tabela, sem cache (valores até bilhões)', sem_cache, arbitrarios),
+            ('tabela, sem cache (mensalidades)', sem_cache, valores),
+            ('com cache (mensalidades)', reais_por_extenso, valores),
+            ('filtro no template (mensalidades)', lambda v: template.render(Context({'valor': v})), valores),
+        ]
+
+        self.stdout.write('\n' + '='*60)
+        self.stdout.write(f'🔢 extenso: {options["chamadas"]} chamadas por cenário')
+        self.stdout.write('='*60)
+        reais_por_extenso.cache_clear()
+        for nome, funcao, entradas in cenarios:
+            self.stdout.write(f'{nome:<45} {medir(funcao, entradas):>8.2f} µs')
+        info = reais_por_extenso.cache_info()
+        self.stdout.write(f'Cache: {info.hits} acertos, {info.misses} faltas, {info.currsize} itens')
+        self.stdout.write('='*60 + '\n')
@@ -0,0 +1,154 @@
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from escola.models import Aluno, Usuario
+
+
+USUARIO_BENCHMARK = 'benchmark-servidores'
+
+URLS_PADRAO = ['/', '/alunos/', '/turmas/', '/mensalidades/', '/autocompletar/?q=mar']
+
+MODOS = ('wsgi', 'asgi')
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))] if valores else 0
+
+
+async def _get(porta, url, cookie):
+    """GET com uma conexão nova (os workers síncronos do gunicorn não mantêm keep-alive)"""
+    leitor, escritor = await asyncio.open_connection('127.0.0.1', porta)
+    try:
+        escritor.write(
+            f'GET {url} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookie}\r\nConnection: close\r\n\r\n'.encode()
+        )
+        await escritor.drain()
+        resposta = await leitor.read()
+    finally:
+        escritor.close()
+    return int(resposta.split(b' ', 2)[1])
+
+
+async def _carga(porta, urls, cookie, conexoes, segundos):
+    """Mantém `conexoes` clientes fazendo requisições até o prazo; retorna (latências em ms, erros)"""
+    prazo = time.monotonic() + segundos
+    latencias, erros = [], [0]
+
+    async def cliente(deslocamento):
+        i = deslocamento
+        while time.monotonic() < prazo:
+            url = urls[i % len(urls)]
+            i += 1
+            inicio = time.perf_counter()
+            try:
+                status = await _get(porta, url, cookie)
+            except OSError:
+                status = None
+            if status == 200:
+                latencias.append((time.perf_counter() - inicio) * 1000)
+            else:
+                erros[0] += 1
+
+    await asyncio.gather(*(cliente(i) for i in range(conexoes)))
+    return sorted(latencias), erros[0]
+
+
+class Command(BaseCommand):
+    help = 'Compara requisições por segundo e latência das páginas de leitura com o gunicorn em WSGI e em ASGI (uvicorn)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Workers do gunicorn (padrão: 2)')
+        parser.add_argument('--conexoes', type=int, default=32, help='Clientes simultâneos (padrão: 32)')
+        parser.add_argument('--segundos', type=float, default=10, help='Duração de cada rodada (padrão: 10)')
+        parser.add_argument(
+            '--modo',
+            action='append',
+            dest='modos',
+            choices=MODOS,
+            help='Modo a medir (pode repetir); padrão: wsgi e asgi',
+        )
+        parser.add_argument(
+            '--url',
+            action='append',
+            dest='urls',
+            help='Caminho requisitado (pode repetir); padrão: dashboard, listas e autocompletar',
+        )
+
+    def handle(self, *args, **options):
+        if min(options['workers'], options['conexoes']) < 1 or options['segundos'] <= 0:
+            raise CommandError('--workers, --conexoes e --segundos devem ser maiores que zero.')
+        if not Aluno.objects.exists():
+            self.stdout.write(self.style.WARNING('⚠️  Banco sem alunos: as páginas medidas estarão vazias.'))
+
+        usuario, criado = Usuario.objects.get_or_create(username=USUARIO_BENCHMARK, defaults={'is_staff': True})
+        cliente = Client()
+        cliente.force_login(usuario)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}'
+        urls = options['urls'] or URLS_PADRAO
+
+        try:
+            self.stdout.write('\n' + '='*70)
+            self.stdout.write(f'🌐 gunicorn com {options["workers"]} worker(s), {options["conexoes"]} conexões, '
+                              f'{options["segundos"]:g} s por modo')
+            self.stdout.write(f'   URLs: {", ".join(urls)}')
+            self.stdout.write('='*70)
+            self.stdout.write(f'{"modo":<6} {"req/s":>8} {"p50 (ms)":>10} {"p95 (ms)":>10} {"p99 (ms)":>10} {"erros":>7}')
+            for modo in options['modos'] or MODOS:
+                latencias, erros = self.medir(modo, urls, cookie, options)
+                self.stdout.write(
+                    f'{modo:<6} {len(latencias) / options["segundos"]:>8.1f} {_percentil(latencias, 0.5):>10.1f} '
+                    f'{_percentil(latencias, 0.95):>10.1f} {_percentil(latencias, 0.99):>10.1f} {erros:>7}'
+                )
+            self.stdout.write('='*70 + '\n')
+        finally:
+            cliente.logout()
+            if criado:
+                usuario.delete()
+
+    def medir(self, modo, urls, cookie, options):
+        porta = _porta_livre()
+        servidor = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{porta}', '--workers', str(options['workers'])],
+            cwd=settings.BASE_DIR,
+            # Em ASGI mede as views assíncronas, que são opcionais
+            env={**os.environ, 'SERVIDOR': modo, 'ESCOLA_VIEWS_ASSINCRONAS': str(modo == 'asgi')},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            self.aguardar(servidor, porta, urls, cookie)
+            return asyncio.run(_carga(porta, urls, cookie, options['conexoes'], options['segundos']))
+        finally:
+            servidor.send_signal(signal.SIGTERM)
+            servidor.wait(timeout=30)
+
+    def aguardar(self, servidor, porta, urls, cookie):
+        """Espera o servidor subir e faz uma requisição a cada URL (índices e caches de cada worker)"""
+        prazo = time.monotonic() + 30
+        while True:
+            if servidor.poll() is not None:
+                raise CommandError('O gunicorn terminou ao iniciar; rode-o manualmente para ver o erro.')
+            try:
+                for url in urls:
+                    status = asyncio.run(_get(porta, url, cookie))
+                    if status != 200:
+                        raise CommandError(f'{url} respondeu {status}.')
+                return
+            except OSError:
+                if time.monotonic() > prazo:
+                    raise CommandError('O gunicorn não respondeu em 30 s.')
+                time.sleep(0.2)
@@ -0,0 +1,80 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from escola.conciliacao import LEITORES, MOTIVOS, RelatorioDivergenciasCsv, conciliar
+
+
+class Command(BaseCommand):
+    help = 'Dá baixa nas mensalidades a partir de um arquivo de retorno bancário (CSV ou posicional)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'arquivo',
+            help='Arquivo de retorno bancário',
+        )
+        parser.add_argument(
+            '--formato',
+            choices=['auto', *LEITORES],
+            default='auto',
+            help='Formato do arquivo (padrão: detecta pelo conteúdo)',
+        )
+        parser.add_argument(
+            '--encoding',
+            default='utf-8',
+            help='Codificação do arquivo (padrão: utf-8)',
+        )
+        parser.add_argument(
+            '--relatorio',
+            help='Grava as divergências neste arquivo CSV (use - para a saída padrão)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Linhas do arquivo processadas por lote',
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Apenas confere o arquivo, sem dar baixa nas mensalidades',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            arquivo = open(options['arquivo'], encoding=options['encoding'], errors='replace', newline='')
+        except OSError as e:
+            raise CommandError(f'Não foi possível abrir {options["arquivo"]}: {e}')
+
+        relatorio = None
+        registrar = None
+        if options['relatorio'] == '-':
+            registrar = RelatorioDivergenciasCsv(sys.stdout)
+        elif options['relatorio']:
+            relatorio = open(options['relatorio'], 'w', encoding='utf-8', newline='')
+            registrar = RelatorioDivergenciasCsv(relatorio)
+
+        try:
+            with arquivo:
+                resultado = conciliar(
+                    arquivo,
+                    formato=options['formato'],
+                    nome_arquivo=options['arquivo'],
+                    registrar_divergencia=registrar,
+                    chunk_size=options['chunk_size'],
+                    simular=options['simular'],
+                )
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if relatorio:
+                relatorio.close()
+
+        titulo = '🔎 Simulação concluída (nada foi gravado)' if resultado.simulacao else '✅ Conciliação concluída!'
+        self.stderr.write('\n' + '='*60)
+        self.stderr.write(self.style.SUCCESS(titulo))
+        self.stderr.write(f'   • Linhas lidas: {resultado.linhas_lidas}')
+        self.stderr.write(f'   • Mensalidades baixadas: {resultado.conciliadas}')
+        self.stderr.write(f'   • Valor conciliado: R$ {resultado.valor_conciliado}')
+        self.stderr.write(f'   • Divergências: {resultado.total_divergencias}')
+        for motivo, quantidade in resultado.divergencias.most_common():
+            self.stderr.write(f'       - {MOTIVOS[motivo]}: {quantidade}')
+        self.stderr.write('='*60 + '\n')
@@ -0,0 +1,39 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from escola.relatorios import atualizar_desatualizados, consolidar
+
+
+class Command(BaseCommand):
+    help = 'Atualiza a consolidação mensal usada nos relatórios de faturamento e inadimplência'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tudo',
+            action='store_true',
+            help='Reconstrói a tabela inteira (padrão: só os meses em aberto calculados em outro dia)',
+        )
+        parser.add_argument(
+            '--data',
+            help='Data de referência para as faixas de atraso, no formato AAAA-MM-DD (padrão: hoje)',
+        )
+
+    def handle(self, *args, **options):
+        hoje = None
+        if options['data']:
+            try:
+                hoje = datetime.strptime(options['data'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Data inválida. Use o formato AAAA-MM-DD.')
+
+        inicio = time.perf_counter()
+        if options['tudo']:
+            gravadas = consolidar(hoje=hoje, tudo=True)
+        else:
+            gravadas = atualizar_desatualizados(hoje)
+        duracao = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {gravadas} linha(s) de consolidação gravada(s) em {duracao:.1f}s.'
+        ))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from escola.filtros import filtrar_mensalidades
+from escola.models import Mensalidade
+from escola.recibos import FORMA_PAGAMENTO_PADRAO, documento_recibos
+
+
+class Command(BaseCommand):
+    help = 'Emite os recibos das mensalidades filtradas em um único documento HTML, um recibo por página'
+
+    def add_arguments(self, parser):
+        parser.add_argument('saida', help='Arquivo HTML de saída')
+        parser.add_argument('--mes', type=int, help='Mês do vencimento')
+        parser.add_argument('--ano', type=int, help='Ano do vencimento')
+        parser.add_argument('--turma', type=int, help='Id da turma dos alunos')
+        parser.add_argument(
+            '--status',
+            choices=['pendente', 'pago', 'atrasado'],
+            default='pago',
+            help='Status das mensalidades (padrão: pago)',
+        )
+        parser.add_argument(
+            '--forma',
+            default=FORMA_PAGAMENTO_PADRAO,
+            help=f'Forma de pagamento impressa nos recibos (padrão: {FORMA_PAGAMENTO_PADRAO})',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Processos de renderização (padrão: ESCOLA_RECIBOS_WORKERS)',
+        )
+
+    def handle(self, *args, **options):
+        if (options['mes'] is None) != (options['ano'] is None):
+            raise CommandError('Informe --mes e --ano juntos.')
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('--workers deve ser maior que zero.')
+
+        filtros = {'status': options['status']}
+        if options['mes'] is not None:
+            for prefixo in ('inicial', 'final'):
+                filtros[f'mes_{prefixo}'] = str(options['mes'])
+                filtros[f'ano_{prefixo}'] = str(options['ano'])
+        if options['turma'] is not None:
+            filtros['turma'] = str(options['turma'])
+        mensalidades = filtrar_mensalidades(Mensalidade.objects.all(), filtros)
+
+        try:
+            arquivo = open(options['saida'], 'w', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f'Não foi possível abrir {options["saida"]}: {e}')
+
+        recibos = -2  # início e fim do documento
+        with arquivo:
+            for trecho in documento_recibos(mensalidades, options['forma'], options['workers']):
+                arquivo.write(trecho)
+                recibos += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {recibos} recibo(s) emitido(s) em {options["saida"]}'))
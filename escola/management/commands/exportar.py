@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from escola.exportacao import (
+    COLUNAS_ALUNOS, COLUNAS_MENSALIDADES, FORMATOS,
+    alunos_para_exportar, exportar, mensalidades_para_exportar,
+)
+
+
+class Command(BaseCommand):
+    help = 'Exporta mensalidades ou alunos em CSV/NDJSON, em streaming'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'modelo',
+            choices=['mensalidades', 'alunos'],
+            help='O que exportar',
+        )
+        parser.add_argument(
+            '--formato',
+            choices=list(FORMATOS),
+            default='csv',
+            help='Formato de saída (padrão: csv)',
+        )
+        parser.add_argument(
+            '--saida',
+            help='Arquivo de saída (padrão: saída padrão)',
+        )
+        # Mesmos filtros da listagem web
+        parser.add_argument('--q', help='Busca por nome')
+        parser.add_argument('--status', choices=['pendente', 'pago', 'atrasado'], help='Status da mensalidade')
+        parser.add_argument('--mes-inicial', type=int, help='Mês inicial do vencimento')
+        parser.add_argument('--ano-inicial', type=int, help='Ano inicial do vencimento')
+        parser.add_argument('--mes-final', type=int, help='Mês final do vencimento')
+        parser.add_argument('--ano-final', type=int, help='Ano final do vencimento')
+        parser.add_argument('--aluno-ativo', choices=['0', '1'], help='Somente alunos ativos (1) ou inativos (0)')
+        parser.add_argument('--turma', type=int, help='Id da turma dos alunos')
+        parser.add_argument('--ativo', choices=['0', '1'], help='Alunos: somente ativos (1) ou inativos (0)')
+
+    def handle(self, *args, **options):
+        filtros = {
+            chave: str(options[chave])
+            for chave in ['q', 'status', 'mes_inicial', 'ano_inicial', 'mes_final', 'ano_final', 'aluno_ativo', 'turma', 'ativo']
+            if options[chave] is not None
+        }
+
+        if options['modelo'] == 'mensalidades':
+            conteudo = exportar(mensalidades_para_exportar(filtros), COLUNAS_MENSALIDADES, options['formato'])
+        else:
+            conteudo = exportar(alunos_para_exportar(filtros), COLUNAS_ALUNOS, options['formato'])
+
+        if not options['saida']:
+            for trecho in conteudo:
+                self.stdout.write(trecho, ending='')
+            return
+
+        try:
+            arquivo = open(options['saida'], 'w', encoding='utf-8', newline='')
+        except OSError as e:
+            raise CommandError(f'Não foi possível abrir {options["saida"]}: {e}')
+
+        linhas = 0
+        with arquivo:
+            for trecho in conteudo:
+                arquivo.write(trecho)
+                linhas += 1
+
+        if options['formato'] == 'csv':
+            linhas -= 1  # cabeçalho
+        self.stdout.write(self.style.SUCCESS(f'✅ {linhas} registro(s) exportado(s) para {options["saida"]}'))
@@ -0,0 +1,222 @@
+import calendar
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from escola.autocompletar import invalidar_autocompletar
+from escola.em_cache import invalidar
+from escola.management.commands.benchmark_busca import NOMES, SOBRENOMES, _nome
+from escola.models import Aluno, Mensalidade, Turma, Usuario
+from escola.relatorios import consolidar
+from escola.resumos import recalcular_resumos
+
+
+PREFIXO_DOCUMENTO = 'SINT-'
+PREFIXO_PROFESSOR = 'sint.prof'
+
+VALORES_MENSALIDADE = [Decimal(valor) for valor in ('350.00', '450.00', '550.00', '650.00', '780.00')]
+PERIODOS = ['matutino', 'vespertino', 'noturno']
+
+
+def _em_lotes(objetos, model, tamanho):
+    """bulk_create de um gerador, sem manter todos os objetos em memória"""
+    lote, total = [], 0
+    for objeto in objetos:
+        lote.append(objeto)
+        if len(lote) == tamanho:
+            model.objects.bulk_create(lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        model.objects.bulk_create(lote)
+        total += len(lote)
+    return total
+
+
+class Command(BaseCommand):
+    help = 'Gera em lote uma base sintética e reproduzível (semente fixa) de professores, alunos, turmas e mensalidades'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alunos', type=int, default=100000, help='Quantidade de alunos (padrão: 100000)')
+        parser.add_argument('--professores', type=int, default=50, help='Quantidade de professores (padrão: 50)')
+        parser.add_argument(
+            '--turmas',
+            type=int,
+            help='Turmas por ano letivo (padrão: uma para cada 35 alunos)',
+        )
+        parser.add_argument('--anos', type=int, default=2, help='Anos letivos com turmas e mensalidades (padrão: 2)')
+        parser.add_argument('--semente', type=int, default=42, help='Semente do gerador aleatório (padrão: 42)')
+        parser.add_argument(
+            '--data',
+            help='Data de referência (AAAA-MM-DD) para o último ano letivo e o status das mensalidades (padrão: hoje)',
+        )
+        parser.add_argument('--lote', type=int, default=5000, help='Registros por INSERT (padrão: 5000)')
+        parser.add_argument(
+            '--limpar',
+            action='store_true',
+            help=f'Remove antes os dados sintéticos existentes (documento {PREFIXO_DOCUMENTO}..., '
+                 f'professores {PREFIXO_PROFESSOR}...)',
+        )
+
+    def handle(self, *args, **options):
+        if min(options['alunos'], options['professores'], options['anos'], options['lote']) < 1:
+            raise CommandError('--alunos, --professores, --anos e --lote devem ser maiores que zero.')
+        if options['turmas'] is not None and options['turmas'] < 1:
+            raise CommandError('--turmas deve ser maior que zero.')
+        hoje = date.today()
+        if options['data']:
+            try:
+                hoje = datetime.strptime(options['data'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Data inválida. Use o formato AAAA-MM-DD.')
+
+        if options['limpar']:
+            self.limpar()
+        elif Aluno.objects.filter(documento__startswith=PREFIXO_DOCUMENTO).exists():
+            raise CommandError('Já existem dados sintéticos. Use --limpar para gerá-los de novo.')
+
+        self.aleatorio = random.Random(options['semente'])
+        self.lote = options['lote']
+        anos = list(range(hoje.year - options['anos'] + 1, hoje.year + 1))
+        turmas_por_ano = options['turmas'] or max(1, options['alunos'] // 35)
+
+        inicio = time.perf_counter()
+        # Uma transação só: no SQLite cada commit custa um fsync
+        with transaction.atomic():
+            professores = self.gerar_professores(options['professores'])
+            turmas = self.gerar_turmas(anos, turmas_por_ano, professores)
+            alunos = self.gerar_alunos(options['alunos'])
+            matriculas = self.matricular(alunos, turmas)
+            mensalidades = self.gerar_mensalidades(alunos, anos, hoje)
+        self.stdout.write(f'⏳ Dados inseridos em {time.perf_counter() - inicio:.1f} s; calculando resumos e relatórios...')
+
+        # bulk_create não dispara signals: atualiza os dados derivados de uma vez
+        recalcular_resumos(hoje=hoje)
+        consolidar(hoje=hoje, tudo=True)
+        invalidar('dashboard', 'anos', 'turmas')
+        invalidar_autocompletar()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {len(professores)} professor(es), {sum(len(t) for t in turmas.values())} turma(s), '
+            f'{len(alunos)} aluno(s), {matriculas} matrícula(s) e {mensalidades} mensalidade(s) '
+            f'em {time.perf_counter() - inicio:.1f} s (semente {options["semente"]})'
+        ))
+
+    def limpar(self):
+        removidos, _ = Aluno.objects.filter(documento__startswith=PREFIXO_DOCUMENTO).delete()
+        Turma.objects.filter(professor_responsavel__username__startswith=PREFIXO_PROFESSOR).delete()
+        Usuario.objects.filter(username__startswith=PREFIXO_PROFESSOR).delete()
+        invalidar('dashboard', 'anos', 'turmas')
+        invalidar_autocompletar()
+        self.stdout.write(f'🧹 {removidos} registro(s) sintético(s) removido(s).')
+
+    def gerar_professores(self, quantidade):
+        # Todos com a mesma senha (senha123): o hash é calculado uma vez só
+        senha = make_password('senha123')
+        professores = []
+        for i in range(quantidade):
+            nome, sobrenome = self.aleatorio.choice(NOMES), self.aleatorio.choice(SOBRENOMES)
+            professores.append(Usuario(
+                username=f'{PREFIXO_PROFESSOR}{i:04d}',
+                first_name=nome,
+                last_name=sobrenome,
+                email=f'{PREFIXO_PROFESSOR}{i:04d}@escola.com',
+                tipo='professor',
+                password=senha,
+            ))
+        Usuario.objects.bulk_create(professores)
+        return list(Usuario.objects.filter(username__startswith=PREFIXO_PROFESSOR).order_by('username').values_list('pk', flat=True))
+
+    def gerar_turmas(self, anos, por_ano, professores):
+        """Turmas de cada ano letivo; retorna {ano: [ids]}"""
+        turmas = (
+            Turma(
+                nome=f'{i % 9 + 1}º Ano {i // 9 + 1}',
+                ano_letivo=ano,
+                periodo=PERIODOS[i % len(PERIODOS)],
+                professor_responsavel_id=self.aleatorio.choice(professores),
+                ativa=ano == anos[-1],
+            )
+            for ano in anos for i in range(por_ano)
+        )
+        _em_lotes(turmas, Turma, self.lote)
+        ids = {ano: [] for ano in anos}
+        sinteticas = Turma.objects.filter(professor_responsavel__username__startswith=PREFIXO_PROFESSOR)
+        for pk, ano in sinteticas.order_by('pk').values_list('pk', 'ano_letivo'):
+            ids[ano].append(pk)
+        return ids
+
+    def gerar_alunos(self, quantidade):
+        """Retorna [(id, valor da mensalidade, ativo)] na ordem do documento"""
+        def alunos():
+            for i in range(quantidade):
+                nascimento = date(2005, 1, 1) + timedelta(days=self.aleatorio.randrange(15 * 365))
+                aluno = Aluno(
+                    nome=_nome(self.aleatorio),
+                    documento=f'{PREFIXO_DOCUMENTO}{i:07d}',
+                    nome_pai=_nome(self.aleatorio),
+                    nome_mae=_nome(self.aleatorio),
+                    data_nascimento=nascimento,
+                    telefone=f'(11) 9{self.aleatorio.randrange(10**8):08d}',
+                    email=f'aluno{i:07d}@exemplo.com',
+                    valor_mensalidade=self.aleatorio.choice(VALORES_MENSALIDADE),
+                    ativo=self.aleatorio.random() < 0.95,
+                )
+                aluno.atualizar_busca()
+                yield aluno
+
+        _em_lotes(alunos(), Aluno, self.lote)
+        return list(
+            Aluno.objects.filter(documento__startswith=PREFIXO_DOCUMENTO)
+            .order_by('documento')
+            .values_list('pk', 'valor_mensalidade', 'ativo')
+        )
+
+    def matricular(self, alunos, turmas):
+        """Cada aluno em uma turma de cada ano letivo; guarda a turma de cada (aluno, ano)"""
+        Matricula = Turma.alunos.through
+        self.turma_do_aluno = {}
+
+        def matriculas():
+            for ano, ids in turmas.items():
+                for aluno_id, _, _ in alunos:
+                    turma_id = self.turma_do_aluno[aluno_id, ano] = self.aleatorio.choice(ids)
+                    yield Matricula(turma_id=turma_id, aluno_id=aluno_id)
+
+        return _em_lotes(matriculas(), Matricula, self.lote)
+
+    def gerar_mensalidades(self, alunos, anos, hoje):
+        """
+        Uma mensalidade por aluno e mês dos anos letivos, com vencimento no dia 10.
+
+        As vencidas estão pagas (85%, entre 5 dias antes e 10 depois do
+        vencimento) ou atrasadas; as demais, pendentes. Alunos inativos
+        só têm mensalidades até o fim do primeiro ano.
+        """
+        def mensalidades():
+            for aluno_id, valor, ativo in alunos:
+                for ano in anos if ativo else anos[:1]:
+                    for mes in range(1, 13):
+                        vencimento = date(ano, mes, min(10, calendar.monthrange(ano, mes)[1]))
+                        status, pagamento = 'pendente', None
+                        if vencimento < hoje:
+                            if self.aleatorio.random() < 0.85:
+                                status = 'pago'
+                                pagamento = min(hoje, vencimento + timedelta(days=self.aleatorio.randint(-5, 10)))
+                            else:
+                                status = 'atrasado'
+                        yield Mensalidade(
+                            aluno_id=aluno_id,
+                            valor=valor,
+                            vencimento=vencimento,
+                            competencia=Mensalidade.competencia_de(vencimento),
+                            turma_id=self.turma_do_aluno.get((aluno_id, ano)),
+                            status=status,
+                            data_pagamento=pagamento,
+                        )
+
+        return _em_lotes(mensalidades(), Mensalidade, self.lote)
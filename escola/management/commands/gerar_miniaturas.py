@@ -0,0 +1,59 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+from escola.miniaturas import gerar_miniaturas
+from escola.models import Aluno
+
+
+class Command(BaseCommand):
+    help = 'Gera as miniaturas das fotos dos alunos que ainda não as têm, em paralelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Fotos processadas ao mesmo tempo (padrão: 4)',
+        )
+        parser.add_argument(
+            '--todas',
+            action='store_true',
+            help='Gera de novo as miniaturas de todas as fotos (por exemplo, após mudar o formato)',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers deve ser maior que zero.')
+
+        alunos = Aluno.objects.exclude(foto='').exclude(foto__isnull=True)
+        if not options['todas']:
+            alunos = alunos.exclude(foto_miniaturas=F('foto'))
+        fotos = list(alunos.order_by('pk').values_list('pk', 'foto'))
+        storage = Aluno._meta.get_field('foto').storage
+
+        def processar(foto):
+            aluno_id, nome = foto
+            try:
+                gerar_miniaturas(storage, nome)
+            except Exception as e:
+                return aluno_id, nome, e
+            return aluno_id, nome, None
+
+        inicio = time.perf_counter()
+        geradas = erros = 0
+        # Só o Pillow roda nas threads; o banco é atualizado aqui, uma foto por vez
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for aluno_id, nome, erro in executor.map(processar, fotos):
+                if erro is not None:
+                    erros += 1
+                    self.stderr.write(f'❌ Aluno {aluno_id} ({nome}): {erro}')
+                    continue
+                Aluno.objects.filter(pk=aluno_id, foto=nome).update(foto_miniaturas=nome)
+                geradas += 1
+
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'✅ Miniaturas geradas para {geradas} foto(s) em {duracao:.1f} s'))
+        if erros:
+            self.stdout.write(self.style.WARNING(f'⚠️  {erros} foto(s) não puderam ser processadas'))
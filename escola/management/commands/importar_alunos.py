@@ -0,0 +1,85 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from escola.importacao import ArquivoInvalido, LEITORES, RelatorioErrosCsv, detectar_formato, importar_alunos
+
+
+class Command(BaseCommand):
+    help = 'Importa alunos (e suas matrículas nas turmas) de uma planilha CSV ou XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'arquivo',
+            help='Planilha com os alunos',
+        )
+        parser.add_argument(
+            '--formato',
+            choices=['auto', *LEITORES],
+            default='auto',
+            help='Formato do arquivo (padrão: detecta pela extensão)',
+        )
+        parser.add_argument(
+            '--encoding',
+            default='utf-8',
+            help='Codificação do CSV (padrão: utf-8)',
+        )
+        parser.add_argument(
+            '--relatorio',
+            help='Grava as linhas com erro neste arquivo CSV (use - para a saída padrão)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Linhas da planilha processadas por lote',
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Apenas valida a planilha, sem gravar os alunos',
+        )
+
+    def handle(self, *args, **options):
+        formato = options['formato']
+        if formato == 'auto':
+            formato = detectar_formato(options['arquivo'])
+
+        try:
+            if formato == 'csv':
+                arquivo = open(options['arquivo'], encoding=options['encoding'], errors='replace', newline='')
+            else:
+                arquivo = open(options['arquivo'], 'rb')
+        except OSError as e:
+            raise CommandError(f'Não foi possível abrir {options["arquivo"]}: {e}')
+
+        relatorio = None
+        registrar = None
+        if options['relatorio'] == '-':
+            registrar = RelatorioErrosCsv(sys.stdout)
+        elif options['relatorio']:
+            relatorio = open(options['relatorio'], 'w', encoding='utf-8', newline='')
+            registrar = RelatorioErrosCsv(relatorio)
+
+        try:
+            with arquivo:
+                resultado = importar_alunos(
+                    arquivo,
+                    formato=formato,
+                    registrar_erro=registrar,
+                    chunk_size=options['chunk_size'],
+                    simular=options['simular'],
+                )
+        except ArquivoInvalido as e:
+            raise CommandError(str(e))
+        finally:
+            if relatorio:
+                relatorio.close()
+
+        titulo = '🔎 Simulação concluída (nada foi gravado)' if resultado.simulacao else '✅ Importação concluída!'
+        self.stderr.write('\n' + '='*60)
+        self.stderr.write(self.style.SUCCESS(titulo))
+        self.stderr.write(f'   • Linhas lidas: {resultado.linhas_lidas}')
+        self.stderr.write(f'   • Alunos criados: {resultado.criados}')
+        self.stderr.write(f'   • Matrículas em turmas: {resultado.matriculas}')
+        if resultado.erros:
+            self.stderr.write(self.style.WARNING(f'   • Linhas com erro: {resultado.erros}'))
+        self.stderr.write('='*60 + '\n')
@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from escola.cobranca import marcar_atrasadas
+
+
+class Command(BaseCommand):
+    help = 'Marca como atrasadas as mensalidades pendentes com vencimento passado'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--data',
+            help='Data de referência no formato AAAA-MM-DD (padrão: hoje)',
+        )
+
+    def handle(self, *args, **options):
+        hoje = None
+        if options['data']:
+            try:
+                hoje = date.fromisoformat(options['data'])
+            except ValueError:
+                raise CommandError('Use o formato AAAA-MM-DD em --data.')
+
+        atualizadas = marcar_atrasadas(hoje)
+
+        if atualizadas:
+            self.stdout.write(self.style.SUCCESS(f'✅ {atualizadas} mensalidade(s) marcada(s) como atrasada(s).'))
+        else:
+            self.stdout.write('Nenhuma mensalidade pendente vencida.')
@@ -0,0 +1,42 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from escola.resumos import recalcular_resumos
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói os resumos financeiros dos alunos a partir das mensalidades'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'alunos',
+            nargs='*',
+            type=int,
+            help='Ids dos alunos a recalcular (padrão: todos)',
+        )
+        parser.add_argument(
+            '--data',
+            help='Data de referência para a sequência em dia, no formato AAAA-MM-DD (padrão: hoje)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Alunos recalculados por consulta',
+        )
+
+    def handle(self, *args, **options):
+        hoje = None
+        if options['data']:
+            try:
+                hoje = datetime.strptime(options['data'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Data inválida. Use o formato AAAA-MM-DD.')
+
+        inicio = time.perf_counter()
+        gravados = recalcular_resumos(options['alunos'] or None, hoje, options['chunk_size'])
+        duracao = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {gravados} resumo(s) financeiro(s) recalculado(s) em {duracao:.1f}s.'
+        ))
@@ -0,0 +1,40 @@
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+
+def preencher_competencia(apps, schema_editor):
+    """Preenche a competência das mensalidades existentes em um único UPDATE"""
+    Mensalidade = apps.get_model('escola', 'Mensalidade')
+    Mensalidade.objects.update(competencia=TruncMonth('vencimento'))
+
+    duplicadas = (
+        Mensalidade.objects.values('aluno_id', 'competencia')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .order_by('aluno_id', 'competencia')
+    )
+    if duplicadas.exists():
+        lista = ', '.join(
+            f"aluno {d['aluno_id']} em {d['competencia']:%m/%Y}" for d in duplicadas[:20]
+        )
+        raise RuntimeError(
+            'Existem mensalidades duplicadas para a mesma competência '
+            f'({lista}). Remova as duplicatas antes de aplicar esta migração.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escola', '0002_aluno_valor_mensalidade'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mensalidade',
+            name='competencia',
+            field=models.DateField(editable=False, null=True, help_text='Primeiro dia do mês de referência, derivado do vencimento', verbose_name='Competência'),
+        ),
+        migrations.RunPython(preencher_competencia, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escola', '0003_mensalidade_competencia'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mensalidade',
+            name='competencia',
+            field=models.DateField(editable=False, help_text='Primeiro dia do mês de referência, derivado do vencimento', verbose_name='Competência'),
+        ),
+        migrations.AddConstraint(
+            model_name='mensalidade',
+            constraint=models.UniqueConstraint(fields=('aluno', 'competencia'), name='mensalidade_aluno_competencia_uniq', violation_error_message='Este aluno já possui mensalidade para esta competência.'),
+        ),
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(fields=['status', 'vencimento'], name='mensalidade_status_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(fields=['aluno', 'vencimento'], name='mensalidade_aluno_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(fields=['aluno', 'status'], name='mensalidade_aluno_status_idx'),
+        ),
+    ]
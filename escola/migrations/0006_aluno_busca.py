@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:49
+
+import unicodedata
+
+from django.db import DatabaseError, migrations, models, transaction
+
+
+# Cópia de escola.busca na data desta migração: migrações não importam o
+# código da aplicação, que pode mudar depois
+TABELA_FTS = 'escola_aluno_fts'
+
+SQL_FTS_SQLITE = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5("
+    f"busca, content='escola_aluno', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON escola_aluno BEGIN "
+    f"INSERT INTO {TABELA_FTS}(rowid, busca) VALUES (new.id, new.busca); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON escola_aluno BEGIN "
+    f"INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, busca) VALUES ('delete', old.id, old.busca); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE OF busca ON escola_aluno BEGIN "
+    f"INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, busca) VALUES ('delete', old.id, old.busca); "
+    f"INSERT INTO {TABELA_FTS}(rowid, busca) VALUES (new.id, new.busca); END",
+    f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')",
+]
+TRIGGERS_FTS = [f'{TABELA_FTS}_ai', f'{TABELA_FTS}_ad', f'{TABELA_FTS}_au']
+
+SQL_TRIGRAMA_POSTGRES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS aluno_busca_trgm_idx ON escola_aluno USING gin (busca gin_trgm_ops)',
+]
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e com espaços simples"""
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def texto_de_busca(*valores):
+    return ' '.join(filter(None, (normalizar(valor) for valor in valores)))
+
+
+def preencher_busca(apps, schema_editor):
+    """Calcula o texto de busca dos alunos existentes, em lotes"""
+    Aluno = apps.get_model('escola', 'Aluno')
+    campos = ('nome', 'documento', 'nome_pai', 'nome_mae')
+    lote = []
+    for aluno in Aluno.objects.only('id', *campos).iterator(chunk_size=2000):
+        aluno.busca = texto_de_busca(*(getattr(aluno, campo) for campo in campos))
+        lote.append(aluno)
+        if len(lote) >= 2000:
+            Aluno.objects.bulk_update(lote, ['busca'])
+            lote = []
+    if lote:
+        Aluno.objects.bulk_update(lote, ['busca'])
+
+
+def criar_indice(apps, schema_editor):
+    """FTS5 com trigram no SQLite, GIN com pg_trgm no PostgreSQL; sem índice se o banco não suportar"""
+    conexao = schema_editor.connection
+    comandos = {'sqlite': SQL_FTS_SQLITE, 'postgresql': SQL_TRIGRAMA_POSTGRES}.get(conexao.vendor, [])
+    try:
+        with transaction.atomic(using=conexao.alias), conexao.cursor() as cursor:
+            for sql in comandos:
+                cursor.execute(sql)
+    except DatabaseError:
+        # SQLite sem FTS5 ou sem o tokenizer trigram (< 3.34); PostgreSQL sem permissão para pg_trgm
+        pass
+
+
+def remover_indice(apps, schema_editor):
+    conexao = schema_editor.connection
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'sqlite':
+            for trigger in TRIGGERS_FTS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            cursor.execute(f'DROP TABLE IF EXISTS {TABELA_FTS}')
+        elif conexao.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS aluno_busca_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escola', '0005_indices_paginacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aluno',
+            name='busca',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Nome, documento e nomes dos pais em minúsculas e sem acentos, usado na busca', verbose_name='Texto de Busca'),
+        ),
+        migrations.RunPython(preencher_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:57
+
+from datetime import date
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def preencher_resumos(apps, schema_editor):
+    """
+    Calcula o resumo financeiro de todos os alunos existentes, em blocos.
+
+    Cópia do cálculo de escola.resumos na data desta migração: migrações não
+    importam o código da aplicação, que pode mudar depois.
+    """
+    Aluno = apps.get_model('escola', 'Aluno')
+    Mensalidade = apps.get_model('escola', 'Mensalidade')
+    ResumoFinanceiroAluno = apps.get_model('escola', 'ResumoFinanceiroAluno')
+    hoje = timezone.localdate()
+    zero = Decimal('0.00')
+    pago = Q(mensalidades__status='pago')
+    em_dia = Q(status='pago') & (Q(data_pagamento__isnull=True) | Q(data_pagamento__lte=F('vencimento')))
+    ultima_falha = (
+        Mensalidade.objects.filter(aluno=OuterRef('pk'), vencimento__lte=hoje)
+        .exclude(em_dia)
+        .order_by('-vencimento')
+        .values('vencimento')[:1]
+    )
+
+    ids = list(Aluno.objects.order_by('pk').values_list('pk', flat=True))
+    for inicio in range(0, len(ids), 1000):
+        linhas = (
+            Aluno.objects.filter(pk__in=ids[inicio:inicio + 1000])
+            .order_by()
+            .annotate(
+                ultima_falha=Coalesce(Subquery(ultima_falha), Value(date.min, output_field=models.DateField())),
+                quantidade_pago=Count('mensalidades__id', filter=pago),
+                quantidade_pendente=Count('mensalidades__id', filter=Q(mensalidades__status='pendente')),
+                quantidade_atrasado=Count('mensalidades__id', filter=Q(mensalidades__status='atrasado')),
+                quantidade_total=Count('mensalidades__id'),
+                total_pago=Sum('mensalidades__valor', filter=pago, default=zero),
+                total_pendente=Sum('mensalidades__valor', filter=Q(mensalidades__status='pendente'), default=zero),
+                total_atrasado=Sum('mensalidades__valor', filter=Q(mensalidades__status='atrasado'), default=zero),
+                total_geral=Sum('mensalidades__valor', default=zero),
+                ultimo_pagamento=Max('mensalidades__data_pagamento', filter=pago),
+            )
+            .annotate(sequencia_em_dia=Count(
+                'mensalidades__id',
+                filter=Q(mensalidades__vencimento__lte=hoje, mensalidades__vencimento__gt=F('ultima_falha')),
+            ))
+            .values(
+                'pk', 'quantidade_pago', 'quantidade_pendente', 'quantidade_atrasado', 'quantidade_total',
+                'total_pago', 'total_pendente', 'total_atrasado', 'total_geral',
+                'ultimo_pagamento', 'sequencia_em_dia',
+            )
+        )
+        ResumoFinanceiroAluno.objects.bulk_create([
+            ResumoFinanceiroAluno(aluno_id=linha.pop('pk'), calculado_em=hoje, **linha)
+            for linha in linhas
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escola', '0006_aluno_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoFinanceiroAluno',
+            fields=[
+                ('aluno', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumo_financeiro', serialize=False, to='escola.aluno', verbose_name='Aluno')),
+                ('quantidade_pago', models.PositiveIntegerField(default=0, verbose_name='Mensalidades Pagas')),
+                ('quantidade_pendente', models.PositiveIntegerField(default=0, verbose_name='Mensalidades Pendentes')),
+                ('quantidade_atrasado', models.PositiveIntegerField(default=0, verbose_name='Mensalidades Atrasadas')),
+                ('quantidade_total', models.PositiveIntegerField(default=0, verbose_name='Total de Mensalidades')),
+                ('total_pago', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Valor Pago')),
+                ('total_pendente', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Valor Pendente')),
+                ('total_atrasado', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Valor Atrasado')),
+                ('total_geral', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Valor Total')),
+                ('ultimo_pagamento', models.DateField(blank=True, null=True, verbose_name='Último Pagamento')),
+                ('sequencia_em_dia', models.PositiveIntegerField(default=0, help_text='Mensalidades vencidas consecutivas pagas em dia, na data do cálculo', verbose_name='Meses Consecutivos em Dia')),
+                ('calculado_em', models.DateField(verbose_name='Calculado em')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Resumo Financeiro do Aluno',
+                'verbose_name_plural': 'Resumos Financeiros dos Alunos',
+            },
+        ),
+        migrations.RunPython(preencher_resumos, migrations.RunPython.noop),
+    ]
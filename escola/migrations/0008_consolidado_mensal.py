@@ -0,0 +1,114 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:04
+
+from datetime import timedelta
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+
+
+def preencher_consolidados(apps, schema_editor):
+    """
+    Consolida as mensalidades existentes, uma linha por competência e turma.
+
+    Cópia da consolidação de escola.relatorios na data desta migração:
+    migrações não importam o código da aplicação, que pode mudar depois.
+    """
+    Mensalidade = apps.get_model('escola', 'Mensalidade')
+    Turma = apps.get_model('escola', 'Turma')
+    ConsolidadoMensal = apps.get_model('escola', 'ConsolidadoMensal')
+    hoje = timezone.localdate()
+    zero = Decimal('0.00')
+    aberta = Q(status__in=['pendente', 'atrasado'])
+    agregacoes = {
+        'quantidade_mensalidades': Count('id'),
+        'quantidade_pagas': Count('id', filter=Q(status='pago')),
+        'quantidade_em_atraso': Count('id', filter=aberta & Q(vencimento__lt=hoje)),
+        'valor_faturado': Sum('valor', default=zero),
+        'valor_recebido': Sum('valor', filter=Q(status='pago'), default=zero),
+        'valor_em_aberto': Sum('valor', filter=aberta, default=zero),
+        'valor_a_vencer': Sum('valor', filter=aberta & Q(vencimento__gte=hoje), default=zero),
+    }
+    for campo, minimo, maximo in [
+        ('valor_atraso_30', 1, 30),
+        ('valor_atraso_60', 31, 60),
+        ('valor_atraso_90', 61, 90),
+        ('valor_atraso_mais_90', 91, None),
+    ]:
+        faixa = aberta & Q(vencimento__lte=hoje - timedelta(days=minimo))
+        if maximo is not None:
+            faixa &= Q(vencimento__gte=hoje - timedelta(days=maximo))
+        agregacoes[campo] = Sum('valor', filter=faixa, default=zero)
+
+    turma_do_ano = Subquery(
+        Turma.objects.filter(alunos=OuterRef('aluno_id'), ano_letivo=ExtractYear(OuterRef('competencia')))
+        .order_by('id')
+        .values('id')[:1]
+    )
+    linhas = (
+        Mensalidade.objects.order_by()
+        .annotate(turma_do_ano=turma_do_ano)
+        .values('competencia', 'turma_do_ano')
+        .annotate(**agregacoes)
+    )
+    ConsolidadoMensal.objects.bulk_create([
+        ConsolidadoMensal(
+            competencia=linha.pop('competencia'),
+            turma_id=linha.pop('turma_do_ano'),
+            calculado_em=hoje,
+            **linha,
+        )
+        for linha in linhas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escola', '0007_resumo_financeiro_aluno'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsolidadoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('competencia', models.DateField(verbose_name='Competência')),
+                ('quantidade_mensalidades', models.PositiveIntegerField(default=0, verbose_name='Mensalidades')),
+                ('quantidade_pagas', models.PositiveIntegerField(default=0, verbose_name='Mensalidades Pagas')),
+                ('quantidade_em_atraso', models.PositiveIntegerField(default=0, verbose_name='Mensalidades em Atraso')),
+                ('valor_faturado', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Valor Faturado')),
+                ('valor_recebido', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Valor Recebido')),
+                ('valor_em_aberto', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Valor em Aberto')),
+                ('valor_a_vencer', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='A Vencer')),
+                ('valor_atraso_30', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Atraso de 1 a 30 dias')),
+                ('valor_atraso_60', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Atraso de 31 a 60 dias')),
+                ('valor_atraso_90', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Atraso de 61 a 90 dias')),
+                ('valor_atraso_mais_90', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Atraso acima de 90 dias')),
+                ('calculado_em', models.DateField(verbose_name='Calculado em')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Consolidado Mensal',
+                'verbose_name_plural': 'Consolidados Mensais',
+                'ordering': ['competencia'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(fields=['competencia'], name='mensalidade_competencia_idx'),
+        ),
+        migrations.AddField(
+            model_name='consolidadomensal',
+            name='turma',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='consolidados_mensais', to='escola.turma', verbose_name='Turma'),
+        ),
+        migrations.AddConstraint(
+            model_name='consolidadomensal',
+            constraint=models.UniqueConstraint(fields=('competencia', 'turma'), name='consolidado_competencia_turma_uniq'),
+        ),
+        migrations.RunPython(preencher_consolidados, migrations.RunPython.noop),
+    ]
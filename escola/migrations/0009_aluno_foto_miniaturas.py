@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escola', '0008_consolidado_mensal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aluno',
+            name='foto_miniaturas',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Foto para a qual as miniaturas já foram geradas (veja escola/miniaturas.py)', max_length=100, verbose_name='Miniaturas da Foto'),
+        ),
+    ]
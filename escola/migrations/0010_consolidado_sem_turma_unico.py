@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:29
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remover_duplicadas(apps, schema_editor):
+    """
+    Remove as linhas "sem turma" duplicadas antes de criar a constraint.
+
+    Cada duplicata é uma consolidação completa da célula gravada por uma
+    transação concorrente; fica a mais recente.
+    """
+    ConsolidadoMensal = apps.get_model('escola', 'ConsolidadoMensal')
+    sem_turma = ConsolidadoMensal.objects.filter(turma__isnull=True)
+    duplicadas = (
+        sem_turma.order_by().values('competencia')
+        .annotate(quantidade=Count('id'), ultima=Max('id'))
+        .filter(quantidade__gt=1)
+    )
+    for linha in duplicadas:
+        sem_turma.filter(competencia=linha['competencia']).exclude(pk=linha['ultima']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escola', '0009_aluno_foto_miniaturas'),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='consolidadomensal',
+            constraint=models.UniqueConstraint(condition=models.Q(('turma__isnull', True)), fields=('competencia',), name='consolidado_competencia_sem_turma_uniq'),
+        ),
+    ]
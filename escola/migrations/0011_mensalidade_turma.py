@@ -0,0 +1,92 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:54
+
+from datetime import timedelta
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+
+
+def atribuir_turmas(apps, schema_editor):
+    """
+    Grava a turma das mensalidades existentes e refaz a consolidação mensal.
+
+    A turma é a do aluno no ano da competência quando ela é única; alunos em
+    mais de uma turma no ano ficam sem turma, em vez de irem para a turma de
+    menor id como na consolidação anterior. Cópia do código de escola.models
+    e escola.relatorios na data desta migração: migrações não importam o
+    código da aplicação, que pode mudar depois.
+    """
+    Mensalidade = apps.get_model('escola', 'Mensalidade')
+    Turma = apps.get_model('escola', 'Turma')
+    ConsolidadoMensal = apps.get_model('escola', 'ConsolidadoMensal')
+    turma_unica_do_ano = Subquery(
+        Turma.alunos.through.objects.filter(
+            aluno_id=OuterRef('aluno_id'),
+            turma__ano_letivo=ExtractYear(OuterRef('competencia')),
+        )
+        .order_by()
+        .values('aluno_id')
+        .annotate(quantidade=Count('turma_id'), turma=Max('turma_id'))
+        .filter(quantidade=1)
+        .values('turma')
+    )
+    Mensalidade.objects.update(turma=turma_unica_do_ano)
+
+    hoje = timezone.localdate()
+    zero = Decimal('0.00')
+    aberta = Q(status__in=['pendente', 'atrasado'])
+    agregacoes = {
+        'quantidade_mensalidades': Count('id'),
+        'quantidade_pagas': Count('id', filter=Q(status='pago')),
+        'quantidade_em_atraso': Count('id', filter=aberta & Q(vencimento__lt=hoje)),
+        'valor_faturado': Sum('valor', default=zero),
+        'valor_recebido': Sum('valor', filter=Q(status='pago'), default=zero),
+        'valor_em_aberto': Sum('valor', filter=aberta, default=zero),
+        'valor_a_vencer': Sum('valor', filter=aberta & Q(vencimento__gte=hoje), default=zero),
+    }
+    for campo, minimo, maximo in [
+        ('valor_atraso_30', 1, 30),
+        ('valor_atraso_60', 31, 60),
+        ('valor_atraso_90', 61, 90),
+        ('valor_atraso_mais_90', 91, None),
+    ]:
+        faixa = aberta & Q(vencimento__lte=hoje - timedelta(days=minimo))
+        if maximo is not None:
+            faixa &= Q(vencimento__gte=hoje - timedelta(days=maximo))
+        agregacoes[campo] = Sum('valor', filter=faixa, default=zero)
+
+    linhas = Mensalidade.objects.order_by().values('competencia', 'turma').annotate(**agregacoes)
+    ConsolidadoMensal.objects.all().delete()
+    ConsolidadoMensal.objects.bulk_create([
+        ConsolidadoMensal(
+            competencia=linha.pop('competencia'),
+            turma_id=linha.pop('turma'),
+            calculado_em=hoje,
+            **linha,
+        )
+        for linha in linhas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escola', '0010_consolidado_sem_turma_unico'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mensalidade',
+            name='turma',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='Turma à qual a mensalidade é atribuída nos relatórios. Preenchida com a turma do aluno no ano da competência quando ela é única; com mais de uma, escolha a turma (vazia, a mensalidade entra como "sem turma")', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mensalidades', to='escola.turma', verbose_name='Turma'),
+        ),
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(fields=['turma', 'competencia'], name='mensalidade_turma_comp_idx'),
+        ),
+        migrations.RunPython(atribuir_turmas, migrations.RunPython.noop),
+    ]
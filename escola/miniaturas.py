@@ -0,0 +1,125 @@
+"""
+Miniaturas das fotos dos alunos.
+
+Para cada foto são geradas miniaturas quadradas (recorte central) nos
+tamanhos de TAMANHOS_MINIATURA, gravadas ao lado da original no mesmo
+storage: alunos/fotos/joao.jpg gera alunos/fotos/joao.64.webp e assim por
+diante. O campo Aluno.foto_miniaturas guarda o nome da foto para a qual as
+miniaturas existem; o filtro de template miniatura usa esse campo para
+decidir, sem acessar o storage, entre a miniatura e a foto original.
+
+Ao salvar um aluno com foto nova, a geração é agendada para depois do
+commit em um pool de threads (o Pillow libera o GIL ao decodificar,
+redimensionar e codificar), fora do caminho da requisição. Fotos antigas
+são processadas pelo comando gerar_miniaturas.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+
+TAMANHOS_MINIATURA = (64, 128, 256)
+
+EXTENSOES = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+logger = logging.getLogger(__name__)
+
+
+def formato_miniaturas():
+    formato = settings.ESCOLA_MINIATURAS_FORMATO.upper()
+    if formato not in EXTENSOES:
+        raise ValueError(f'Formato de miniatura inválido: {formato}. Use um de: {", ".join(EXTENSOES)}')
+    return formato
+
+
+def nome_miniatura(nome_foto, tamanho):
+    """Nome da miniatura de uma foto: mesma pasta, tamanho e extensão do formato"""
+    raiz, _ = os.path.splitext(nome_foto)
+    return f'{raiz}.{tamanho}.{EXTENSOES[formato_miniaturas()]}'
+
+
+def tamanho_para_exibir(largura):
+    """Menor miniatura com pelo menos o dobro da largura exibida (telas de alta densidade)"""
+    for tamanho in TAMANHOS_MINIATURA:
+        if tamanho >= largura * 2:
+            return tamanho
+    return TAMANHOS_MINIATURA[-1]
+
+
+def gerar_miniaturas(storage, nome_foto):
+    """Gera e grava as miniaturas de uma foto; retorna os nomes gravados"""
+    formato = formato_miniaturas()
+    maior = TAMANHOS_MINIATURA[-1]
+    with storage.open(nome_foto, 'rb') as arquivo:
+        imagem = Image.open(arquivo)
+        # JPEG: decodifica já reduzido (por 2, 4 ou 8), bem mais rápido em fotos grandes
+        imagem.draft('RGB', (maior, maior))
+        imagem = ImageOps.exif_transpose(imagem).convert('RGB')
+
+    gravados = []
+    # Do maior para o menor: cada miniatura parte da anterior, já pequena
+    for tamanho in sorted(TAMANHOS_MINIATURA, reverse=True):
+        imagem = ImageOps.fit(imagem, (tamanho, tamanho), Image.Resampling.LANCZOS)
+        conteudo = io.BytesIO()
+        imagem.save(conteudo, formato, quality=82, method=4 if formato == 'WEBP' else 0)
+        nome = nome_miniatura(nome_foto, tamanho)
+        if storage.exists(nome):
+            # Sem isso o storage gravaria com outro nome (sufixo aleatório)
+            storage.delete(nome)
+        gravados.append(storage.save(nome, ContentFile(conteudo.getvalue())))
+    return gravados
+
+
+def processar_aluno(aluno_id, nome_foto):
+    """Gera as miniaturas da foto e registra no aluno, se a foto ainda for a mesma"""
+    from .models import Aluno
+
+    storage = Aluno._meta.get_field('foto').storage
+    gerar_miniaturas(storage, nome_foto)
+    # update() não dispara post_save (que agendaria a geração de novo)
+    return Aluno.objects.filter(pk=aluno_id, foto=nome_foto).update(foto_miniaturas=nome_foto)
+
+
+class FilaMiniaturas:
+    """Pool de threads do processo que gera as miniaturas das fotos enviadas"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def _executar(self, aluno_id, nome_foto):
+        try:
+            processar_aluno(aluno_id, nome_foto)
+        except Exception:
+            # A foto original continua sendo exibida; o comando gerar_miniaturas tenta de novo
+            logger.exception('Falha ao gerar as miniaturas de %s (aluno %s)', nome_foto, aluno_id)
+        finally:
+            # Cada thread abre a sua conexão com o banco
+            close_old_connections()
+
+    def enviar(self, aluno_id, nome_foto):
+        workers = settings.ESCOLA_MINIATURAS_WORKERS
+        if workers < 1:
+            return processar_aluno(aluno_id, nome_foto)
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='miniaturas')
+            return self.executor.submit(self._executar, aluno_id, nome_foto)
+
+
+fila = FilaMiniaturas()
+
+
+def agendar_miniaturas(sender, instance, raw=False, **kwargs):
+    """Receiver de post_save de Aluno: agenda as miniaturas de uma foto nova"""
+    if raw or not instance.foto or instance.foto.name == instance.foto_miniaturas:
+        return
+    aluno_id, nome_foto = instance.pk, instance.foto.name
+    transaction.on_commit(lambda: fila.enviar(aluno_id, nome_foto))
@@ -1,7 +1,14 @@
+from datetime import date
+from decimal import Decimal
 from django.db import models
+from django.db.models import Avg, Count, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, ExtractYear
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.core.validators import FileExtensionValidator
 
+from .busca import texto_de_busca
+
 
 class Usuario(AbstractUser):
     """Model customizado de usuário para admin e professores"""
@@ -32,6 +39,14 @@ class Aluno(models.Model):
         validators=[FileExtensionValidator(['jpg', 'jpeg', 'png'])],
         verbose_name='Foto do Aluno'
     )
+    foto_miniaturas = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False,
+        help_text='Foto para a qual as miniaturas já foram geradas (veja escola/miniaturas.py)',
+        verbose_name='Miniaturas da Foto'
+    )
     data_nascimento = models.DateField(verbose_name='Data de Nascimento', null=True, blank=True)
     endereco = models.TextField(verbose_name='Endereço', blank=True)
     telefone = models.CharField(max_length=20, verbose_name='Telefone', blank=True)
@@ -45,14 +60,46 @@ class Aluno(models.Model):
     )
     data_cadastro = models.DateTimeField(auto_now_add=True, verbose_name='Data de Cadastro')
     ativo = models.BooleanField(default=True, verbose_name='Ativo')
+    busca = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        help_text='Nome, documento e nomes dos pais em minúsculas e sem acentos, usado na busca',
+        verbose_name='Texto de Busca'
+    )
+    
+    # Campos que compõem o texto de busca
+    CAMPOS_BUSCA = ('nome', 'documento', 'nome_pai', 'nome_mae')
     
     class Meta:
         verbose_name = 'Aluno'
         verbose_name_plural = 'Alunos'
         ordering = ['nome']
+        indexes = [
+            models.Index(fields=['nome', 'id'], name='aluno_nome_id_idx'),
+        ]
     
     def __str__(self):
         return self.nome
+    
+    def atualizar_busca(self):
+        """Recalcula o texto de busca a partir dos campos pesquisáveis"""
+        self.busca = texto_de_busca(*(getattr(self, campo) for campo in self.CAMPOS_BUSCA))
+    
+    def save(self, *args, **kwargs):
+        self.atualizar_busca()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.CAMPOS_BUSCA):
+            kwargs['update_fields'] = {*update_fields, 'busca'}
+        super().save(*args, **kwargs)
+
+
+class TurmaQuerySet(models.QuerySet):
+    """QuerySet com consultas otimizadas de turmas"""
+
+    def com_total_alunos(self):
+        """Anota total_alunos com COUNT e já traz o professor responsável"""
+        return self.select_related('professor_responsavel').annotate(total_alunos=Count('alunos'))
 
 
 class Turma(models.Model):
@@ -82,6 +129,8 @@ class Turma(models.Model):
     data_criacao = models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')
     ativa = models.BooleanField(default=True, verbose_name='Ativa')
     
+    objects = TurmaQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Turma'
         verbose_name_plural = 'Turmas'
@@ -89,6 +138,112 @@ class Turma(models.Model):
     
     def __str__(self):
         return f"{self.nome} - {self.ano_letivo}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Ano letivo lido do banco, para saber se mudou ao salvar (veja escola.relatorios)
+        instance._ano_letivo_carregado = instance.__dict__.get('ano_letivo')
+        return instance
+
+
+def turmas_unicas(ano, aluno_ids=None):
+    """
+    Retorna {aluno_id: turma_id} dos alunos matriculados em uma única turma
+    do ano letivo. Alunos sem turma no ano ou em mais de uma ficam de fora.
+    """
+    matriculas = Turma.alunos.through.objects.filter(turma__ano_letivo=ano)
+    if aluno_ids is not None:
+        matriculas = matriculas.filter(aluno_id__in=aluno_ids)
+    return dict(
+        matriculas.order_by()
+        .values('aluno_id')
+        .annotate(quantidade=Count('turma_id'), turma=Max('turma_id'))
+        .filter(quantidade=1)
+        .values_list('aluno_id', 'turma')
+    )
+
+
+def turma_unica_do_ano():
+    """
+    Subconsulta com a turma do aluno da mensalidade no ano da competência,
+    quando ela é única (NULL se o aluno não tem turma no ano ou tem mais de uma).
+    """
+    return Subquery(
+        Turma.alunos.through.objects.filter(
+            aluno_id=OuterRef('aluno_id'),
+            turma__ano_letivo=ExtractYear(OuterRef('competencia')),
+        )
+        .order_by()
+        .values('aluno_id')
+        .annotate(quantidade=Count('turma_id'), turma=Max('turma_id'))
+        .filter(quantidade=1)
+        .values('turma')
+    )
+
+
+def paga_em_dia(prefixo=''):
+    """
+    Condição de mensalidade paga até o vencimento (ou paga sem data registrada).
+
+    ``prefixo`` permite usar a condição a partir de outro model, por exemplo
+    ``paga_em_dia('mensalidades__')`` em consultas sobre Aluno.
+    """
+    return Q(**{f'{prefixo}status': 'pago'}) & (
+        Q(**{f'{prefixo}data_pagamento__isnull': True}) |
+        Q(**{f'{prefixo}data_pagamento__lte': F(f'{prefixo}vencimento')})
+    )
+
+
+class MensalidadeQuerySet(models.QuerySet):
+    """QuerySet com consultas agregadas de mensalidades"""
+
+    def totais(self):
+        """
+        Retorna valores e quantidades por status em uma única consulta.
+
+        Usa agregação condicional, então o conjunto filtrado é percorrido
+        uma só vez em vez de uma vez por status.
+        """
+        return self.aggregate(**self._agregacoes_totais())
+
+    async def atotais(self):
+        """Versão assíncrona de totais()"""
+        return await self.aaggregate(**self._agregacoes_totais())
+
+    @staticmethod
+    def _agregacoes_totais():
+        zero = Decimal('0.00')
+        return {
+            'total_pago': Sum('valor', filter=Q(status='pago'), default=zero),
+            'total_pendente': Sum('valor', filter=Q(status='pendente'), default=zero),
+            'total_atrasado': Sum('valor', filter=Q(status='atrasado'), default=zero),
+            'total_geral': Sum('valor', default=zero),
+            'quantidade_pago': Count('id', filter=Q(status='pago')),
+            'quantidade_pendente': Count('id', filter=Q(status='pendente')),
+            'quantidade_atrasado': Count('id', filter=Q(status='atrasado')),
+            'quantidade_total': Count('id'),
+            'valor_medio': Avg('valor', default=zero),
+        }
+
+    def sequencia_em_dia(self, hoje=None):
+        """
+        Conta as mensalidades vencidas consecutivas pagas em dia, da mais
+        recente para a mais antiga, em uma única consulta.
+
+        Uma mensalidade está em dia quando foi paga até o vencimento (ou paga
+        sem data registrada). A sequência termina na falha mais recente, obtida
+        por subconsulta; mensalidades ainda não vencidas não entram na conta.
+        """
+        hoje = hoje or date.today()
+        vencidas = self.filter(vencimento__lte=hoje)
+        ultima_falha = vencidas.exclude(paga_em_dia()).order_by('-vencimento').values('vencimento')[:1]
+        return vencidas.filter(
+            vencimento__gt=Coalesce(
+                Subquery(ultima_falha),
+                Value(date.min, output_field=models.DateField()),
+            )
+        ).count()
 
 
 class Mensalidade(models.Model):
@@ -96,6 +251,11 @@ class Mensalidade(models.Model):
     aluno = models.ForeignKey(Aluno, on_delete=models.CASCADE, related_name='mensalidades', verbose_name='Aluno')
     valor = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Valor')
     vencimento = models.DateField(verbose_name='Data de Vencimento')
+    competencia = models.DateField(
+        editable=False,
+        verbose_name='Competência',
+        help_text='Primeiro dia do mês de referência, derivado do vencimento'
+    )
     STATUS_CHOICES = [
         ('pendente', 'Pendente'),
         ('pago', 'Pago'),
@@ -104,12 +264,202 @@ class Mensalidade(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pendente', verbose_name='Status')
     data_pagamento = models.DateField(null=True, blank=True, verbose_name='Data de Pagamento')
     observacoes = models.TextField(blank=True, verbose_name='Observações')
+    turma = models.ForeignKey(
+        Turma,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_index=False,
+        related_name='mensalidades',
+        verbose_name='Turma',
+        help_text='Turma à qual a mensalidade é atribuída nos relatórios. Preenchida com a '
+                  'turma do aluno no ano da competência quando ela é única; com mais de uma, '
+                  'escolha a turma (vazia, a mensalidade entra como "sem turma")'
+    )
     data_cadastro = models.DateTimeField(auto_now_add=True, verbose_name='Data de Cadastro')
     
+    objects = MensalidadeQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Mensalidade'
         verbose_name_plural = 'Mensalidades'
         ordering = ['-vencimento']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['aluno', 'competencia'],
+                name='mensalidade_aluno_competencia_uniq',
+                violation_error_message='Este aluno já possui mensalidade para esta competência.',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'vencimento'], name='mensalidade_status_venc_idx'),
+            models.Index(fields=['aluno', 'vencimento'], name='mensalidade_aluno_venc_idx'),
+            models.Index(fields=['aluno', 'status'], name='mensalidade_aluno_status_idx'),
+            models.Index(fields=['vencimento', 'id'], name='mensalidade_venc_id_idx'),
+            models.Index(fields=['competencia'], name='mensalidade_competencia_idx'),
+            models.Index(fields=['turma', 'competencia'], name='mensalidade_turma_comp_idx'),
+        ]
     
     def __str__(self):
         return f"{self.aluno.nome} - {self.vencimento.strftime('%m/%Y')} - R$ {self.valor}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Competência e turma lidas do banco, para saber se mudaram ao salvar (veja escola.relatorios)
+        if 'competencia' in instance.__dict__ and 'turma_id' in instance.__dict__:
+            instance._celula_carregada = (instance.competencia, instance.turma_id)
+        return instance
+    
+    @staticmethod
+    def competencia_de(vencimento):
+        """Retorna a competência (primeiro dia do mês) de um vencimento"""
+        return vencimento.replace(day=1)
+    
+    def clean(self):
+        super().clean()
+        if self.vencimento and self.aluno_id:
+            self.competencia = self.competencia_de(self.vencimento)
+            duplicada = Mensalidade.objects.filter(
+                aluno_id=self.aluno_id,
+                competencia=self.competencia,
+            ).exclude(pk=self.pk).exists()
+            if duplicada:
+                raise ValidationError({
+                    'vencimento': 'Este aluno já possui mensalidade para esta competência.'
+                })
+            if self.turma_id and not self.turma_valida(self.aluno_id, self.competencia, self.turma_id):
+                raise ValidationError({
+                    'turma': 'A turma deve ser uma turma do aluno no ano da competência.'
+                })
+    
+    @staticmethod
+    def turma_valida(aluno_id, competencia, turma_id):
+        """Indica se o aluno está matriculado na turma e ela é do ano da competência"""
+        return Turma.objects.filter(pk=turma_id, alunos=aluno_id, ano_letivo=competencia.year).exists()
+    
+    def save(self, *args, **kwargs):
+        if self.vencimento:
+            self.competencia = self.competencia_de(self.vencimento)
+            update_fields = kwargs.get('update_fields')
+            anterior = getattr(self, '_celula_carregada', None)
+            mudou_de_ano = anterior is not None and anterior[0].year != self.competencia.year
+            if mudou_de_ano:
+                # A turma de outro ano letivo deixa de valer
+                self.turma_id = None
+            if self.turma_id is None and self.aluno_id and (self._state.adding or mudou_de_ano):
+                self.turma_id = turmas_unicas(self.competencia.year, [self.aluno_id]).get(self.aluno_id)
+            if update_fields is not None and 'vencimento' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'competencia', 'turma'}
+        super().save(*args, **kwargs)
+
+
+class ResumoFinanceiroAluno(models.Model):
+    """
+    Totais financeiros de um aluno, desnormalizados a partir das mensalidades.
+
+    Mantido por escola.resumos: os signals de Mensalidade e as operações em
+    lote recalculam a linha dos alunos afetados; o comando
+    recalcular_resumos reconstrói a tabela inteira e, agendado uma vez por
+    dia, atualiza a sequência em dia.
+    """
+    aluno = models.OneToOneField(
+        Aluno,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='resumo_financeiro',
+        verbose_name='Aluno'
+    )
+    quantidade_pago = models.PositiveIntegerField(default=0, verbose_name='Mensalidades Pagas')
+    quantidade_pendente = models.PositiveIntegerField(default=0, verbose_name='Mensalidades Pendentes')
+    quantidade_atrasado = models.PositiveIntegerField(default=0, verbose_name='Mensalidades Atrasadas')
+    quantidade_total = models.PositiveIntegerField(default=0, verbose_name='Total de Mensalidades')
+    total_pago = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Valor Pago')
+    total_pendente = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Valor Pendente')
+    total_atrasado = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Valor Atrasado')
+    total_geral = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Valor Total')
+    ultimo_pagamento = models.DateField(null=True, blank=True, verbose_name='Último Pagamento')
+    sequencia_em_dia = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Meses Consecutivos em Dia',
+        help_text='Mensalidades vencidas consecutivas pagas em dia, na data do cálculo'
+    )
+    calculado_em = models.DateField(verbose_name='Calculado em')
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+    
+    class Meta:
+        verbose_name = 'Resumo Financeiro do Aluno'
+        verbose_name_plural = 'Resumos Financeiros dos Alunos'
+    
+    def __str__(self):
+        return f"Resumo financeiro - {self.aluno_id}"
+    
+    @property
+    def valor_medio(self):
+        if not self.quantidade_total:
+            return Decimal('0.00')
+        return (self.total_geral / self.quantidade_total).quantize(Decimal('0.01'))
+    
+    @property
+    def percentual_pagamento(self):
+        if not self.quantidade_total:
+            return 0
+        return self.quantidade_pago / self.quantidade_total * 100
+
+
+class ConsolidadoMensal(models.Model):
+    """
+    Faturamento, recebimento e inadimplência de uma turma em uma competência.
+
+    Tabela de consolidação mantida por escola.relatorios a partir das
+    mensalidades: cada mensalidade entra na linha da turma do aluno no ano
+    da competência (turma vazia quando o aluno não tem turma naquele ano).
+    As faixas de atraso são relativas a calculado_em.
+    """
+    competencia = models.DateField(verbose_name='Competência')
+    turma = models.ForeignKey(
+        Turma,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='consolidados_mensais',
+        verbose_name='Turma'
+    )
+    quantidade_mensalidades = models.PositiveIntegerField(default=0, verbose_name='Mensalidades')
+    quantidade_pagas = models.PositiveIntegerField(default=0, verbose_name='Mensalidades Pagas')
+    quantidade_em_atraso = models.PositiveIntegerField(default=0, verbose_name='Mensalidades em Atraso')
+    valor_faturado = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Valor Faturado')
+    valor_recebido = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Valor Recebido')
+    valor_em_aberto = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Valor em Aberto')
+    valor_a_vencer = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='A Vencer')
+    valor_atraso_30 = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name='Atraso de 1 a 30 dias'
+    )
+    valor_atraso_60 = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name='Atraso de 31 a 60 dias'
+    )
+    valor_atraso_90 = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name='Atraso de 61 a 90 dias'
+    )
+    valor_atraso_mais_90 = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name='Atraso acima de 90 dias'
+    )
+    calculado_em = models.DateField(verbose_name='Calculado em')
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+    
+    class Meta:
+        verbose_name = 'Consolidado Mensal'
+        verbose_name_plural = 'Consolidados Mensais'
+        ordering = ['competencia']
+        constraints = [
+            models.UniqueConstraint(fields=['competencia', 'turma'], name='consolidado_competencia_turma_uniq'),
+            # NULL não conflita com NULL na constraint acima: uma linha "sem turma" por competência
+            models.UniqueConstraint(
+                fields=['competencia'],
+                condition=models.Q(turma__isnull=True),
+                name='consolidado_competencia_sem_turma_uniq',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.competencia.strftime('%m/%Y')} - {self.turma or 'Sem turma'}"
@@ -0,0 +1,248 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework import pagination
+
+
+class Pagina:
+    """Página de resultados obtida por paginação por chave (keyset)"""
+
+    def __init__(self, itens, request, cursor_proximo=None, cursor_anterior=None, tamanho=None):
+        self.itens = itens
+        self.request = request
+        self.cursor_proximo = cursor_proximo
+        self.cursor_anterior = cursor_anterior
+        self.tamanho = tamanho
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    @property
+    def tem_proxima(self):
+        return self.cursor_proximo is not None
+
+    @property
+    def tem_anterior(self):
+        return self.cursor_anterior is not None
+
+    def _url(self, cursor):
+        parametros = self.request.GET.copy()
+        parametros['cursor'] = cursor
+        return '?' + parametros.urlencode()
+
+    @property
+    def url_proxima(self):
+        return self._url(self.cursor_proximo) if self.tem_proxima else ''
+
+    @property
+    def url_anterior(self):
+        return self._url(self.cursor_anterior) if self.tem_anterior else ''
+
+
+def tamanho_da_pagina(request):
+    """Lê ?por_pagina= respeitando os limites definidos nas settings"""
+    padrao = settings.ESCOLA_TAMANHO_PAGINA
+    maximo = settings.ESCOLA_TAMANHO_PAGINA_MAXIMO
+    try:
+        tamanho = int(request.GET.get('por_pagina', padrao))
+    except (TypeError, ValueError):
+        tamanho = padrao
+    return max(1, min(tamanho, maximo))
+
+
+def _codificar_cursor(valores, direcao):
+    dados = json.dumps({'v': valores, 'd': direcao}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+
+def _campo_do_model(model, nome):
+    """Campo do model usado na ordenação, ou None se for uma anotação"""
+    try:
+        return model._meta.get_field(nome)
+    except FieldDoesNotExist:
+        return None
+
+
+def _decodificar_cursor(cursor, campos, model):
+    """Retorna (valores, direção) do cursor ou None se ele for inválido"""
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        dados = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+        valores, direcao = dados['v'], dados['d']
+        if direcao not in ('p', 'a') or len(valores) != len(campos):
+            return None
+        convertidos = []
+        for (nome, _), valor in zip(campos, valores):
+            campo = _campo_do_model(model, nome)
+            convertidos.append(campo.to_python(valor) if campo else valor)
+        return convertidos, direcao
+    except (binascii.Error, ValueError, TypeError, KeyError, ValidationError):
+        return None
+
+
+def _normalizar_ordenacao(ordenacao):
+    """Converte ('-vencimento', '-id') em [('vencimento', True), ('id', True)]"""
+    return [(campo.lstrip('-'), campo.startswith('-')) for campo in ordenacao]
+
+
+def _filtro_apos(campos, valores, inverter=False):
+    """
+    Monta o filtro equivalente a (c1, c2, ...) > (v1, v2, ...) na ordenação.
+
+    Para cada posição i gera c1 = v1 AND ... AND ci > vi (ou < quando o campo
+    é decrescente). Sozinho, esse OR não delimita o primeiro campo e o banco
+    percorre o índice desde o início; por isso vem precedido de c1 >= v1 (ou
+    <=), que o banco usa para posicionar a busca no índice composto da
+    ordenação.
+    """
+    def lookup(descendente):
+        return 'lt' if descendente != inverter else 'gt'
+
+    filtro = Q()
+    for i, (nome, descendente) in enumerate(campos):
+        condicao = Q(**{f'{nome}__{lookup(descendente)}': valores[i]})
+        for j in range(i):
+            condicao &= Q(**{campos[j][0]: valores[j]})
+        filtro |= condicao
+    if len(campos) > 1:
+        nome, descendente = campos[0]
+        filtro = Q(**{f'{nome}__{lookup(descendente)}e': valores[0]}) & filtro
+    return filtro
+
+
+def _valores_da_chave(obj, campos):
+    valores = []
+    for nome, _ in campos:
+        campo = _campo_do_model(obj, nome)
+        valor = getattr(obj, campo.attname if campo else nome)
+        valores.append(valor.isoformat() if hasattr(valor, 'isoformat') else valor)
+    return valores
+
+
+def _consulta_da_pagina(request, queryset, ordenacao, tamanho):
+    """Retorna (consulta com uma linha a mais que a página, estado da paginação)"""
+    campos = _normalizar_ordenacao(ordenacao)
+    tamanho = tamanho or tamanho_da_pagina(request)
+
+    cursor = _decodificar_cursor(request.GET.get('cursor', ''), campos, queryset.model)
+    valores, direcao = cursor if cursor else (None, 'p')
+    voltando = direcao == 'a'
+
+    if voltando:
+        ordem = [nome if descendente else f'-{nome}' for nome, descendente in campos]
+    else:
+        ordem = list(ordenacao)
+
+    pagina = queryset.order_by(*ordem)
+    if valores is not None:
+        pagina = pagina.filter(_filtro_apos(campos, valores, inverter=voltando))
+
+    return pagina[:tamanho + 1], (campos, valores, voltando, tamanho)
+
+
+def _montar_pagina(request, itens, estado):
+    campos, valores, voltando, tamanho = estado
+    tem_mais = len(itens) > tamanho
+    itens = itens[:tamanho]
+    if voltando:
+        itens.reverse()
+
+    cursor_proximo = cursor_anterior = None
+    if itens:
+        if tem_mais or voltando:
+            cursor_proximo = _codificar_cursor(_valores_da_chave(itens[-1], campos), 'p')
+        if valores is not None and (tem_mais or not voltando):
+            cursor_anterior = _codificar_cursor(_valores_da_chave(itens[0], campos), 'a')
+
+    return Pagina(itens, request, cursor_proximo, cursor_anterior, tamanho)
+
+
+def paginar_por_chave(request, queryset, ordenacao, tamanho=None):
+    """
+    Pagina um queryset por chave (seek) em vez de OFFSET.
+
+    A ordenação deve terminar em um campo único (normalmente o id) para que
+    a chave identifique cada linha; os demais podem ser anotações numéricas
+    (como a relevância da busca). A página seguinte é obtida com um filtro
+    sobre a última chave vista, que o banco resolve posicionando-se no
+    índice da ordenação: páginas profundas custam o mesmo que a primeira
+    quando há um índice com os campos da ordenação.
+    """
+    consulta, estado = _consulta_da_pagina(request, queryset, ordenacao, tamanho)
+    return _montar_pagina(request, list(consulta), estado)
+
+
+async def apaginar_por_chave(request, queryset, ordenacao, tamanho=None):
+    """Versão assíncrona de paginar_por_chave, para as views assíncronas"""
+    consulta, estado = _consulta_da_pagina(request, queryset, ordenacao, tamanho)
+    return _montar_pagina(request, [item async for item in consulta], estado)
+
+
+class PaginacaoPorCursorApi(pagination.CursorPagination):
+    """
+    Paginação por cursor da API, ordenada pela chave primária.
+
+    Não executa COUNT(*) e o custo de cada página não cresce com a
+    profundidade, o que a torna adequada para sincronizações completas.
+    """
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        self.page_size = settings.ESCOLA_API_CURSOR_PAGE_SIZE
+        self.max_page_size = settings.ESCOLA_API_CURSOR_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        # Ignora o OrderingFilter: o cursor só é estável sobre uma chave única
+        return (self.ordering,)
+
+
+class PaginacaoApi(pagination.BasePagination):
+    """
+    Paginação padrão da API.
+
+    Usa PageNumberPagination, a menos que o cliente peça ?paginacao=cursor
+    (ou envie um ?cursor=), caso em que delega para PaginacaoPorCursorApi.
+    """
+
+    def __init__(self):
+        self.numerada = pagination.PageNumberPagination()
+        self.por_cursor = PaginacaoPorCursorApi()
+        self.delegada = self.numerada
+
+    @staticmethod
+    def usa_cursor(request):
+        return request.query_params.get('paginacao') == 'cursor' or 'cursor' in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.delegada = self.por_cursor if self.usa_cursor(request) else self.numerada
+        return self.delegada.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.delegada.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.numerada.get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.delegada.to_html()
+
+    def get_results(self, data):
+        return self.delegada.get_results(data)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            *self.numerada.get_schema_operation_parameters(view),
+            *self.por_cursor.get_schema_operation_parameters(view),
+        ]
+
+    @property
+    def display_page_controls(self):
+        return self.delegada.display_page_controls
@@ -0,0 +1,174 @@
+"""
+Emissão de recibos de mensalidades, individualmente ou em lote.
+
+O corpo de cada recibo (template recibo_conteudo.html) é renderizado a
+partir de um dicionário com os dados exibidos e guardado no cache com uma
+chave que inclui o id da mensalidade e um hash desses dados: reimprimir um
+recibo sem alterações não renderiza nada, e qualquer mudança na mensalidade
+ou no aluno produz outra chave. A data de emissão fica fora do corpo.
+
+No lote as mensalidades são lidas em blocos com values(); os recibos de
+cada bloco são buscados com uma única chamada get_many e os que faltam são
+renderizados por um pool de processos (ESCOLA_RECIBOS_WORKERS). O resultado
+é um único documento HTML com um recibo por página de impressão, entregue
+como fluxo, sem montar o documento inteiro em memória.
+"""
+import hashlib
+import itertools
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.formats import date_format
+
+from .banco import banco_leitura
+
+
+TEMPLATE_RECIBO = 'recibo_conteudo.html'
+TEMPLATE_LOTE = 'recibos_lote.html'
+
+# Incrementar ao alterar recibo_conteudo.html descarta os recibos em cache
+VERSAO = 2
+
+FORMA_PAGAMENTO_PADRAO = 'Dinheiro'
+
+CAMPOS_MENSALIDADE = ('id', 'valor', 'vencimento', 'data_pagamento', 'observacoes')
+CAMPOS_ALUNO = ('nome', 'nome_pai', 'nome_mae', 'documento')
+
+MARCADOR = '<!--recibos-->'
+
+
+def dados_recibo(valores, forma_pagamento=FORMA_PAGAMENTO_PADRAO):
+    """Dados exibidos no recibo a partir de uma linha de values() (veja valores_recibos)"""
+    dados = {campo: valores[campo] for campo in CAMPOS_MENSALIDADE}
+    dados['aluno'] = {campo: valores[f'aluno__{campo}'] for campo in CAMPOS_ALUNO}
+    dados['forma_pagamento'] = forma_pagamento
+    return dados
+
+
+def dados_da_mensalidade(mensalidade, forma_pagamento=FORMA_PAGAMENTO_PADRAO):
+    """Mesmos dados de dados_recibo a partir de uma instância de Mensalidade"""
+    valores = {campo: getattr(mensalidade, campo) for campo in CAMPOS_MENSALIDADE}
+    valores.update({f'aluno__{campo}': getattr(mensalidade.aluno, campo) for campo in CAMPOS_ALUNO})
+    return dados_recibo(valores, forma_pagamento)
+
+
+def valores_recibos(mensalidades):
+    """values() com as colunas usadas no recibo, na ordem de emissão, da conexão de leitura"""
+    campos = CAMPOS_MENSALIDADE + tuple(f'aluno__{campo}' for campo in CAMPOS_ALUNO)
+    return mensalidades.using(banco_leitura()).order_by('aluno__nome', 'vencimento', 'id').values(*campos)
+
+
+def chave_recibo(dados):
+    """Chave de cache do recibo: muda sempre que algum dado exibido muda"""
+    conteudo = json.dumps(dados, cls=DjangoJSONEncoder, sort_keys=True)
+    resumo = hashlib.sha1(conteudo.encode()).hexdigest()[:16]
+    return f'escola:recibo:v{VERSAO}:{dados["id"]}:{resumo}'
+
+
+def renderizar(dados):
+    """Renderiza o corpo de um recibo (executado também nos processos do pool)"""
+    return render_to_string(TEMPLATE_RECIBO, {'mensalidade': dados})
+
+
+def _iniciar_processo():
+    import django
+    django.setup()
+
+
+class PoolRecibos:
+    """Pool de processos do processo atual, criado no primeiro lote que precisa dele"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.workers = None
+
+    def obter(self, workers):
+        with self.lock:
+            if self.executor is None or self.workers != workers:
+                if self.executor is not None:
+                    self.executor.shutdown(wait=False)
+                # spawn: os processos não herdam conexões abertas com o banco
+                self.executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_iniciar_processo,
+                )
+                self.workers = workers
+            return self.executor
+
+    def descartar(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            self.workers = None
+
+
+pool = PoolRecibos()
+
+
+def _renderizar_varios(lista, workers):
+    if workers <= 1 or len(lista) < 2:
+        return [renderizar(dados) for dados in lista]
+    executor = pool.obter(workers)
+    try:
+        return list(executor.map(renderizar, lista, chunksize=max(1, len(lista) // (workers * 4))))
+    except Exception:
+        # Pool quebrado (processo encerrado, falta de memória...): descarta e renderiza aqui mesmo
+        pool.descartar()
+        return [renderizar(dados) for dados in lista]
+
+
+def renderizar_bloco(bloco, workers=1):
+    """Corpos dos recibos de um bloco de dados, reaproveitando o cache"""
+    chaves = [chave_recibo(dados) for dados in bloco]
+    prontos = cache.get_many(chaves)
+    faltando = {chave: dados for chave, dados in zip(chaves, bloco) if chave not in prontos}
+    if faltando:
+        novos = dict(zip(faltando, _renderizar_varios(list(faltando.values()), workers)))
+        cache.set_many(novos, settings.ESCOLA_RECIBOS_CACHE_TTL)
+        prontos.update(novos)
+    return [prontos[chave] for chave in chaves]
+
+
+def recibo_da_mensalidade(mensalidade, forma_pagamento=FORMA_PAGAMENTO_PADRAO):
+    """Corpo do recibo de uma mensalidade, do cache quando possível"""
+    return renderizar_bloco([dados_da_mensalidade(mensalidade, forma_pagamento)])[0]
+
+
+def recibos_em_lote(mensalidades, forma_pagamento=FORMA_PAGAMENTO_PADRAO, workers=None, chunk_size=None):
+    """Gera o corpo do recibo de cada mensalidade do queryset, bloco a bloco"""
+    workers = settings.ESCOLA_RECIBOS_WORKERS if workers is None else workers
+    chunk_size = chunk_size or settings.ESCOLA_RECIBOS_CHUNK_SIZE
+    linhas = valores_recibos(mensalidades).iterator(chunk_size=chunk_size)
+    while True:
+        bloco = [dados_recibo(valores, forma_pagamento) for valores in itertools.islice(linhas, chunk_size)]
+        if not bloco:
+            break
+        yield from renderizar_bloco(bloco, workers)
+
+
+def documento_recibos(mensalidades, forma_pagamento=FORMA_PAGAMENTO_PADRAO, workers=None,
+                      chunk_size=None, emitido_em=None):
+    """
+    Documento HTML único com um recibo por página, gerado como fluxo.
+
+    Próprio para StreamingHttpResponse ou para gravar em arquivo; a
+    impressão do navegador (ou "Salvar como PDF") respeita as quebras.
+    """
+    emitido_em = timezone.localtime(emitido_em)
+    emissao = f'Emitido em: {date_format(emitido_em, "d/m/Y")} às {date_format(emitido_em, "H:i")}'
+    inicio, fim = render_to_string(TEMPLATE_LOTE).split(MARCADOR)
+
+    yield inicio
+    for corpo in recibos_em_lote(mensalidades, forma_pagamento, workers, chunk_size):
+        yield f'<section class="pagina-recibo">{corpo}<p class="emissao">{emissao}</p></section>\n'
+    yield fim
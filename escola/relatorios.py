@@ -0,0 +1,380 @@
+"""
+Relatórios mensais de faturamento e inadimplência.
+
+Os relatórios por turma, período e ano letivo não percorrem as
+mensalidades: somam as linhas da tabela ConsolidadoMensal, que guarda uma
+linha por competência e turma. Cada mensalidade é contada na turma
+gravada nela (Mensalidade.turma), então as linhas não se sobrepõem e a
+soma de um mês é o total da escola. A turma é preenchida com a do aluno no
+ano da competência quando ela é única; alunos em mais de uma turma no ano
+ficam em "sem turma" até que a turma seja escolhida na mensalidade.
+
+A consolidação é incremental: quando mensalidades, matrículas ou turmas
+mudam, as mensalidades cuja turma deixou de valer são reatribuídas e só
+as células (competência, turma) afetadas são recalculadas, com
+uma consulta agregada e a troca das linhas, com as competências travadas
+para que duas transações não gravem a mesma célula. Como as faixas de
+atraso dependem da data, linhas com valores em aberto calculadas em outro
+dia são recalculadas pelo comando consolidar_relatorios, agendado uma vez
+por dia; a leitura do relatório não grava nada.
+"""
+import operator
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+
+from .banco import banco_leitura, travar
+from .models import Aluno, ConsolidadoMensal, Mensalidade, Turma, turma_unica_do_ano
+
+
+STATUS_EM_ABERTO = ['pendente', 'atrasado']
+
+CENTAVO = Decimal('0.01')
+
+# Faixas de atraso: (campo, dias mínimos, dias máximos)
+FAIXAS_ATRASO = [
+    ('valor_atraso_30', 1, 30),
+    ('valor_atraso_60', 31, 60),
+    ('valor_atraso_90', 61, 90),
+    ('valor_atraso_mais_90', 91, None),
+]
+
+CAMPOS_CONSOLIDADOS = [
+    'quantidade_mensalidades', 'quantidade_pagas', 'quantidade_em_atraso',
+    'valor_faturado', 'valor_recebido', 'valor_em_aberto', 'valor_a_vencer',
+    *(campo for campo, _, _ in FAIXAS_ATRASO),
+]
+
+# Agrupamentos do relatório: campos de ConsolidadoMensal usados no GROUP BY/ORDER BY
+AGRUPAMENTOS = {
+    'turma': ['turma__ano_letivo', 'turma__nome', 'turma_id', 'turma__periodo'],
+    'periodo': ['turma__periodo'],
+    'ano_letivo': ['turma__ano_letivo'],
+}
+
+PERIODOS = dict(Turma._meta.get_field('periodo').choices)
+
+
+def _agregacoes(hoje):
+    zero = Decimal('0.00')
+    aberta = Q(status__in=STATUS_EM_ABERTO)
+    agregacoes = {
+        'quantidade_mensalidades': Count('id'),
+        'quantidade_pagas': Count('id', filter=Q(status='pago')),
+        'quantidade_em_atraso': Count('id', filter=aberta & Q(vencimento__lt=hoje)),
+        'valor_faturado': Sum('valor', default=zero),
+        'valor_recebido': Sum('valor', filter=Q(status='pago'), default=zero),
+        'valor_em_aberto': Sum('valor', filter=aberta, default=zero),
+        'valor_a_vencer': Sum('valor', filter=aberta & Q(vencimento__gte=hoje), default=zero),
+    }
+    for campo, minimo, maximo in FAIXAS_ATRASO:
+        faixa = aberta & Q(vencimento__lte=hoje - timedelta(days=minimo))
+        if maximo is not None:
+            faixa &= Q(vencimento__gte=hoje - timedelta(days=maximo))
+        agregacoes[campo] = Sum('valor', filter=faixa, default=zero)
+    return agregacoes
+
+
+def _filtro(meses, celulas):
+    """
+    Q que seleciona os meses inteiros e as células (competência, turma)
+    informados, tanto em Mensalidade quanto em ConsolidadoMensal.
+    """
+    filtros = [Q(competencia__in=sorted(meses))] if meses else []
+    turmas_por_mes = defaultdict(set)
+    for competencia, turma_id in celulas:
+        if competencia not in meses:
+            turmas_por_mes[competencia].add(turma_id)
+    for competencia, turma_ids in sorted(turmas_por_mes.items()):
+        turmas = [Q(turma__in=sorted(turma_ids - {None}))]
+        if None in turma_ids:
+            turmas.append(Q(turma__isnull=True))
+        filtros.append(Q(competencia=competencia) & reduce(operator.or_, turmas))
+    return reduce(operator.or_, filtros) if filtros else None
+
+
+def _travar_competencias(meses, celulas, tudo):
+    """
+    Trava as competências a recalcular, sempre na mesma ordem.
+
+    Sem o lock, duas transações READ COMMITTED no PostgreSQL apagam as
+    linhas da mesma célula e cada uma insere a sua. A reconstrução completa
+    exclui todas as outras; as parciais só se excluem na mesma competência.
+    """
+    travar('consolidado', compartilhado=not tudo)
+    if not tudo:
+        for competencia in sorted({*meses, *(competencia for competencia, _ in celulas)}):
+            travar('consolidado', competencia)
+
+
+def consolidar(meses=(), celulas=(), hoje=None, tudo=False):
+    """
+    Recalcula as linhas de ConsolidadoMensal.
+
+    Recalcula os meses inteiros em ``meses``, as células (competência,
+    turma) em ``celulas`` ou, com ``tudo=True``, a tabela inteira. Retorna
+    a quantidade de linhas gravadas.
+    """
+    hoje = hoje or timezone.localdate()
+    if tudo:
+        filtro = Q()
+    else:
+        meses = set(meses)
+        filtro = _filtro(meses, celulas)
+        if filtro is None:
+            return 0
+
+    linhas = (
+        Mensalidade.objects.order_by()
+        .filter(filtro)
+        .values('competencia', 'turma')
+        .annotate(**_agregacoes(hoje))
+    )
+    # Sem savepoint: dentro de outra transação (operações em lote, signals)
+    # um erro desfaz tudo de qualquer forma
+    with transaction.atomic(savepoint=False):
+        _travar_competencias(meses, celulas, tudo)
+        consolidados = [
+            ConsolidadoMensal(
+                competencia=linha.pop('competencia'),
+                turma_id=linha.pop('turma'),
+                calculado_em=hoje,
+                **linha,
+            )
+            for linha in linhas
+        ]
+        ConsolidadoMensal.objects.filter(filtro).delete()
+        ConsolidadoMensal.objects.bulk_create(consolidados)
+    return len(consolidados)
+
+
+def celulas_das_mensalidades(mensalidades):
+    """Células (competência, turma) às quais as mensalidades pertencem"""
+    return set(mensalidades.order_by().values_list('competencia', 'turma_id').distinct())
+
+
+def reatribuir_turmas(aluno_ids, anos):
+    """
+    Reatribui as mensalidades dos alunos nos anos dados após uma mudança de
+    matrículas ou turmas e recalcula as células afetadas.
+
+    Só mudam as mensalidades sem turma ou cuja turma deixou de ser uma
+    turma do aluno no ano da competência; uma turma escolhida que continua
+    válida é mantida. Retorna a quantidade de mensalidades reatribuídas.
+    """
+    matricula_valida = Turma.alunos.through.objects.filter(
+        aluno_id=OuterRef('aluno_id'),
+        turma_id=OuterRef('turma_id'),
+        turma__ano_letivo=ExtractYear(OuterRef('competencia')),
+    )
+    pendentes = Mensalidade.objects.filter(aluno_id__in=aluno_ids, competencia__year__in=anos).filter(
+        Q(turma__isnull=True) | ~Exists(matricula_valida)
+    )
+    with transaction.atomic(savepoint=False):
+        ids = list(pendentes.values_list('pk', flat=True))
+        if not ids:
+            return 0
+        mensalidades = Mensalidade.objects.filter(pk__in=ids)
+        celulas = celulas_das_mensalidades(mensalidades)
+        mensalidades.update(turma=turma_unica_do_ano())
+        consolidar(celulas=celulas | celulas_das_mensalidades(mensalidades))
+    return len(ids)
+
+
+def atualizar_desatualizados(hoje=None):
+    """
+    Recalcula os meses com valores em aberto cujas faixas de atraso foram
+    calculadas em outro dia. Meses totalmente pagos não dependem da data.
+    """
+    hoje = hoje or timezone.localdate()
+    meses = set(
+        ConsolidadoMensal.objects.exclude(calculado_em=hoje)
+        .filter(valor_em_aberto__gt=0)
+        .order_by()
+        .values_list('competencia', flat=True)
+        .distinct()
+    )
+    return consolidar(meses=meses, hoje=hoje) if meses else 0
+
+
+def parametros_relatorio(params, hoje=None):
+    """
+    Valida os filtros do relatório vindos da querystring.
+
+    Aceita ano, mes, agrupar (turma, periodo ou ano_letivo), periodo,
+    ano_letivo e turma. Levanta ValueError com a mensagem do primeiro erro.
+    """
+    hoje = hoje or timezone.localdate()
+    try:
+        ano = int(params.get('ano') or hoje.year)
+        mes = int(params['mes']) if params.get('mes') else None
+        ano_letivo = int(params['ano_letivo']) if params.get('ano_letivo') else None
+        turma = int(params['turma']) if params.get('turma') else None
+    except ValueError:
+        raise ValueError('Os filtros ano, mes, ano_letivo e turma devem ser números inteiros.')
+    if mes is not None and not 1 <= mes <= 12:
+        raise ValueError('Mês inválido. Use um valor de 1 a 12.')
+    agrupar = params.get('agrupar') or 'turma'
+    if agrupar not in AGRUPAMENTOS:
+        raise ValueError(f'Agrupamento inválido: {agrupar}. Use um de: {", ".join(AGRUPAMENTOS)}')
+    periodo = params.get('periodo') or ''
+    if periodo and periodo not in PERIODOS:
+        raise ValueError(f'Período inválido: {periodo}. Use um de: {", ".join(PERIODOS)}')
+    return {
+        'ano': ano, 'mes': mes, 'agrupar': agrupar,
+        'periodo': periodo, 'ano_letivo': ano_letivo, 'turma': turma,
+    }
+
+
+def _completar(agrupar, linha):
+    turma = linha.pop('turma_id', None)
+    periodo = linha.pop('turma__periodo', None)
+    ano_letivo = linha.pop('turma__ano_letivo', None)
+    nome = linha.pop('turma__nome', None)
+    if agrupar == 'turma':
+        grupo = f'{nome} - {ano_letivo}' if turma else None
+    elif agrupar == 'periodo':
+        grupo = PERIODOS.get(periodo, periodo) if periodo else None
+    else:
+        grupo = str(ano_letivo) if ano_letivo else None
+    linha.update(grupo=grupo or 'Sem turma', turma=turma, periodo=periodo, ano_letivo=ano_letivo)
+    for campo in CAMPOS_CONSOLIDADOS:
+        if campo.startswith('valor_'):
+            # O SQLite devolve as somas sem as casas decimais
+            linha[campo] = linha[campo].quantize(CENTAVO)
+    linha['valor_em_atraso'] = sum(linha[campo] for campo, _, _ in FAIXAS_ATRASO)
+    linha['taxa_inadimplencia'] = taxa_inadimplencia(linha)
+    return linha
+
+
+def taxa_inadimplencia(linha):
+    """Percentual do valor faturado que está vencido e em aberto"""
+    if not linha['valor_faturado']:
+        return Decimal('0.00')
+    return (linha['valor_em_atraso'] / linha['valor_faturado'] * 100).quantize(CENTAVO)
+
+
+def relatorio_mensal(ano, mes=None, agrupar='turma', periodo='', ano_letivo=None, turma=None):
+    """
+    Linhas do relatório mensal, uma por competência e grupo.
+
+    Cada linha traz competencia, grupo (rótulo), turma, periodo e
+    ano_letivo (None quando não fazem parte do agrupamento), os totais de
+    CAMPOS_CONSOLIDADOS, valor_em_atraso e taxa_inadimplencia. Só lê a
+    consolidação: as faixas de atraso são as do último consolidar_relatorios.
+    """
+    consolidados = ConsolidadoMensal.objects.filter(competencia__year=ano)
+    if mes:
+        consolidados = consolidados.filter(competencia=date(ano, mes, 1))
+    if periodo:
+        consolidados = consolidados.filter(turma__periodo=periodo)
+    if ano_letivo:
+        consolidados = consolidados.filter(turma__ano_letivo=ano_letivo)
+    if turma:
+        consolidados = consolidados.filter(turma=turma)
+    campos = AGRUPAMENTOS[agrupar]
+    linhas = (
+        consolidados.using(banco_leitura())
+        .values('competencia', *campos)
+        .annotate(**{campo: Sum(campo) for campo in CAMPOS_CONSOLIDADOS})
+        .order_by('competencia', *campos)
+    )
+    return [_completar(agrupar, linha) for linha in linhas]
+
+
+def totalizar(linhas):
+    """Soma as linhas do relatório (linha de total da página e do CSV)"""
+    total = {campo: sum(linha[campo] for linha in linhas) for campo in CAMPOS_CONSOLIDADOS}
+    total['valor_em_atraso'] = sum(total[campo] for campo, _, _ in FAIXAS_ATRASO)
+    total['taxa_inadimplencia'] = taxa_inadimplencia(total)
+    return total
+
+
+COLUNAS_RELATORIO = [
+    'competencia', 'grupo', 'turma', 'periodo', 'ano_letivo',
+    *CAMPOS_CONSOLIDADOS, 'valor_em_atraso', 'taxa_inadimplencia',
+]
+
+
+def linhas_para_exportar(linhas):
+    """Tuplas na ordem de COLUNAS_RELATORIO, para exportacao.exportar_linhas"""
+    return ([linha[coluna] for coluna in COLUNAS_RELATORIO] for linha in linhas)
+
+
+# Receivers de signals
+
+def atualizar_mensalidade(sender, instance, origin=None, **kwargs):
+    """Receiver de post_save/post_delete de Mensalidade"""
+    if isinstance(origin, Aluno) or getattr(origin, 'model', None) is Aluno:
+        # Exclusão do próprio aluno: tratada por atualizar_aluno_excluido
+        return
+    celula = (instance.competencia, instance.turma_id)
+    celulas = {celula}
+    anterior = getattr(instance, '_celula_carregada', None)
+    if anterior is not None:
+        celulas.add(anterior)
+    consolidar(celulas=celulas)
+    instance._celula_carregada = celula
+
+
+def guardar_celulas_do_aluno(sender, instance, **kwargs):
+    """Receiver de pre_delete de Aluno: guarda as células das mensalidades excluídas em cascata"""
+    instance._celulas_consolidadas = celulas_das_mensalidades(instance.mensalidades.all())
+
+
+def atualizar_aluno_excluido(sender, instance, **kwargs):
+    """Receiver de post_delete de Aluno"""
+    celulas = getattr(instance, '_celulas_consolidadas', None)
+    if celulas:
+        consolidar(celulas=celulas)
+
+
+def guardar_alunos_da_turma(sender, instance, **kwargs):
+    """Receiver de pre_delete de Turma: guarda os alunos, cujas mensalidades serão reatribuídas"""
+    instance._alunos_matriculados = list(instance.alunos.values_list('id', flat=True))
+
+
+def atualizar_turma_excluida(sender, instance, **kwargs):
+    """
+    Receiver de post_delete de Turma: as mensalidades da turma ficaram sem
+    turma (SET_NULL) e as linhas dela foram excluídas em cascata.
+    """
+    alunos = getattr(instance, '_alunos_matriculados', None)
+    if alunos:
+        reatribuir_turmas(alunos, [instance.ano_letivo])
+
+
+def atualizar_turma(sender, instance, created=False, **kwargs):
+    """Receiver de post_save de Turma: a mudança de ano letivo muda a atribuição das mensalidades"""
+    anterior = getattr(instance, '_ano_letivo_carregado', None)
+    if not created and anterior is not None and anterior != instance.ano_letivo:
+        alunos = list(instance.alunos.values_list('id', flat=True))
+        if alunos:
+            reatribuir_turmas(alunos, [anterior, instance.ano_letivo])
+    instance._ano_letivo_carregado = instance.ano_letivo
+
+
+def atualizar_matriculas(sender, instance, action, reverse, pk_set, **kwargs):
+    """Receiver de m2m_changed de Turma.alunos"""
+    if action == 'pre_clear':
+        if reverse:
+            anos = set(instance.turmas.values_list('ano_letivo', flat=True))
+            instance._matriculas_removidas = ([instance.pk], anos)
+        else:
+            instance._matriculas_removidas = (list(instance.alunos.values_list('id', flat=True)), [instance.ano_letivo])
+    elif action == 'post_clear':
+        alunos, anos = getattr(instance, '_matriculas_removidas', ((), ()))
+        if alunos and anos:
+            reatribuir_turmas(alunos, anos)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        if reverse:
+            anos = set(Turma.objects.filter(pk__in=pk_set).values_list('ano_letivo', flat=True))
+            reatribuir_turmas([instance.pk], anos)
+        else:
+            reatribuir_turmas(pk_set, [instance.ano_letivo])
@@ -0,0 +1,144 @@
+"""
+Manutenção da tabela ResumoFinanceiroAluno.
+
+Sempre que as mensalidades de um aluno mudam, a linha de resumo dele é
+recalculada com uma consulta agregada sobre Aluno (uma linha por aluno,
+com agregação condicional das mensalidades e a sequência em dia obtida
+por subconsulta) e gravada no próprio banco, sem passar pelo Python, com
+um único INSERT ... SELECT ... ON CONFLICT DO UPDATE por bloco. As
+operações em lote passam o conjunto de alunos afetados de uma vez,
+processado em blocos.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, DateField, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Aluno, Mensalidade, ResumoFinanceiroAluno, paga_em_dia
+
+
+CAMPOS_RESUMO = [
+    'quantidade_pago', 'quantidade_pendente', 'quantidade_atrasado', 'quantidade_total',
+    'total_pago', 'total_pendente', 'total_atrasado', 'total_geral',
+    'ultimo_pagamento', 'sequencia_em_dia', 'calculado_em',
+]
+
+
+def _anotacoes(hoje):
+    """Agregados por aluno equivalentes a MensalidadeQuerySet.totais() e sequencia_em_dia()"""
+    zero = Decimal('0.00')
+    m = 'mensalidades__'
+    ultima_falha = (
+        Mensalidade.objects.filter(aluno=OuterRef('pk'), vencimento__lte=hoje)
+        .exclude(paga_em_dia())
+        .order_by('-vencimento')
+        .values('vencimento')[:1]
+    )
+    return {
+        'ultima_falha': Coalesce(Subquery(ultima_falha), Value(date.min, output_field=DateField())),
+        'quantidade_pago': Count(f'{m}id', filter=Q(mensalidades__status='pago')),
+        'quantidade_pendente': Count(f'{m}id', filter=Q(mensalidades__status='pendente')),
+        'quantidade_atrasado': Count(f'{m}id', filter=Q(mensalidades__status='atrasado')),
+        'quantidade_total': Count(f'{m}id'),
+        'total_pago': Sum(f'{m}valor', filter=Q(mensalidades__status='pago'), default=zero),
+        'total_pendente': Sum(f'{m}valor', filter=Q(mensalidades__status='pendente'), default=zero),
+        'total_atrasado': Sum(f'{m}valor', filter=Q(mensalidades__status='atrasado'), default=zero),
+        'total_geral': Sum(f'{m}valor', default=zero),
+        'ultimo_pagamento': Max(f'{m}data_pagamento', filter=Q(mensalidades__status='pago')),
+    }
+
+
+def _gravar(linhas, hoje):
+    """Grava as linhas calculadas com INSERT ... SELECT, atualizando os resumos existentes"""
+    conexao = connections[linhas.db]
+    q = conexao.ops.quote_name
+    meta = ResumoFinanceiroAluno._meta
+    colunas = [meta.get_field(nome).column for nome in ['aluno', *CAMPOS_RESUMO, 'atualizado_em']]
+    calculados = ['aluno_id', *CAMPOS_RESUMO[:-1]]
+    consulta, params = linhas.query.sql_with_params()
+    sql = (
+        f'INSERT INTO {q(meta.db_table)} ({", ".join(q(c) for c in colunas)}) '
+        f'SELECT {", ".join(q(c) for c in calculados)}, %s, %s FROM ({consulta}) calculo '
+        # Sem o WHERE o SQLite confunde o ON CONFLICT com o ON de um JOIN
+        f'WHERE 1 = 1 '
+        f'ON CONFLICT ({q(colunas[0])}) DO UPDATE SET '
+        + ', '.join(f'{q(c)} = excluded.{q(c)}' for c in colunas[1:])
+    )
+    params = (
+        conexao.ops.adapt_datefield_value(hoje),
+        conexao.ops.adapt_datetimefield_value(timezone.now()),
+        *params,
+    )
+    with conexao.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def recalcular_resumos(aluno_ids=None, hoje=None, chunk_size=None):
+    """
+    Recalcula os resumos financeiros dos alunos informados (ou de todos).
+
+    Cada bloco de chunk_size alunos é um único comando no banco: com todos
+    os alunos, os blocos são faixas de ids. Retorna a quantidade de resumos
+    gravados.
+    """
+    hoje = hoje or timezone.localdate()
+    chunk_size = chunk_size or settings.ESCOLA_RESUMOS_CHUNK_SIZE
+
+    if aluno_ids is None:
+        ids = list(Aluno.objects.order_by('pk').values_list('pk', flat=True))
+        blocos = [
+            Q(pk__gte=ids[inicio], pk__lte=ids[min(inicio + chunk_size, len(ids)) - 1])
+            for inicio in range(0, len(ids), chunk_size)
+        ]
+    else:
+        ids = sorted(set(aluno_ids))
+        blocos = [Q(pk__in=ids[inicio:inicio + chunk_size]) for inicio in range(0, len(ids), chunk_size)]
+
+    gravados = 0
+    for bloco in blocos:
+        anotacoes = _anotacoes(hoje)
+        linhas = (
+            Aluno.objects.filter(bloco)
+            .order_by()
+            .annotate(**anotacoes)
+            .annotate(sequencia_em_dia=Count(
+                'mensalidades__id',
+                filter=Q(mensalidades__vencimento__lte=hoje, mensalidades__vencimento__gt=F('ultima_falha')),
+            ))
+            .values(*CAMPOS_RESUMO[:-1], aluno_id=F('pk'))
+        )
+        gravados += _gravar(linhas, hoje)
+    return gravados
+
+
+def resumo_do_aluno(aluno):
+    """
+    Lê o resumo financeiro do aluno: uma única linha, pela chave primária.
+
+    A leitura não grava nada, então a página mostra o mesmo resumo que a
+    API. A sequência em dia, que depende da data, é a de calculado_em; o
+    comando recalcular_resumos, agendado uma vez por dia, a atualiza. Sem
+    linha (aluno ainda sem mensalidades) o resumo é zerado, sem gravar.
+    """
+    try:
+        return ResumoFinanceiroAluno.objects.get(aluno=aluno)
+    except ResumoFinanceiroAluno.DoesNotExist:
+        return ResumoFinanceiroAluno(aluno=aluno, calculado_em=timezone.localdate())
+
+
+def alunos_das_mensalidades(mensalidades):
+    """Ids dos alunos de um queryset de mensalidades (para as operações em lote)"""
+    return set(mensalidades.order_by().values_list('aluno_id', flat=True).distinct())
+
+
+def atualizar_resumo(sender, instance, origin=None, **kwargs):
+    """Receiver de post_save/post_delete de Mensalidade"""
+    if isinstance(origin, Aluno) or getattr(origin, 'model', None) is Aluno:
+        # Exclusão do próprio aluno: o resumo também é excluído em cascata
+        return
+    recalcular_resumos([instance.aluno_id])
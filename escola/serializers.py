@@ -1,8 +1,42 @@
 from rest_framework import serializers
-from .models import Usuario, Aluno, Turma, Mensalidade
+from .models import Usuario, Aluno, Turma, Mensalidade, ResumoFinanceiroAluno
 
 
-class UsuarioSerializer(serializers.ModelSerializer):
+def campos_solicitados(request):
+    """Retorna os campos pedidos em ?fields=id,nome (ou None se não houver)"""
+    if request is None or request.method != 'GET':
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return {campo.strip() for campo in fields.split(',') if campo.strip()}
+
+
+class CamposDinamicosMixin:
+    """
+    Permite ao cliente escolher os campos retornados com ?fields=id,nome.
+
+    Só se aplica ao serializer de nível mais alto de requisições GET; os
+    serializers aninhados continuam completos.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        campos = campos_solicitados(self.context.get('request'))
+        if campos:
+            for nome in set(self.fields) - campos:
+                self.fields.pop(nome)
+
+
+def total_alunos_da_turma(turma):
+    """Usa a anotação total_alunos quando presente, evitando um COUNT por turma"""
+    total = getattr(turma, 'total_alunos', None)
+    if total is None:
+        total = turma.alunos.count()
+    return total
+
+
+class UsuarioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para model Usuario"""
     class Meta:
         model = Usuario
@@ -10,21 +44,34 @@ class UsuarioSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class AlunoSerializer(serializers.ModelSerializer):
+class ResumoFinanceiroAlunoSerializer(serializers.ModelSerializer):
+    """Serializer (somente leitura) para o resumo financeiro do aluno"""
+    class Meta:
+        model = ResumoFinanceiroAluno
+        fields = [
+            'quantidade_pago', 'quantidade_pendente', 'quantidade_atrasado', 'quantidade_total',
+            'total_pago', 'total_pendente', 'total_atrasado', 'total_geral',
+            'ultimo_pagamento', 'sequencia_em_dia', 'calculado_em'
+        ]
+        read_only_fields = fields
+
+
+class AlunoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para model Aluno"""
     turmas = serializers.StringRelatedField(many=True, read_only=True)
+    resumo_financeiro = ResumoFinanceiroAlunoSerializer(read_only=True, allow_null=True)
     
     class Meta:
         model = Aluno
         fields = [
             'id', 'nome', 'nome_pai', 'nome_mae', 'documento', 'foto',
             'data_nascimento', 'endereco', 'telefone', 'email',
-            'data_cadastro', 'ativo', 'turmas'
+            'data_cadastro', 'ativo', 'turmas', 'resumo_financeiro'
         ]
         read_only_fields = ['id', 'data_cadastro']
 
 
-class TurmaSerializer(serializers.ModelSerializer):
+class TurmaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para model Turma"""
     alunos = AlunoSerializer(many=True, read_only=True)
     professor_responsavel = UsuarioSerializer(read_only=True)
@@ -39,10 +86,10 @@ class TurmaSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'data_criacao']
     
     def get_total_alunos(self, obj):
-        return obj.alunos.count()
+        return total_alunos_da_turma(obj)
 
 
-class TurmaSimpleSerializer(serializers.ModelSerializer):
+class TurmaSimpleSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer simplificado para Turma (sem alunos)"""
     professor_responsavel_nome = serializers.CharField(source='professor_responsavel.get_full_name', read_only=True)
     total_alunos = serializers.SerializerMethodField()
@@ -56,10 +103,10 @@ class TurmaSimpleSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'data_criacao']
     
     def get_total_alunos(self, obj):
-        return obj.alunos.count()
+        return total_alunos_da_turma(obj)
 
 
-class MensalidadeSerializer(serializers.ModelSerializer):
+class MensalidadeSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para model Mensalidade"""
     aluno = AlunoSerializer(read_only=True)
     aluno_id = serializers.PrimaryKeyRelatedField(
@@ -73,12 +120,39 @@ class MensalidadeSerializer(serializers.ModelSerializer):
         model = Mensalidade
         fields = [
             'id', 'aluno', 'aluno_id', 'valor', 'vencimento', 'status',
-            'status_display', 'data_pagamento', 'observacoes', 'data_cadastro'
+            'status_display', 'data_pagamento', 'observacoes', 'turma', 'data_cadastro'
         ]
         read_only_fields = ['id', 'data_cadastro']
 
+    def validate(self, attrs):
+        """
+        Impede duas mensalidades do mesmo aluno na mesma competência e uma
+        turma que não seja do aluno no ano da competência
+        """
+        aluno = attrs.get('aluno', getattr(self.instance, 'aluno', None))
+        vencimento = attrs.get('vencimento', getattr(self.instance, 'vencimento', None))
+        if aluno and vencimento:
+            duplicadas = Mensalidade.objects.filter(
+                aluno=aluno,
+                competencia=Mensalidade.competencia_de(vencimento),
+            )
+            if self.instance is not None:
+                duplicadas = duplicadas.exclude(pk=self.instance.pk)
+            if duplicadas.exists():
+                raise serializers.ValidationError({
+                    'vencimento': 'Este aluno já possui mensalidade para esta competência.'
+                })
+            turma = attrs.get('turma')
+            if turma is not None and not Mensalidade.turma_valida(
+                aluno.pk, Mensalidade.competencia_de(vencimento), turma.pk
+            ):
+                raise serializers.ValidationError({
+                    'turma': 'A turma deve ser uma turma do aluno no ano da competência.'
+                })
+        return attrs
 
-class MensalidadeSimpleSerializer(serializers.ModelSerializer):
+
+class MensalidadeSimpleSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer simplificado para Mensalidade"""
     aluno_nome = serializers.CharField(source='aluno.nome', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -90,3 +164,36 @@ class MensalidadeSimpleSerializer(serializers.ModelSerializer):
             'status_display', 'data_pagamento', 'data_cadastro'
         ]
         read_only_fields = ['id', 'data_cadastro']
+
+
+class AlteracaoStatusEmLoteSerializer(serializers.Serializer):
+    """Valida a alteração de status de várias mensalidades de uma vez"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=5000,
+    )
+    status = serializers.ChoiceField(choices=Mensalidade.STATUS_CHOICES)
+    data_pagamento = serializers.DateField(required=False, allow_null=True)
+
+
+class RelatorioMensalSerializer(serializers.Serializer):
+    """Linha do relatório mensal de faturamento e inadimplência (somente leitura)"""
+    competencia = serializers.DateField()
+    grupo = serializers.CharField()
+    turma = serializers.IntegerField(allow_null=True)
+    periodo = serializers.CharField(allow_null=True)
+    ano_letivo = serializers.IntegerField(allow_null=True)
+    quantidade_mensalidades = serializers.IntegerField()
+    quantidade_pagas = serializers.IntegerField()
+    quantidade_em_atraso = serializers.IntegerField()
+    valor_faturado = serializers.DecimalField(max_digits=14, decimal_places=2)
+    valor_recebido = serializers.DecimalField(max_digits=14, decimal_places=2)
+    valor_em_aberto = serializers.DecimalField(max_digits=14, decimal_places=2)
+    valor_a_vencer = serializers.DecimalField(max_digits=14, decimal_places=2)
+    valor_atraso_30 = serializers.DecimalField(max_digits=14, decimal_places=2)
+    valor_atraso_60 = serializers.DecimalField(max_digits=14, decimal_places=2)
+    valor_atraso_90 = serializers.DecimalField(max_digits=14, decimal_places=2)
+    valor_atraso_mais_90 = serializers.DecimalField(max_digits=14, decimal_places=2)
+    valor_em_atraso = serializers.DecimalField(max_digits=14, decimal_places=2)
+    taxa_inadimplencia = serializers.DecimalField(max_digits=5, decimal_places=2)
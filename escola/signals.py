@@ -0,0 +1,42 @@
+from django.apps import apps
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
+
+from .autocompletar import atualizar_aluno, atualizar_turma, remover_aluno, remover_turma
+from .banco import configurar_sqlite
+from .busca import reinstalar_indice_busca
+from .em_cache import invalidar_dependentes
+from .miniaturas import agendar_miniaturas
+from .relatorios import (
+    atualizar_aluno_excluido, atualizar_matriculas, atualizar_mensalidade, atualizar_turma as consolidar_turma,
+    atualizar_turma_excluida, guardar_alunos_da_turma, guardar_celulas_do_aluno,
+)
+from .resumos import atualizar_resumo
+from .models import Aluno, Turma, Mensalidade
+
+
+def conectar_signals():
+    """Conecta os receivers que mantêm os dados derivados atualizados"""
+    # Grupos de escola.em_cache (dashboard, anos, turmas) que dependem de cada model
+    for model in (Aluno, Turma, Mensalidade):
+        post_save.connect(invalidar_dependentes, sender=model, dispatch_uid=f'em_cache_save_{model.__name__}')
+        post_delete.connect(invalidar_dependentes, sender=model, dispatch_uid=f'em_cache_delete_{model.__name__}')
+    m2m_changed.connect(invalidar_dependentes, sender=Turma.alunos.through, dispatch_uid='em_cache_turma_alunos')
+    post_migrate.connect(reinstalar_indice_busca, sender=apps.get_app_config('escola'), dispatch_uid='indice_busca_alunos')
+    post_save.connect(atualizar_aluno, sender=Aluno, dispatch_uid='autocompletar_save_aluno')
+    post_save.connect(atualizar_turma, sender=Turma, dispatch_uid='autocompletar_save_turma')
+    post_delete.connect(remover_aluno, sender=Aluno, dispatch_uid='autocompletar_delete_aluno')
+    post_delete.connect(remover_turma, sender=Turma, dispatch_uid='autocompletar_delete_turma')
+    post_save.connect(atualizar_resumo, sender=Mensalidade, dispatch_uid='resumo_save_mensalidade')
+    post_delete.connect(atualizar_resumo, sender=Mensalidade, dispatch_uid='resumo_delete_mensalidade')
+    # Consolidação mensal dos relatórios (escola.relatorios)
+    post_save.connect(atualizar_mensalidade, sender=Mensalidade, dispatch_uid='consolidado_save_mensalidade')
+    post_delete.connect(atualizar_mensalidade, sender=Mensalidade, dispatch_uid='consolidado_delete_mensalidade')
+    pre_delete.connect(guardar_celulas_do_aluno, sender=Aluno, dispatch_uid='consolidado_pre_delete_aluno')
+    post_delete.connect(atualizar_aluno_excluido, sender=Aluno, dispatch_uid='consolidado_delete_aluno')
+    pre_delete.connect(guardar_alunos_da_turma, sender=Turma, dispatch_uid='consolidado_pre_delete_turma')
+    post_delete.connect(atualizar_turma_excluida, sender=Turma, dispatch_uid='consolidado_delete_turma')
+    post_save.connect(consolidar_turma, sender=Turma, dispatch_uid='consolidado_save_turma')
+    m2m_changed.connect(atualizar_matriculas, sender=Turma.alunos.through, dispatch_uid='consolidado_turma_alunos')
+    post_save.connect(agendar_miniaturas, sender=Aluno, dispatch_uid='miniaturas_save_aluno')
+    connection_created.connect(configurar_sqlite, dispatch_uid='pragmas_sqlite')
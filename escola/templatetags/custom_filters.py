@@ -1,87 +1,28 @@
 from django import template
 
+from escola.extenso import reais_por_extenso
+from escola.miniaturas import nome_miniatura, tamanho_para_exibir
+
 register = template.Library()
 
 @register.filter
 def extenso(valor):
-    """Converte um valor numérico para extenso (simplificado)"""
+    """Converte um valor em reais para extenso (veja escola/extenso.py)"""
     try:
-        valor = float(valor)
-        inteiro = int(valor)
-        centavos = int((valor - inteiro) * 100)
-        
-        # Unidades
-        unidades = ['', 'um', 'dois', 'três', 'quatro', 'cinco', 'seis', 'sete', 'oito', 'nove']
-        # Dezenas
-        dezenas = ['', '', 'vinte', 'trinta', 'quarenta', 'cinquenta', 'sessenta', 'setenta', 'oitenta', 'noventa']
-        # Números especiais de 10 a 19
-        especiais = ['dez', 'onze', 'doze', 'treze', 'quatorze', 'quinze', 'dezesseis', 'dezessete', 'dezoito', 'dezenove']
-        # Centenas
-        centenas = ['', 'cento', 'duzentos', 'trezentos', 'quatrocentos', 'quinhentos', 'seiscentos', 'setecentos', 'oitocentos', 'novecentos']
-        
-        def numero_por_extenso(n):
-            if n == 0:
-                return 'zero'
-            if n == 100:
-                return 'cem'
-            
-            resultado = []
-            
-            # Centenas
-            c = n // 100
-            if c > 0:
-                resultado.append(centenas[c])
-            
-            # Dezenas e unidades
-            resto = n % 100
-            if resto >= 10 and resto < 20:
-                resultado.append(especiais[resto - 10])
-            else:
-                d = resto // 10
-                u = resto % 10
-                if d > 0:
-                    resultado.append(dezenas[d])
-                if u > 0:
-                    if d > 0:
-                        resultado.append('e')
-                    resultado.append(unidades[u])
-            
-            return ' '.join(resultado)
-        
-        # Milhares
-        if inteiro >= 1000:
-            milhares = inteiro // 1000
-            if milhares == 1:
-                resultado_reais = 'mil'
-            else:
-                resultado_reais = numero_por_extenso(milhares) + ' mil'
-            
-            resto = inteiro % 1000
-            if resto > 0:
-                if resto < 100:
-                    resultado_reais += ' e ' + numero_por_extenso(resto)
-                else:
-                    resultado_reais += ' ' + numero_por_extenso(resto)
-        else:
-            resultado_reais = numero_por_extenso(inteiro)
-        
-        # Adiciona "reais"
-        if inteiro == 1:
-            resultado_reais += ' real'
-        else:
-            resultado_reais += ' reais'
-        
-        # Centavos
-        if centavos > 0:
-            resultado_centavos = numero_por_extenso(centavos)
-            if centavos == 1:
-                resultado_centavos += ' centavo'
-            else:
-                resultado_centavos += ' centavos'
-            
-            return resultado_reais + ' e ' + resultado_centavos
-        
-        return resultado_reais
-        
+        return reais_por_extenso(valor)
     except (ValueError, TypeError):
         return str(valor)
+
+
+@register.filter
+def miniatura(foto, largura):
+    """
+    URL da miniatura adequada para exibir a foto com a largura dada, em pixels.
+
+    Enquanto as miniaturas não foram geradas, retorna a URL da foto original.
+    """
+    if not foto:
+        return ''
+    if getattr(foto.instance, 'foto_miniaturas', None) != foto.name:
+        return foto.url
+    return foto.storage.url(nome_miniatura(foto.name, tamanho_para_exibir(int(largura))))
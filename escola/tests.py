@@ -1,3 +1,2232 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .cobranca import gerar_mensalidades_mes
+from .models import Usuario, Aluno, Turma, Mensalidade, ResumoFinanceiroAluno, ConsolidadoMensal
+from .resumos import recalcular_resumos
+
+
+def criar_alunos(quantidade, inicio=0, **extra):
+    """Cria alunos de teste em lote"""
+    alunos = [
+        Aluno(nome=f'Aluno {i:05d}', documento=f'DOC-{i:05d}', **extra)
+        for i in range(inicio, inicio + quantidade)
+    ]
+    for aluno in alunos:
+        aluno.atualizar_busca()
+    return Aluno.objects.bulk_create(alunos)
+
+
+def descartar_autocompletar():
+    """Descarta o índice do autocompletar do processo: a próxima busca o monta na hora"""
+    from .autocompletar import autocompletar
+    autocompletar.invalidar()
+    with autocompletar.lock:
+        autocompletar.indices = None
+
+
+class GerarMensalidadesTest(TestCase):
+    """Testes do motor de geração de mensalidades"""
+
+    def test_gera_para_alunos_ativos_e_ignora_existentes(self):
+        alunos = criar_alunos(3, valor_mensalidade=Decimal('300.00'))
+        Aluno.objects.create(nome='Inativo', documento='INATIVO', ativo=False)
+        Mensalidade.objects.create(aluno=alunos[0], valor=Decimal('300.00'), vencimento=date(2025, 3, 5))
+
+        resultado = gerar_mensalidades_mes(3, 2025, hoje=date(2025, 3, 1))
+
+        self.assertEqual(resultado.total_alunos, 3)
+        self.assertEqual(resultado.criadas, 2)
+        self.assertEqual(resultado.ja_existentes, 1)
+        self.assertEqual(resultado.valor_total, Decimal('600.00'))
+        geradas = Mensalidade.objects.filter(vencimento=date(2025, 3, 10))
+        self.assertEqual(geradas.count(), 2)
+        self.assertTrue(all(m.status == 'pendente' for m in geradas))
+
+    def test_segunda_execucao_nao_duplica(self):
+        criar_alunos(5)
+        gerar_mensalidades_mes(1, 2025, hoje=date(2025, 2, 1))
+        resultado = gerar_mensalidades_mes(1, 2025, hoje=date(2025, 2, 1))
+
+        self.assertEqual(resultado.criadas, 0)
+        self.assertEqual(resultado.ja_existentes, 5)
+        self.assertEqual(Mensalidade.objects.filter(status='atrasado').count(), 5)
+
+    def test_totais_so_com_as_linhas_inseridas(self):
+        """Uma mensalidade criada por outro caminho durante a geração não entra nos totais"""
+        from unittest import mock
+
+        alunos = criar_alunos(3, valor_mensalidade=Decimal('300.00'))
+        bulk_create = Mensalidade.objects.bulk_create
+
+        def com_concorrente(objs, **kwargs):
+            Mensalidade.objects.create(aluno=alunos[1], valor=Decimal('999.00'), vencimento=date(2025, 3, 10))
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(Mensalidade.objects, 'bulk_create', com_concorrente):
+            resultado = gerar_mensalidades_mes(3, 2025, hoje=date(2025, 3, 1))
+
+        self.assertEqual(resultado.criadas, 2)
+        self.assertEqual(resultado.ja_existentes, 1)
+        self.assertEqual(resultado.valor_total, Decimal('600.00'))
+        self.assertEqual(Mensalidade.objects.filter(competencia=date(2025, 3, 1)).count(), 3)
+
+    def test_quantidade_de_queries_constante(self):
+        """O número de queries não cresce com o número de alunos"""
+        criar_alunos(10)
+        with CaptureQueriesContext(connection) as poucos:
+            gerar_mensalidades_mes(1, 2025)
+
+        criar_alunos(90, inicio=10)
+        with CaptureQueriesContext(connection) as muitos:
+            gerar_mensalidades_mes(2, 2025)
+
+        self.assertEqual(Mensalidade.objects.filter(vencimento__month=2).count(), 100)
+        self.assertEqual(len(poucos), len(muitos))
+
+    def test_batch_size_divide_os_inserts(self):
+        criar_alunos(25)
+        with CaptureQueriesContext(connection) as queries:
+            gerar_mensalidades_mes(1, 2025, batch_size=10)
+
+        inserts = [q for q in queries if q['sql'].startswith('INSERT') and 'INTO "escola_mensalidade"' in q['sql']]
+        self.assertEqual(len(inserts), 3)
+
+    def test_command_e_view_reportam_os_mesmos_totais(self):
+        criar_alunos(4)
+        saida = StringIO()
+        call_command('gerar_mensalidades', mes=5, ano=2025, batch_size=2, stdout=saida)
+        self.assertIn('Mensalidades criadas: 4', saida.getvalue())
+
+        criar_alunos(2, inicio=4)
+        usuario = Usuario.objects.create_user('secretaria', password='senha')
+        self.client.force_login(usuario)
+        response = self.client.post(reverse('gerar_mensalidades'), {'mes': 5, 'ano': 2025}, follow=True)
+        mensagens = [str(m) for m in response.context['messages']]
+        self.assertTrue(any('2 mensalidade(s) gerada(s)' in m for m in mensagens))
+        self.assertTrue(any('4 aluno(s) já possuíam' in m for m in mensagens))
+
+
+class CompetenciaMensalidadeTest(TestCase):
+    """Testes da competência e da restrição única de mensalidades"""
+
+    def setUp(self):
+        self.aluno = criar_alunos(1)[0]
+
+    def test_competencia_derivada_do_vencimento(self):
+        mensalidade = Mensalidade.objects.create(aluno=self.aluno, valor=100, vencimento=date(2025, 7, 25))
+        self.assertEqual(mensalidade.competencia, date(2025, 7, 1))
+
+        mensalidade.vencimento = date(2025, 8, 3)
+        mensalidade.save(update_fields=['vencimento'])
+        mensalidade.refresh_from_db()
+        self.assertEqual(mensalidade.competencia, date(2025, 8, 1))
+
+    def test_banco_rejeita_duplicata_na_competencia(self):
+        from django.db import IntegrityError, transaction
+
+        Mensalidade.objects.create(aluno=self.aluno, valor=100, vencimento=date(2025, 7, 10))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Mensalidade.objects.create(aluno=self.aluno, valor=100, vencimento=date(2025, 7, 20))
+
+    def test_clean_valida_duplicata(self):
+        from django.core.exceptions import ValidationError
+
+        Mensalidade.objects.create(aluno=self.aluno, valor=100, vencimento=date(2025, 7, 10))
+        duplicada = Mensalidade(aluno=self.aluno, valor=100, vencimento=date(2025, 7, 20))
+        with self.assertRaises(ValidationError):
+            duplicada.full_clean()
+
+    def test_geracao_ignora_conflito_de_execucao_concorrente(self):
+        """Linhas inseridas entre a leitura e o INSERT não quebram a geração"""
+        from unittest import mock
+
+        original = Mensalidade.objects.bulk_create
+
+        def inserir_antes(objs, **kwargs):
+            Mensalidade.objects.create(aluno=self.aluno, valor=100, vencimento=date(2025, 9, 10))
+            return original(objs, **kwargs)
+
+        with mock.patch.object(Mensalidade.objects, 'bulk_create', side_effect=inserir_antes):
+            resultado = gerar_mensalidades_mes(9, 2025)
+
+        self.assertEqual(resultado.criadas + resultado.ja_existentes, 1)
+        self.assertEqual(Mensalidade.objects.filter(aluno=self.aluno).count(), 1)
+
+
+class TotaisMensalidadeTest(TestCase):
+    """Testes dos totais agregados de mensalidades"""
+
+    def setUp(self):
+        alunos = criar_alunos(3)
+        Mensalidade.objects.create(aluno=alunos[0], valor=Decimal('100.00'), vencimento=date(2025, 1, 10), status='pago')
+        Mensalidade.objects.create(aluno=alunos[1], valor=Decimal('200.00'), vencimento=date(2025, 1, 10), status='pago')
+        Mensalidade.objects.create(aluno=alunos[2], valor=Decimal('50.00'), vencimento=date(2025, 1, 10), status='pendente')
+        Mensalidade.objects.create(aluno=alunos[2], valor=Decimal('70.00'), vencimento=date(2024, 12, 10), status='atrasado')
+        self.usuario = Usuario.objects.create_user('financeiro', password='senha')
+
+    def test_totais_em_uma_consulta(self):
+        with self.assertNumQueries(1):
+            totais = Mensalidade.objects.all().totais()
+
+        self.assertEqual(totais['total_pago'], Decimal('300.00'))
+        self.assertEqual(totais['total_pendente'], Decimal('50.00'))
+        self.assertEqual(totais['total_atrasado'], Decimal('70.00'))
+        self.assertEqual(totais['total_geral'], Decimal('420.00'))
+        self.assertEqual(totais['quantidade_pago'], 2)
+        self.assertEqual(totais['quantidade_total'], 4)
+
+    def test_totais_de_conjunto_vazio(self):
+        totais = Mensalidade.objects.filter(status='pago', valor__gt=1000).totais()
+        self.assertEqual(totais['total_pago'], Decimal('0.00'))
+        self.assertEqual(totais['quantidade_total'], 0)
+
+    def test_view_usa_totais_do_filtro(self):
+        self.client.force_login(self.usuario)
+        response = self.client.get(reverse('mensalidade_lista'), {'mes_inicial': 1, 'ano_inicial': 2025})
+        self.assertEqual(response.context['total_geral'], Decimal('350.00'))
+        self.assertEqual(response.context['quantidade_atrasado'], 0)
+
+    def test_endpoint_api_de_totais(self):
+        self.client.force_login(self.usuario)
+        response = self.client.get('/api/mensalidades/totais/', {'status': 'pago'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['quantidade_total'], 2)
+        self.assertEqual(Decimal(response.json()['total_geral']), Decimal('300.00'))
+
+
+@override_settings(ESCOLA_TAMANHO_PAGINA=10, ESCOLA_TAMANHO_PAGINA_MAXIMO=25)
+class PaginacaoPorChaveTest(TestCase):
+    """Testes da paginação por chave das listagens web"""
+
+    def setUp(self):
+        self.alunos = criar_alunos(23)
+        self.client.force_login(Usuario.objects.create_user('secretaria', password='senha'))
+
+    def percorrer(self, url, params=None):
+        """Segue os links de próxima página e retorna os ids vistos"""
+        params = dict(params or {})
+        vistos = []
+        response = self.client.get(url, params)
+        while True:
+            pagina = response.context['pagina']
+            vistos.extend(obj.id for obj in pagina)
+            if not pagina.tem_proxima:
+                return vistos, pagina
+            response = self.client.get(url + pagina.url_proxima)
+
+    def test_alunos_percorridos_sem_repeticao(self):
+        vistos, _ = self.percorrer(reverse('aluno_lista'))
+        esperados = list(Aluno.objects.order_by('nome', 'id').values_list('id', flat=True))
+        self.assertEqual(vistos, esperados)
+
+    def test_pagina_anterior_volta_para_os_mesmos_itens(self):
+        url = reverse('aluno_lista')
+        primeira = self.client.get(url).context['pagina']
+        segunda = self.client.get(url + primeira.url_proxima).context['pagina']
+        voltou = self.client.get(url + segunda.url_anterior).context['pagina']
+        self.assertEqual([a.id for a in voltou], [a.id for a in primeira])
+        self.assertFalse(voltou.tem_anterior)
+        self.assertTrue(voltou.tem_proxima)
+
+    def test_mensalidades_com_vencimentos_repetidos_e_filtros(self):
+        for i, aluno in enumerate(self.alunos):
+            Mensalidade.objects.create(aluno=aluno, valor=100, vencimento=date(2025, 1 + i % 3, 10),
+                                       status='pago' if i % 2 else 'pendente')
+
+        vistos, _ = self.percorrer(reverse('mensalidade_lista'), {'status': 'pago'})
+        esperados = list(
+            Mensalidade.objects.filter(status='pago').order_by('-vencimento', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(vistos, esperados)
+
+    def test_paginas_profundas_tem_o_mesmo_numero_de_queries(self):
+        url = reverse('aluno_lista')
+        response = self.client.get(url)
+        with CaptureQueriesContext(connection) as primeira:
+            self.client.get(url)
+        response = self.client.get(url + response.context['pagina'].url_proxima)
+        with CaptureQueriesContext(connection) as profunda:
+            self.client.get(url + response.context['pagina'].url_proxima)
+        self.assertEqual(len(primeira), len(profunda))
+
+    def test_filtro_posiciona_a_busca_no_indice(self):
+        from .paginacao import _filtro_apos, _normalizar_ordenacao
+
+        casos = [
+            (Mensalidade, ('-vencimento', '-id'), ['2025-03-10', 50], 'mensalidade_venc_id_idx'),
+            (Aluno, ('nome', 'id'), ['Aluno 00010', 11], 'aluno_nome_id_idx'),
+        ]
+        for model, ordenacao, valores, indice in casos:
+            campos = _normalizar_ordenacao(ordenacao)
+            for voltando in (False, True):
+                with self.subTest(model=model.__name__, voltando=voltando):
+                    consulta = model.objects.filter(_filtro_apos(campos, valores, inverter=voltando))
+                    # O primeiro campo é limitado fora do OR: o plano é uma busca (SEARCH), não um SCAN
+                    plano = consulta.order_by(*ordenacao).explain()
+                    self.assertIn(f'SEARCH {model._meta.db_table} USING INDEX {indice}', plano)
+
+    def test_tamanho_da_pagina_limitado_pelas_settings(self):
+        response = self.client.get(reverse('aluno_lista'), {'por_pagina': 1000})
+        self.assertEqual(len(response.context['pagina']), 23)
+        self.assertEqual(response.context['pagina'].tamanho, 25)
+
+    def test_cursor_invalido_volta_para_a_primeira_pagina(self):
+        response = self.client.get(reverse('aluno_lista'), {'cursor': 'lixo!'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['pagina']), 10)
+
+
+class HistoricoPagamentosTest(TestCase):
+    """Testes das estatísticas do histórico de pagamentos"""
+
+    def setUp(self):
+        self.aluno = criar_alunos(1)[0]
+        self.client.force_login(Usuario.objects.create_user('secretaria', password='senha'))
+
+    def criar_historico(self, anos):
+        """Cria mensalidades mensais pagas em dia a partir de janeiro de 2010"""
+        mensalidades = []
+        for i in range(anos * 12):
+            vencimento = date(2010 + i // 12, i % 12 + 1, 10)
+            mensalidades.append(Mensalidade(
+                aluno=self.aluno, valor=Decimal('100.00'), vencimento=vencimento,
+                competencia=vencimento.replace(day=1), status='pago', data_pagamento=vencimento,
+            ))
+        Mensalidade.objects.bulk_create(mensalidades)
+
+    def test_sequencia_para_na_falha_mais_recente(self):
+        self.criar_historico(1)
+        # Março pago com atraso e agosto ainda em aberto
+        Mensalidade.objects.filter(vencimento=date(2010, 3, 10)).update(data_pagamento=date(2010, 3, 15))
+        Mensalidade.objects.filter(vencimento=date(2010, 8, 10)).update(status='atrasado', data_pagamento=None)
+
+        sequencia = self.aluno.mensalidades.sequencia_em_dia(hoje=date(2011, 1, 1))
+        self.assertEqual(sequencia, 4)
+
+        sequencia = self.aluno.mensalidades.sequencia_em_dia(hoje=date(2010, 7, 31))
+        self.assertEqual(sequencia, 4)
+
+    def test_mensalidades_futuras_nao_contam(self):
+        self.criar_historico(1)
+        Mensalidade.objects.filter(vencimento__gte=date(2010, 6, 10)).update(status='pendente', data_pagamento=None)
+        self.assertEqual(self.aluno.mensalidades.sequencia_em_dia(hoje=date(2010, 6, 1)), 5)
+
+    def test_estatisticas_do_historico(self):
+        self.criar_historico(1)
+        Mensalidade.objects.filter(vencimento__year=2010, vencimento__month__gt=10).update(status='pendente')
+        # bulk_create e update() não disparam signals
+        recalcular_resumos([self.aluno.pk])
+
+        response = self.client.get(reverse('historico_pagamentos', args=[self.aluno.pk]))
+        self.assertEqual(response.context['total_pagas'], 10)
+        self.assertEqual(response.context['total_pendentes'], 2)
+        self.assertEqual(response.context['valor_pago'], Decimal('1000.00'))
+        self.assertEqual(response.context['valor_total'], Decimal('1200.00'))
+        self.assertEqual(response.context['ticket_medio'], Decimal('100.00'))
+        self.assertEqual(response.context['meses_consecutivos'], 0)
+
+    def test_quantidade_de_queries_independe_do_historico(self):
+        self.criar_historico(1)
+        recalcular_resumos([self.aluno.pk])
+        url = reverse('historico_pagamentos', args=[self.aluno.pk])
+        with CaptureQueriesContext(connection) as curto:
+            self.client.get(url)
+
+        Mensalidade.objects.all().delete()
+        self.criar_historico(12)
+        # bulk_create não dispara post_save
+        recalcular_resumos([self.aluno.pk])
+        with CaptureQueriesContext(connection) as longo:
+            response = self.client.get(url)
+
+        self.assertEqual(response.context['total_mensalidades'], 144)
+        self.assertEqual(len(curto), len(longo))
+
+
+class DashboardTest(TestCase):
+    """Testes do dashboard em cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.force_login(Usuario.objects.create_user('secretaria', password='senha'))
+
+    def criar_dados(self, quantidade):
+        alunos = criar_alunos(quantidade, inicio=Aluno.objects.count())
+        for i, aluno in enumerate(alunos):
+            turma = Turma.objects.create(nome=f'Turma {aluno.pk}', ano_letivo=2025)
+            turma.alunos.add(aluno)
+            Mensalidade.objects.create(aluno=aluno, valor=100, vencimento=date(2025, 1, 10),
+                                       status='atrasado' if i % 2 else 'pago')
+
+    def test_contadores_e_turmas_anotadas(self):
+        self.criar_dados(6)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['total_alunos'], 6)
+        self.assertEqual(response.context['total_turmas'], 6)
+        self.assertEqual(response.context['mensalidades_pagas'], 3)
+        self.assertEqual(response.context['mensalidades_pendentes'], 0)
+        self.assertEqual([t.total_alunos for t in response.context['turmas_ativas']], [1] * 5)
+
+    def test_contadores_em_uma_consulta_por_tabela(self):
+        from .dashboard import calcular_dashboard
+
+        self.criar_dados(2)
+        Aluno.objects.create(nome='Inativo', documento='INATIVO', ativo=False)
+        # Contadores de alunos, turmas e mensalidades, mensalidades atrasadas e turmas ativas
+        with self.assertNumQueries(5):
+            dados = calcular_dashboard()
+        self.assertEqual((dados['total_alunos'], dados['total_turmas']), (2, 2))
+
+        Mensalidade.objects.all().delete()
+        dados = calcular_dashboard()
+        self.assertEqual((dados['total_alunos'], dados['mensalidades_pagas']), (2, 0))
+
+    def test_sem_n_mais_1_no_template(self):
+        self.criar_dados(2)
+        with CaptureQueriesContext(connection) as poucos:
+            self.client.get(reverse('home'))
+        cache.clear()
+
+        self.criar_dados(8)
+        cache.clear()
+        with CaptureQueriesContext(connection) as muitos:
+            self.client.get(reverse('home'))
+        self.assertEqual(len(poucos), len(muitos))
+
+    def test_segunda_visita_vem_do_cache(self):
+        self.criar_dados(3)
+        self.client.get(reverse('home'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('home'))
+        tabelas_do_dashboard = ('escola_aluno', 'escola_turma', 'escola_mensalidade')
+        self.assertFalse([q for q in queries if any(t in q['sql'] for t in tabelas_do_dashboard)])
+
+    def test_cache_invalidado_por_signals(self):
+        self.criar_dados(1)
+        self.assertEqual(self.client.get(reverse('home')).context['total_alunos'], 1)
+
+        aluno = Aluno.objects.create(nome='Novo', documento='NOVO')
+        self.assertEqual(self.client.get(reverse('home')).context['total_alunos'], 2)
+
+        Turma.objects.get().alunos.add(aluno)
+        self.assertEqual(self.client.get(reverse('home')).context['turmas_ativas'][0].total_alunos, 2)
+
+        Mensalidade.objects.filter(status='pago').delete()
+        self.assertEqual(self.client.get(reverse('home')).context['mensalidades_pagas'], 0)
+
+        gerar_mensalidades_mes(2, 2030)
+        self.assertEqual(self.client.get(reverse('home')).context['mensalidades_pendentes'], 2)
+
+
+class TotalAlunosTurmaTest(TestCase):
+    """Testes da contagem anotada de alunos por turma"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('secretaria', password='senha')
+        professor = Usuario.objects.create_user('professor', first_name='Ana', password='senha')
+        alunos = criar_alunos(3)
+        turmas = Turma.objects.bulk_create([
+            Turma(nome=f'Turma {i:03d}', ano_letivo=2025, professor_responsavel=professor)
+            for i in range(500)
+        ])
+        Turma.alunos.through.objects.bulk_create([
+            Turma.alunos.through(turma_id=turma.id, aluno_id=aluno.id)
+            for turma in turmas for aluno in alunos[:turma.id % 4]
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_lista_web_de_500_turmas_com_queries_fixas(self):
+        # sessão, usuário e a consulta anotada de turmas
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('turma_lista'))
+        self.assertContains(response, 'Turma 499')
+        totais = {t.id: t.total_alunos for t in response.context['turmas']}
+        self.assertTrue(all(total == id_ % 4 for id_, total in totais.items()))
+
+    def test_lista_api_de_500_turmas_com_queries_fixas(self):
+        # sessão, usuário, COUNT da paginação e a consulta anotada de turmas
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/turmas/')
+        self.assertEqual(response.json()['count'], 500)
+        for turma in response.json()['results']:
+            self.assertEqual(turma['total_alunos'], turma['id'] % 4)
+            self.assertEqual(turma['professor_responsavel_nome'], 'Ana')
+
+    def test_detalhe_usa_anotacao(self):
+        turma = Turma.objects.get(nome='Turma 003')
+        response = self.client.get(reverse('turma_detalhe', args=[turma.pk]))
+        self.assertEqual(response.context['turma'].total_alunos, turma.alunos.count())
+
+    def test_serializer_sem_anotacao_conta_no_banco(self):
+        from .serializers import TurmaSimpleSerializer
+
+        turma = Turma.objects.get(nome='Turma 003')
+        self.assertEqual(TurmaSimpleSerializer(turma).data['total_alunos'], turma.alunos.count())
+
+
+class ConsultasApiTest(TestCase):
+    """
+    Fixa o número de queries de cada endpoint da API.
+
+    Os números incluem as duas queries de autenticação (sessão e usuário).
+    Cada endpoint é medido com poucos e com muitos registros para garantir
+    que não há N+1.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('api', password='senha', first_name='Ana')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def popular(self, quantidade):
+        inicio = Aluno.objects.count()
+        alunos = criar_alunos(quantidade, inicio=inicio)
+        turmas = Turma.objects.bulk_create([
+            Turma(nome=f'Turma {inicio + i}', ano_letivo=2025, professor_responsavel=self.usuario)
+            for i in range(quantidade)
+        ])
+        for turma in turmas:
+            turma.alunos.add(*alunos)
+        Mensalidade.objects.bulk_create([
+            Mensalidade(aluno=aluno, valor=100, vencimento=date(2025, mes, 10), competencia=date(2025, mes, 1))
+            for aluno in alunos for mes in range(1, 4)
+        ])
+        return alunos[0], turmas[0], Mensalidade.objects.filter(aluno=alunos[0]).first()
+
+    def endpoints(self, aluno, turma, mensalidade):
+        return {
+            '/api/usuarios/': 4,
+            '/api/alunos/': 5,
+            f'/api/alunos/{aluno.pk}/': 4,
+            f'/api/alunos/{aluno.pk}/turmas/': 4,
+            f'/api/alunos/{aluno.pk}/mensalidades/': 4,
+            '/api/turmas/': 4,
+            f'/api/turmas/{turma.pk}/': 5,
+            '/api/mensalidades/': 4,
+            f'/api/mensalidades/{mensalidade.pk}/': 4,
+            '/api/mensalidades/totais/': 3,
+        }
+
+    def medir(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def test_queries_fixas_por_endpoint(self):
+        objetos = self.popular(2)
+        poucos = {url: self.medir(url) for url in self.endpoints(*objetos)}
+        self.popular(12)
+        muitos = {url: self.medir(url) for url in self.endpoints(*objetos)}
+
+        self.assertEqual(poucos, self.endpoints(*objetos))
+        self.assertEqual(muitos, self.endpoints(*objetos))
+
+    def test_marcar_como_paga_com_queries_fixas(self):
+        _, _, mensalidade = self.popular(3)
+        url = f'/api/mensalidades/{mensalidade.pk}/marcar_como_paga/'
+        # autenticação, get_object (+ turmas do aluno), UPDATE, recálculo do resumo (INSERT ... SELECT)
+        # e da célula do consolidado mensal (turma do aluno, SELECT, DELETE e INSERT)
+        with self.assertNumQueries(9):
+            response = self.client.post(url)
+        self.assertEqual(response.json()['status'], 'pago')
+        self.assertEqual(len(response.json()['aluno']['turmas']), 3)
+
+
+@override_settings(ESCOLA_API_CURSOR_PAGE_SIZE=4, ESCOLA_API_CURSOR_MAX_PAGE_SIZE=6)
+class PaginacaoCursorECamposApiTest(TestCase):
+    """Testes da paginação por cursor e do ?fields= da API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('api', password='senha')
+        cls.alunos = criar_alunos(10)
+        turma = Turma.objects.create(nome='Turma A', ano_letivo=2025)
+        turma.alunos.add(*cls.alunos)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_paginacao_numerada_continua_padrao(self):
+        dados = self.client.get('/api/alunos/').json()
+        self.assertEqual(dados['count'], 10)
+
+    def test_cursor_percorre_tudo_sem_count(self):
+        url = '/api/alunos/?paginacao=cursor'
+        vistos = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                dados = self.client.get(url).json()
+            self.assertNotIn('count', dados)
+            self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+            vistos.extend(aluno['id'] for aluno in dados['results'])
+            url = dados['next']
+        self.assertEqual(vistos, sorted(a.id for a in self.alunos))
+
+    def test_cursor_respeita_tamanho_maximo(self):
+        dados = self.client.get('/api/alunos/', {'paginacao': 'cursor', 'page_size': 100}).json()
+        self.assertEqual(len(dados['results']), 6)
+
+    def test_fields_reduz_campos_e_colunas(self):
+        with CaptureQueriesContext(connection) as queries:
+            dados = self.client.get('/api/alunos/', {'fields': 'id,nome'}).json()
+        self.assertEqual(set(dados['results'][0]), {'id', 'nome'})
+        select = [q['sql'] for q in queries if 'FROM "escola_aluno"' in q['sql'] and 'COUNT(' not in q['sql']]
+        self.assertEqual(len(select), 1)
+        self.assertNotIn('endereco', select[0])
+        # Sem turmas nos campos pedidos, o prefetch não é executado
+        self.assertFalse([q for q in queries if 'escola_turma' in q['sql']])
+
+    def test_fields_com_campo_relacionado_mantem_plano(self):
+        dados = self.client.get(f'/api/alunos/{self.alunos[0].pk}/', {'fields': 'nome,turmas'}).json()
+        self.assertEqual(dados, {'nome': self.alunos[0].nome, 'turmas': ['Turma A - 2025']})
+
+    def test_fields_com_cursor_em_mensalidades(self):
+        gerar_mensalidades_mes(1, 2025)
+        dados = self.client.get('/api/mensalidades/', {'paginacao': 'cursor', 'fields': 'id,valor'}).json()
+        self.assertEqual(len(dados['results']), 4)
+        self.assertEqual(set(dados['results'][0]), {'id', 'valor'})
+
+    def test_fields_nao_afeta_escrita(self):
+        response = self.client.post('/api/alunos/?fields=id', {'nome': 'Novo', 'documento': 'NOVO-1'})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('documento', response.json())
+
+
+@override_settings(ESCOLA_EXPORTACAO_CHUNK_SIZE=3)
+class ExportacaoTest(TestCase):
+    """Testes das exportações em streaming"""
+
+    databases = {'default', 'leitura'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('financeiro', password='senha')
+        alunos = criar_alunos(5)
+        Aluno.objects.filter(pk=alunos[4].pk).update(ativo=False)
+        gerar_mensalidades_mes(1, 2025, hoje=date(2025, 1, 1))
+        gerar_mensalidades_mes(2, 2025, hoje=date(2025, 1, 1))
+        Mensalidade.objects.filter(aluno=alunos[0]).update(status='pago')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def conteudo(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_de_mensalidades_com_filtros_da_listagem(self):
+        import csv as csv_module
+
+        params = {'status': 'pendente', 'mes_inicial': 2, 'ano_inicial': 2025, 'aluno_ativo': '1'}
+        response = self.client.get(reverse('exportar_mensalidades'), params)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        linhas = list(csv_module.reader(StringIO(self.conteudo(response))))
+
+        self.assertEqual(linhas[0][:4], ['id', 'aluno_id', 'aluno_nome', 'aluno_documento'])
+        self.assertEqual(len(linhas) - 1, 3)
+        self.assertTrue(all(linha[7] == 'pendente' and linha[5] == '2025-02-10' for linha in linhas[1:]))
+
+    def test_ndjson_de_alunos(self):
+        import json
+
+        response = self.client.get(reverse('exportar_alunos'), {'formato': 'ndjson', 'ativo': '1'})
+        registros = [json.loads(linha) for linha in self.conteudo(response).splitlines()]
+        self.assertEqual(len(registros), 4)
+        self.assertEqual(registros[0]['nome'], 'Aluno 00000')
+        self.assertEqual(registros[0]['valor_mensalidade'], '450.00')
+
+    def test_formato_invalido(self):
+        response = self.client.get(reverse('exportar_alunos'), {'formato': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_endpoint_da_api(self):
+        response = self.client.get('/api/mensalidades/exportar/', {'formato': 'ndjson', 'status': 'pago'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.conteudo(response).splitlines()), 2)
+
+    def test_exportacao_le_em_lotes(self):
+        from .exportacao import COLUNAS_MENSALIDADES, exportar, mensalidades_para_exportar
+
+        # Lida pela conexão somente leitura, com uma única consulta
+        with CaptureQueriesContext(connection) as principal, CaptureQueriesContext(connections['leitura']) as queries:
+            linhas = list(exportar(mensalidades_para_exportar({}), COLUNAS_MENSALIDADES))
+        self.assertEqual(len(linhas), 9)  # cabeçalho + 4 alunos ativos x 2 meses
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(len(principal), 0)
+
+    def test_command(self):
+        import os
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'mensalidades.csv')
+            saida = StringIO()
+            call_command('exportar', 'mensalidades', saida=caminho, status='pago', stdout=saida)
+            with open(caminho, encoding='utf-8') as arquivo:
+                self.assertEqual(len(arquivo.read().splitlines()), 3)
+        self.assertIn('2 registro(s)', saida.getvalue())
+
+        turma = Turma.objects.create(nome='1º Ano A', ano_letivo=2025)
+        turma.alunos.add(Aluno.objects.order_by('pk').first())
+        saida = StringIO()
+        call_command('exportar', 'mensalidades', turma=turma.pk, stdout=saida)
+        self.assertEqual(len(saida.getvalue().splitlines()), 3)
+
+        saida = StringIO()
+        call_command('exportar', 'alunos', formato='ndjson', ativo='0', stdout=saida)
+        self.assertEqual(len(saida.getvalue().splitlines()), 1)
+
+
+class AlteracaoStatusEmLoteTest(TestCase):
+    """Testes das transições de status em lote"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('financeiro', password='senha')
+        criar_alunos(6)
+        gerar_mensalidades_mes(3, 2025, hoje=date(2025, 1, 1))
+        cls.ids = list(Mensalidade.objects.order_by('id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_um_update_para_varias_mensalidades(self):
+        from .cobranca import alterar_status_em_lote
+
+        # SAVEPOINT, alunos e células afetados, UPDATE, recálculo dos resumos (INSERT ... SELECT),
+        # dos consolidados mensais (SELECT, DELETE e INSERT) e RELEASE
+        with self.assertNumQueries(9):
+            atualizadas = alterar_status_em_lote(self.ids[:4], 'pago', date(2025, 3, 9))
+        self.assertEqual(atualizadas, 4)
+        self.assertEqual(Mensalidade.objects.filter(status='pago', data_pagamento=date(2025, 3, 9)).count(), 4)
+
+        alterar_status_em_lote(self.ids[:2], 'pendente')
+        self.assertEqual(Mensalidade.objects.filter(data_pagamento__isnull=True).count(), 4)
+
+    def test_endpoint_da_api(self):
+        response = self.client.post('/api/mensalidades/alterar_status/',
+                                    {'ids': self.ids[:3], 'status': 'pago'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['atualizadas'], 3)
+
+        response = self.client.post('/api/mensalidades/alterar_status/',
+                                    {'ids': self.ids, 'status': 'quitado'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_acao_em_lote_da_listagem_mantem_filtros(self):
+        url = reverse('mensalidade_lista') + '?status=pendente'
+        response = self.client.post(url, {'mensalidade_id': self.ids[:5], 'status': 'atrasado'})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertEqual(Mensalidade.objects.filter(status='atrasado').count(), 5)
+
+    def test_acao_em_lote_avisa_ids_nao_encontrados(self):
+        from django.contrib.messages import get_messages
+
+        url = reverse('mensalidade_lista')
+        casos = [
+            ({'mensalidade_id': [999999], 'status': 'pago'}, 'danger'),
+            ({'mensalidade_id': ['abc'], 'status': 'pago'}, 'danger'),
+            ({'mensalidade_id': [self.ids[0], 999999, 'abc'], 'status': 'pago'}, 'warning'),
+            ({'mensalidade_id': [self.ids[0]], 'status': 'pago'}, 'success'),
+        ]
+        for dados, nivel in casos:
+            with self.subTest(dados=dados):
+                response = self.client.post(url, dados, follow=True)
+                self.assertEqual([m.level_tag for m in get_messages(response.wsgi_request)], [nivel])
+        self.assertEqual(Mensalidade.objects.filter(status='pago').count(), 1)
+
+    def test_marcar_atrasadas(self):
+        from .cobranca import marcar_atrasadas
+
+        Mensalidade.objects.filter(pk=self.ids[0]).update(status='pago')
+        self.assertEqual(marcar_atrasadas(hoje=date(2025, 3, 10)), 0)
+        with self.assertNumQueries(5):
+            self.assertEqual(marcar_atrasadas(hoje=date(2025, 3, 11)), 5)
+        self.assertEqual(marcar_atrasadas(hoje=date(2025, 3, 11)), 0)
+        self.assertEqual(Mensalidade.objects.get(pk=self.ids[0]).status, 'pago')
+
+    def test_command_marcar_atrasadas(self):
+        saida = StringIO()
+        call_command('marcar_atrasadas', data='2025-04-01', stdout=saida)
+        self.assertIn('6 mensalidade(s)', saida.getvalue())
+
+
+class ConciliacaoBancariaTest(TestCase):
+    """Testes da conciliação do arquivo de retorno bancário"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('tesouraria', password='senha')
+        criar_alunos(5)
+        gerar_mensalidades_mes(3, 2025, hoje=date(2025, 1, 1))
+        cls.mensalidades = list(Mensalidade.objects.select_related('aluno').order_by('id'))
+
+    def conciliar(self, conteudo, **kwargs):
+        from .conciliacao import conciliar
+
+        divergencias = []
+        resultado = conciliar(StringIO(conteudo), registrar_divergencia=divergencias.append, **kwargs)
+        return resultado, divergencias
+
+    def test_csv_por_id_e_por_documento(self):
+        primeira, segunda = self.mensalidades[:2]
+        conteudo = (
+            'mensalidade_id;documento;competencia;valor;data_pagamento\n'
+            f'{primeira.pk};;;{primeira.valor};05/03/2025\n'
+            f';{segunda.aluno.documento};03/2025;{segunda.valor};2025-03-06\n'
+        )
+        resultado, divergencias = self.conciliar(conteudo)
+        self.assertEqual((resultado.conciliadas, divergencias), (2, []))
+        self.assertEqual(resultado.valor_conciliado, primeira.valor + segunda.valor)
+        primeira.refresh_from_db()
+        segunda.refresh_from_db()
+        self.assertEqual((primeira.status, primeira.data_pagamento), ('pago', date(2025, 3, 5)))
+        self.assertEqual((segunda.status, segunda.data_pagamento), ('pago', date(2025, 3, 6)))
+
+    def test_lote_lido_com_trava_na_transacao_da_gravacao(self):
+        from unittest import mock
+        from django.db.models import QuerySet
+        from . import conciliacao
+
+        indexar = conciliacao._indexar_lote
+        transacoes = []
+
+        def espiao(pagamentos, travar=False):
+            transacoes.append(len(connection.savepoint_ids))
+            return indexar(pagamentos, travar)
+
+        mensalidade = self.mensalidades[0]
+        conteudo = f'mensalidade_id;valor;data_pagamento\n{mensalidade.pk};{mensalidade.valor};05/03/2025\n'
+        base = len(connection.savepoint_ids)
+        with mock.patch.object(conciliacao, '_indexar_lote', espiao), \
+                mock.patch.object(QuerySet, 'select_for_update', autospec=True,
+                                  side_effect=QuerySet.select_for_update) as travar:
+            self.conciliar(conteudo, simular=True)
+            travar.assert_not_called()
+            resultado, _ = self.conciliar(conteudo)
+        travar.assert_called_once()
+        self.assertEqual(transacoes, [base, base + 1])
+        self.assertEqual(resultado.conciliadas, 1)
+
+    def test_layout_posicional(self):
+        mensalidade = self.mensalidades[0]
+        centavos = int(mensalidade.valor * 100)
+        conteudo = (
+            '0BANCO EXEMPLO\n'
+            f'1{0:010d}{mensalidade.aluno.documento:<20}032025{"10032025"}{centavos:013d}\n'
+            '9TRAILER\n'
+        )
+        resultado, divergencias = self.conciliar(conteudo)
+        self.assertEqual((resultado.linhas_lidas, resultado.conciliadas, divergencias), (1, 1, []))
+        mensalidade.refresh_from_db()
+        self.assertEqual(mensalidade.data_pagamento, date(2025, 3, 10))
+
+    def test_divergencias(self):
+        paga, menor, repetida = self.mensalidades[:3]
+        Mensalidade.objects.filter(pk=paga.pk).update(status='pago', data_pagamento=date(2025, 3, 1))
+        conteudo = (
+            'mensalidade_id,valor,data_pagamento\n'
+            f'{paga.pk},{paga.valor},05/03/2025\n'
+            f'{menor.pk},1.00,05/03/2025\n'
+            f'{repetida.pk},{repetida.valor},05/03/2025\n'
+            f'{repetida.pk},{repetida.valor},06/03/2025\n'
+            '999999,10.00,05/03/2025\n'
+            'abc,10.00,31/02/2025\n'
+        )
+        resultado, divergencias = self.conciliar(conteudo)
+        self.assertEqual(resultado.conciliadas, 1)
+        self.assertEqual(
+            [(d.linha, d.motivo) for d in divergencias],
+            [(2, 'ja_paga'), (3, 'valor_divergente'), (5, 'duplicada_no_arquivo'),
+             (6, 'nao_encontrada'), (7, 'linha_invalida')],
+        )
+        self.assertEqual(resultado.total_divergencias, 5)
+
+    def test_simulacao_nao_grava(self):
+        mensalidade = self.mensalidades[0]
+        resultado, _ = self.conciliar(
+            f'mensalidade_id,valor,data_pagamento\n{mensalidade.pk},{mensalidade.valor},05/03/2025\n',
+            simular=True,
+        )
+        self.assertEqual(resultado.conciliadas, 1)
+        self.assertFalse(Mensalidade.objects.filter(status='pago').exists())
+
+    def test_consultas_por_lote(self):
+        linhas = ['mensalidade_id,valor,data_pagamento']
+        linhas += [f'{m.pk},{m.valor},05/03/2025' for m in self.mensalidades]
+        conteudo = '\n'.join(linhas) + '\n'
+
+        # Em simulação cada lote custa só a consulta do índice em memória
+        with CaptureQueriesContext(connection) as um_lote:
+            self.conciliar(conteudo, chunk_size=10, simular=True)
+        with CaptureQueriesContext(connection) as cinco_lotes:
+            self.conciliar(conteudo, chunk_size=1, simular=True)
+        self.assertEqual(len(um_lote), 1)
+        self.assertEqual(len(cinco_lotes), 5)
+
+    def test_command_com_relatorio(self):
+        import os
+        import tempfile
+
+        mensalidade = self.mensalidades[0]
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivo = os.path.join(pasta, 'retorno.csv')
+            relatorio = os.path.join(pasta, 'divergencias.csv')
+            with open(arquivo, 'w', encoding='utf-8') as f:
+                f.write('mensalidade_id,valor,data_pagamento\n')
+                f.write(f'{mensalidade.pk},{mensalidade.valor},05/03/2025\n')
+                f.write('999999,10.00,05/03/2025\n')
+
+            call_command('conciliar_pagamentos', arquivo, relatorio=relatorio, stderr=StringIO())
+            with open(relatorio, encoding='utf-8') as f:
+                conteudo = f.read()
+
+        self.assertIn('nao_encontrada', conteudo)
+        self.assertEqual(Mensalidade.objects.filter(status='pago').count(), 1)
+
+    def test_upload_pela_view(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        mensalidade = self.mensalidades[0]
+        arquivo = SimpleUploadedFile(
+            'retorno.csv',
+            f'mensalidade_id,valor,data_pagamento\n{mensalidade.pk},{mensalidade.valor},05/03/2025\n'.encode(),
+        )
+        self.client.force_login(self.usuario)
+        response = self.client.post(reverse('conciliacao_bancaria'), {'arquivo': arquivo, 'formato': 'auto'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['resultado'].conciliadas, 1)
+        mensalidade.refresh_from_db()
+        self.assertEqual(mensalidade.status, 'pago')
+
+
+class ImportacaoAlunosTest(TestCase):
+    """Testes da importação de alunos em lote"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_superuser('admin', password='senha')
+        cls.turma_a = Turma.objects.create(nome='1º Ano A', ano_letivo=2025)
+        cls.turma_b = Turma.objects.create(nome='1º Ano B', ano_letivo=2025)
+        criar_alunos(1)
+
+    def importar(self, conteudo, **kwargs):
+        from .importacao import importar_alunos
+
+        erros = []
+        resultado = importar_alunos(StringIO(conteudo), formato='csv', registrar_erro=erros.append, **kwargs)
+        return resultado, erros
+
+    def test_importa_alunos_e_matriculas(self):
+        conteudo = (
+            'nome;documento;data_nascimento;valor_mensalidade;ativo;turmas\n'
+            f'Ana;111;10/05/2015;500,00;sim;{self.turma_a.pk}\n'
+            f'Bruno;222;2016-01-02;;não;1º Ano B/2025|{self.turma_a.pk}\n'
+        )
+        resultado, erros = self.importar(conteudo)
+        self.assertEqual((resultado.criados, resultado.matriculas, erros), (2, 3, []))
+
+        ana = Aluno.objects.get(documento='111')
+        self.assertEqual((ana.valor_mensalidade, ana.data_nascimento, ana.ativo),
+                         (Decimal('500.00'), date(2015, 5, 10), True))
+        bruno = Aluno.objects.get(documento='222')
+        self.assertFalse(bruno.ativo)
+        self.assertEqual(set(bruno.turmas.all()), {self.turma_a, self.turma_b})
+
+    def test_erros_por_linha_nao_interrompem(self):
+        conteudo = (
+            'nome,documento,email,turmas\n'
+            'Existente,DOC-00000,,\n'
+            'Carla,333,,\n'
+            'Carla Repetida,333,,\n'
+            'Davi,444,email-invalido,\n'
+            ',555,,\n'
+            'Eva,666,,999\n'
+            'Fábio,777,,\n'
+        )
+        resultado, erros = self.importar(conteudo)
+        self.assertEqual(resultado.criados, 2)
+        self.assertEqual([erro.linha for erro in erros], [2, 4, 5, 6, 7])
+        self.assertIn('já cadastrado', erros[0].mensagem)
+        self.assertIn('repetido', erros[1].mensagem)
+        self.assertIn('email', erros[2].mensagem)
+        self.assertIn('turma não encontrada', erros[4].mensagem)
+        self.assertEqual(Aluno.objects.filter(documento__in=['333', '777']).count(), 2)
+
+    def test_consultas_constantes_por_lote(self):
+        def planilha(inicio, quantidade):
+            linhas = ['nome,documento,turmas']
+            linhas += [f'Aluno {i},IMP-{i},{self.turma_a.pk}' for i in range(inicio, inicio + quantidade)]
+            return '\n'.join(linhas) + '\n'
+
+        with CaptureQueriesContext(connection) as poucos:
+            self.importar(planilha(0, 5), chunk_size=500)
+        with CaptureQueriesContext(connection) as muitos:
+            self.importar(planilha(100, 50), chunk_size=500)
+        self.assertEqual(len(poucos), len(muitos))
+        self.assertEqual(Turma.alunos.through.objects.filter(turma=self.turma_a).count(), 55)
+
+    def test_simulacao_nao_grava(self):
+        resultado, _ = self.importar('nome,documento\nGabi,888\n', simular=True)
+        self.assertEqual(resultado.criados, 1)
+        self.assertFalse(Aluno.objects.filter(documento='888').exists())
+
+    def test_xlsx_e_command(self):
+        import os
+        import tempfile
+        from openpyxl import Workbook
+
+        planilha = Workbook()
+        aba = planilha.active
+        aba.append(['Nome', 'Documento', 'Data_Nascimento', 'Turmas'])
+        aba.append(['Helena', 12345678900, date(2014, 3, 1), self.turma_b.pk])
+        aba.append(['Sem documento', None, None, None])
+
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivo = os.path.join(pasta, 'alunos.xlsx')
+            relatorio = os.path.join(pasta, 'erros.csv')
+            planilha.save(arquivo)
+            call_command('importar_alunos', arquivo, relatorio=relatorio, stderr=StringIO())
+            with open(relatorio, encoding='utf-8') as f:
+                self.assertEqual(len(f.read().splitlines()), 2)
+
+        helena = Aluno.objects.get(documento='12345678900')
+        self.assertEqual(helena.data_nascimento, date(2014, 3, 1))
+        self.assertEqual(list(helena.turmas.all()), [self.turma_b])
+
+    def test_importacao_pelo_admin(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        self.client.force_login(self.admin)
+        url = reverse('admin:escola_aluno_importar')
+        self.assertContains(self.client.get(reverse('admin:escola_aluno_changelist')), url)
+
+        arquivo = SimpleUploadedFile('alunos.csv', 'nome,documento\nIgor,999\n'.encode())
+        response = self.client.post(url, {'arquivo': arquivo, 'formato': 'auto'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['resultado'].criados, 1)
+        self.assertTrue(Aluno.objects.filter(documento='999').exists())
+
+
+class BuscaAlunosTest(TestCase):
+    """Testes da busca indexada de alunos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_superuser('secretaria', password='senha')
+        cls.joao = Aluno.objects.create(nome='João Conceição', documento='123.456', nome_mae='Márcia Souza')
+        cls.maria = Aluno.objects.create(nome='Maria Souza', documento='789', nome_pai='João Souza')
+        cls.ana = Aluno.objects.create(nome='Ana Paula', documento='JOAO-1')
+
+    def buscar(self, query):
+        from .busca import ORDENACAO_RELEVANCIA, buscar_alunos
+        return list(buscar_alunos(Aluno.objects.all(), query).order_by(*ORDENACAO_RELEVANCIA))
+
+    def test_texto_de_busca_normalizado(self):
+        self.assertEqual(self.joao.busca, 'joao conceicao 123.456 marcia souza')
+
+    def test_ignora_acentos_e_maiusculas_e_exige_todos_os_termos(self):
+        self.assertEqual(self.buscar('CONCEIÇÃO'), [self.joao])
+        self.assertEqual(self.buscar('souza marcia'), [self.joao])
+        self.assertEqual(self.buscar('so'), [self.joao, self.maria])
+        self.assertEqual(self.buscar('inexistente'), [])
+
+    def test_ordena_por_relevancia(self):
+        # Documento exato, depois nome iniciando com a busca, depois outras palavras
+        self.assertEqual(self.buscar('joao'), [self.joao, self.ana, self.maria])
+        self.assertEqual(self.buscar('joao-1')[0], self.ana)
+
+    def test_indice_acompanha_alteracoes(self):
+        from .busca import fts_disponivel
+
+        self.joao.nome = 'Pedro Conceição'
+        self.joao.save(update_fields=['nome'])
+        self.assertEqual(self.buscar('pedro'), [self.joao])
+        self.maria.delete()
+        self.assertEqual(self.buscar('maria'), [])
+        if connection.vendor == 'sqlite':
+            self.assertTrue(fts_disponivel())
+
+    def test_post_migrate_recria_triggers(self):
+        from .busca import TRIGGERS_FTS, reinstalar_indice_busca
+
+        if connection.vendor != 'sqlite':
+            self.skipTest('Triggers do FTS5 só existem no SQLite')
+        with connection.cursor() as cursor:
+            for trigger in TRIGGERS_FTS:
+                cursor.execute(f'DROP TRIGGER {trigger}')
+        reinstalar_indice_busca(sender=None, using='default')
+        Aluno.objects.create(nome='Zuleica Nova', documento='555')
+        self.assertEqual([aluno.nome for aluno in self.buscar('zuleica')], ['Zuleica Nova'])
+
+    def test_listagem_api_e_admin_usam_a_busca(self):
+        self.client.force_login(self.usuario)
+
+        response = self.client.get(reverse('aluno_lista'), {'q': 'joão', 'por_pagina': 1})
+        self.assertEqual(list(response.context['alunos']), [self.joao])
+        response = self.client.get(reverse('aluno_lista') + response.context['pagina'].url_proxima)
+        self.assertEqual(list(response.context['alunos']), [self.ana])
+
+        response = self.client.get('/api/alunos/', {'search': 'joao'})
+        self.assertEqual([aluno['id'] for aluno in response.json()['results']],
+                         [self.joao.pk, self.ana.pk, self.maria.pk])
+
+        response = self.client.get(reverse('admin:escola_aluno_changelist'), {'q': 'conceicao'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.joao])
+
+
+class AutocompletarTest(TestCase):
+    """Testes do índice de prefixos do autocompletar"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('atendimento', password='senha')
+        cls.maria = Aluno.objects.create(nome='Maria Conceição', documento='123.456-7')
+        cls.mario = Aluno.objects.create(nome='Mário Souza', documento='999', ativo=False)
+        cls.ana = Aluno.objects.create(nome='Ana Maria Lima', documento='555')
+        cls.turma = Turma.objects.create(nome='3º Ano B', ano_letivo=2025)
+
+    def setUp(self):
+        descartar_autocompletar()
+        self.client.force_login(self.usuario)
+
+    def sugestoes(self, query, tipo='aluno', **kwargs):
+        from .autocompletar import autocompletar
+        return [item['id'] for item in autocompletar.sugestoes(tipo, query, **kwargs)]
+
+    def test_prefixo_do_nome_vem_antes_das_outras_palavras(self):
+        self.assertEqual(self.sugestoes('mar'), [self.maria.pk, self.mario.pk, self.ana.pk])
+        self.assertEqual(self.sugestoes('MARIA'), [self.maria.pk, self.ana.pk])
+        self.assertEqual(self.sugestoes('maria li'), [self.ana.pk])
+        self.assertEqual(self.sugestoes('mar', limite=1), [self.maria.pk])
+        self.assertEqual(self.sugestoes('mar', somente_ativos=True), [self.maria.pk, self.ana.pk])
+
+    def test_documento_com_e_sem_pontuacao(self):
+        self.assertEqual(self.sugestoes('123.4'), [self.maria.pk])
+        self.assertEqual(self.sugestoes('1234567'), [self.maria.pk])
+
+    def test_nao_consulta_o_banco_depois_de_montado(self):
+        self.sugestoes('a')
+        with self.assertNumQueries(0):
+            self.sugestoes('ana')
+            self.sugestoes('3', tipo='turma')
+
+    def test_signals_atualizam_o_indice(self):
+        self.sugestoes('a')
+        with self.captureOnCommitCallbacks(execute=True):
+            novo = Aluno.objects.create(nome='Marcelo Dias', documento='777')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.maria.nome = 'Joana Conceição'
+            self.maria.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.sugestoes('marc'), [novo.pk])
+            self.assertEqual(self.sugestoes('jo'), [self.maria.pk])
+            self.assertNotIn(self.maria.pk, self.sugestoes('maria'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            novo.delete()
+        self.assertEqual(self.sugestoes('marc'), [])
+
+    def test_versao_alterada_por_outro_processo_remonta_em_segundo_plano(self):
+        from unittest import mock
+        from .autocompletar import CHAVE_VERSAO, autocompletar
+
+        self.sugestoes('a')
+        Aluno.objects.filter(pk=self.ana.pk).update(nome='Beatriz Lima')
+        cache.incr(CHAVE_VERSAO)
+        # A requisição responde com o índice antigo e não monta o novo
+        with mock.patch.object(autocompletar, 'aquecer') as aquecer, self.assertNumQueries(0):
+            self.assertEqual(self.sugestoes('ana'), [self.ana.pk])
+        aquecer.assert_called_once()
+        autocompletar._montar(cache.get(CHAVE_VERSAO))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.sugestoes('beat'), [self.ana.pk])
+
+    def test_indice_antigo_responde_durante_a_montagem(self):
+        from unittest import mock
+        from .autocompletar import autocompletar
+
+        self.sugestoes('a')
+        Aluno.objects.filter(pk=self.ana.pk).update(nome='Beatriz Lima')
+        autocompletar.invalidar()
+        # Outra thread está montando o índice novo: a busca não espera por ela
+        # nem dispara outra montagem
+        with autocompletar.lock_montagem, self.assertNumQueries(0):
+            with mock.patch('escola.autocompletar.threading.Thread') as thread:
+                self.assertEqual(self.sugestoes('ana'), [self.ana.pk])
+            thread.assert_not_called()
+
+    def test_alteracao_durante_a_montagem_entra_no_indice_novo(self):
+        from unittest import mock
+        from .autocompletar import IndicePrefixos, autocompletar
+
+        self.sugestoes('a')
+        descartar_autocompletar()
+        carregar = IndicePrefixos.carregar
+        registro = (9999, {'id': 9999}, True, 'Marcelo Dias', ())
+
+        def com_alteracao(indice, registros):
+            carregar(indice, registros)
+            if not autocompletar.pendentes:
+                autocompletar.aplicar(lambda indices: indices['aluno'].adicionar(*registro))
+
+        with mock.patch.object(IndicePrefixos, 'carregar', com_alteracao):
+            self.sugestoes('a')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.sugestoes('marc'), [9999])
+
+    def test_ttl_sem_cache_compartilhado(self):
+        from unittest import mock
+        from .autocompletar import autocompletar
+
+        self.sugestoes('a')
+        autocompletar.montado_em -= 600
+        with override_settings(ESCOLA_AUTOCOMPLETAR_TTL=300), mock.patch.object(autocompletar, 'aquecer') as aquecer:
+            self.assertEqual(self.sugestoes('ana'), [self.ana.pk])
+            aquecer.assert_called_once()
+            with mock.patch('escola.autocompletar.cache_compartilhado', return_value=True):
+                self.sugestoes('ana')
+            aquecer.assert_called_once()
+
+    def test_endpoint(self):
+        response = self.client.get(reverse('autocompletar'), {'q': '3º', 'tipo': 'turma'})
+        self.assertEqual(response.json()['resultados'][0]['rotulo'], '3º Ano B - 2025')
+
+        response = self.client.get(reverse('autocompletar'), {'q': 'ana'})
+        self.assertEqual(response.json()['resultados'][0]['documento'], '555')
+
+        response = self.client.get(reverse('autocompletar'), {'q': 'ana', 'tipo': 'professor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ResumoFinanceiroAlunoTest(TestCase):
+    """Testes do resumo financeiro desnormalizado por aluno"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('financeiro', password='senha')
+        cls.alunos = criar_alunos(3, valor_mensalidade=Decimal('150.00'))
+        for mes in (1, 2, 3):
+            gerar_mensalidades_mes(mes, 2025, hoje=date(2025, 1, 1))
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def assertResumoConfere(self, aluno, hoje):
+        resumo = ResumoFinanceiroAluno.objects.get(aluno=aluno)
+        totais = aluno.mensalidades.totais()
+        for campo in ('quantidade_pago', 'quantidade_pendente', 'quantidade_atrasado', 'quantidade_total',
+                      'total_pago', 'total_pendente', 'total_atrasado', 'total_geral'):
+            self.assertEqual(getattr(resumo, campo), totais[campo], campo)
+        self.assertEqual(resumo.sequencia_em_dia, aluno.mensalidades.sequencia_em_dia(hoje=hoje))
+        return resumo
+
+    def test_geracao_cria_os_resumos(self):
+        for aluno in self.alunos:
+            resumo = self.assertResumoConfere(aluno, date(2025, 1, 1))
+            self.assertEqual(resumo.quantidade_pendente, 3)
+            self.assertEqual(resumo.total_pendente, Decimal('450.00'))
+
+    def test_signals_de_save_e_delete(self):
+        aluno = self.alunos[0]
+        mensalidade = aluno.mensalidades.get(vencimento=date(2025, 1, 10))
+        mensalidade.status = 'pago'
+        mensalidade.data_pagamento = date(2025, 1, 8)
+        mensalidade.save()
+        resumo = self.assertResumoConfere(aluno, timezone.localdate())
+        self.assertEqual(resumo.ultimo_pagamento, date(2025, 1, 8))
+        self.assertEqual(resumo.quantidade_pago, 1)
+
+        mensalidade.delete()
+        resumo = self.assertResumoConfere(aluno, timezone.localdate())
+        self.assertIsNone(resumo.ultimo_pagamento)
+
+    def test_operacoes_em_lote(self):
+        from .cobranca import alterar_status_em_lote, marcar_atrasadas
+
+        ids = self.alunos[1].mensalidades.values_list('id', flat=True)
+        alterar_status_em_lote(list(ids)[:2], 'pago', date(2025, 2, 1))
+        marcar_atrasadas(hoje=date(2025, 3, 20))
+        for aluno in self.alunos:
+            self.assertResumoConfere(aluno, date(2025, 3, 20))
+        self.assertEqual(ResumoFinanceiroAluno.objects.get(aluno=self.alunos[1]).quantidade_atrasado, 1)
+
+    def test_recalculo_em_blocos(self):
+        ResumoFinanceiroAluno.objects.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(recalcular_resumos(hoje=date(2025, 1, 1), chunk_size=2), 3)
+        # Cada bloco é um único INSERT ... SELECT, que calcula e grava os resumos
+        gravacoes = [q for q in queries if 'escola_resumofinanceiroaluno' in q['sql']]
+        self.assertEqual(len(gravacoes), 2)
+        self.assertTrue(all(q['sql'].startswith('INSERT') and 'GROUP BY' in q['sql'] for q in gravacoes))
+        self.assertEqual(ResumoFinanceiroAluno.objects.count(), 3)
+        for aluno in self.alunos:
+            self.assertResumoConfere(aluno, date(2025, 1, 1))
+
+    def test_recalculo_atualiza_resumos_existentes(self):
+        aluno = self.alunos[0]
+        Mensalidade.objects.filter(aluno=aluno).update(status='pago', data_pagamento=date(2025, 1, 5))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(recalcular_resumos([aluno.pk], hoje=date(2025, 4, 1)), 1)
+        self.assertEqual(len(queries), 1)
+        resumo = self.assertResumoConfere(aluno, date(2025, 4, 1))
+        self.assertEqual((resumo.quantidade_pago, resumo.total_pago), (3, Decimal('450.00')))
+        self.assertEqual(resumo.calculado_em, date(2025, 4, 1))
+
+    def test_command(self):
+        Mensalidade.objects.filter(aluno=self.alunos[2]).update(status='pago', data_pagamento=date(2025, 1, 1))
+        saida = StringIO()
+        call_command('recalcular_resumos', self.alunos[2].pk, data='2025-04-01', stdout=saida)
+        self.assertIn('1 resumo(s)', saida.getvalue())
+        resumo = self.assertResumoConfere(self.alunos[2], date(2025, 4, 1))
+        self.assertEqual(resumo.sequencia_em_dia, 3)
+
+        call_command('recalcular_resumos', stdout=saida)
+        self.assertIn('3 resumo(s)', saida.getvalue())
+
+    def test_historico_le_o_resumo(self):
+        url = reverse('historico_pagamentos', args=[self.alunos[0].pk])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['total_pendentes'], 3)
+        self.assertEqual(response.context['valor_total'], Decimal('450.00'))
+        self.assertFalse(any('GROUP BY' in q['sql'] for q in queries))
+
+    def test_leitura_nao_grava(self):
+        aluno = self.alunos[0]
+        ResumoFinanceiroAluno.objects.update(calculado_em=date(2025, 1, 1))
+        sem_mensalidades = criar_alunos(1, inicio=10)[0]
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('aluno_detalhe', args=[aluno.pk]))
+            response = self.client.get(reverse('historico_pagamentos', args=[aluno.pk]))
+            vazio = self.client.get(reverse('historico_pagamentos', args=[sem_mensalidades.pk]))
+        self.assertFalse(any('escola_resumofinanceiroaluno' in q['sql'] and not q['sql'].startswith('SELECT')
+                             for q in queries))
+        self.assertEqual(response.context['total_pendentes'], 3)
+        self.assertEqual(vazio.context['total_mensalidades'], 0)
+        self.assertFalse(ResumoFinanceiroAluno.objects.exclude(calculado_em=date(2025, 1, 1)).exists())
+
+    def test_campo_na_api(self):
+        response = self.client.get(f'/api/alunos/{self.alunos[0].pk}/')
+        self.assertEqual(response.json()['resumo_financeiro']['quantidade_total'], 3)
+        self.assertEqual(Decimal(response.json()['resumo_financeiro']['total_geral']), Decimal('450.00'))
+
+    def test_exclusao_do_aluno(self):
+        aluno = self.alunos[0]
+        aluno.delete()
+        self.assertFalse(ResumoFinanceiroAluno.objects.filter(aluno_id=aluno.pk).exists())
+        self.assertEqual(ResumoFinanceiroAluno.objects.count(), 2)
+
+
+class RelatorioFinanceiroTest(TestCase):
+    """Testes da consolidação mensal e do relatório de faturamento e inadimplência"""
+
+    databases = {'default', 'leitura'}
+
+    @classmethod
+    def setUpTestData(cls):
+        from .relatorios import consolidar
+
+        cls.usuario = Usuario.objects.create_user('diretoria', password='senha')
+        cls.manha = Turma.objects.create(nome='1º Ano A', ano_letivo=2025, periodo='matutino')
+        cls.tarde = Turma.objects.create(nome='1º Ano B', ano_letivo=2025, periodo='vespertino')
+        cls.antiga = Turma.objects.create(nome='Pré', ano_letivo=2024, periodo='matutino')
+        cls.ana, cls.bruno, cls.carla = criar_alunos(3, valor_mensalidade=Decimal('100.00'))
+        cls.manha.alunos.add(cls.ana)
+        cls.antiga.alunos.add(cls.ana)
+        cls.tarde.alunos.add(cls.bruno)
+        for mes in (1, 2, 3):
+            gerar_mensalidades_mes(mes, 2025, hoje=date(2025, 1, 1))
+        consolidar(tudo=True)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def consolidados(self):
+        return {
+            (c.competencia, c.turma_id): (c.quantidade_mensalidades, c.quantidade_pagas, c.valor_recebido,
+                                          c.valor_em_aberto, c.valor_atraso_mais_90)
+            for c in ConsolidadoMensal.objects.all()
+        }
+
+    def assertConfereComReconstrucao(self):
+        from .relatorios import consolidar
+
+        incremental = self.consolidados()
+        consolidar(tudo=True)
+        self.assertEqual(incremental, self.consolidados())
+
+    def test_atribuicao_pela_turma_do_ano(self):
+        celulas = self.consolidados()
+        self.assertEqual(
+            {turma for _, turma in celulas},
+            {self.manha.pk, self.tarde.pk, None},
+        )
+        self.assertEqual(celulas[(date(2025, 1, 1), self.manha.pk)][0], 1)
+        self.assertEqual(celulas[(date(2025, 1, 1), None)][0], 1)
+
+    def test_faixas_de_atraso_e_taxa(self):
+        from .relatorios import atualizar_desatualizados, relatorio_mensal
+
+        Mensalidade.objects.filter(aluno=self.bruno, vencimento=date(2025, 2, 10)).update(status='pago')
+        atualizar_desatualizados(date(2025, 4, 15))
+        linhas = relatorio_mensal(2025, agrupar='periodo')
+        linha = {(l['competencia'].month, l['grupo']): l for l in linhas}
+
+        self.assertEqual(linha[(1, 'Matutino')]['valor_atraso_mais_90'], Decimal('100.00'))
+        self.assertEqual(linha[(3, 'Sem turma')]['valor_atraso_60'], Decimal('100.00'))
+        self.assertEqual(linha[(3, 'Sem turma')]['taxa_inadimplencia'], Decimal('100.00'))
+        self.assertEqual(linha[(1, 'Matutino')]['quantidade_em_atraso'], 1)
+        # O update() não passa pelos signals, mas o mês tinha valores em aberto
+        # calculados em outro dia e foi recalculado por atualizar_desatualizados
+        self.assertEqual(linha[(2, 'Vespertino')]['valor_recebido'], Decimal('100.00'))
+        self.assertEqual(linha[(2, 'Vespertino')]['valor_atraso_90'], Decimal('0.00'))
+
+    def test_signals_mantem_a_consolidacao(self):
+        mensalidade = Mensalidade.objects.get(aluno=self.ana, vencimento=date(2025, 1, 10))
+        mensalidade.status = 'pago'
+        mensalidade.save()
+        self.assertEqual(self.consolidados()[(date(2025, 1, 1), self.manha.pk)][1], 1)
+        self.assertConfereComReconstrucao()
+
+        mensalidade.vencimento = date(2025, 4, 10)
+        mensalidade.save()
+        self.assertConfereComReconstrucao()
+
+        self.tarde.alunos.add(self.carla)
+        self.assertEqual(self.consolidados()[(date(2025, 2, 1), self.tarde.pk)][0], 2)
+        self.assertConfereComReconstrucao()
+
+        self.carla.turmas.remove(self.tarde)
+        self.assertConfereComReconstrucao()
+
+        self.manha.ano_letivo = 2026
+        self.manha.save()
+        self.assertConfereComReconstrucao()
+
+        self.tarde.delete()
+        self.assertConfereComReconstrucao()
+
+        self.carla.delete()
+        # Ana (turma mudou para 2026) e Bruno (turma excluída) ficaram sem turma em 2025
+        self.assertEqual(self.consolidados()[(date(2025, 3, 1), None)][0], 2)
+        self.assertConfereComReconstrucao()
+
+    def test_aluno_em_duas_turmas_no_ano(self):
+        from django.core.exceptions import ValidationError
+
+        # A matrícula em outra turma mantém a turma já atribuída, que continua válida
+        self.manha.alunos.add(self.bruno)
+        mensalidades = Mensalidade.objects.filter(aluno=self.bruno)
+        self.assertEqual(set(mensalidades.values_list('turma', flat=True)), {self.tarde.pk})
+
+        # Com duas turmas no ano, a mensalidade nova não vai para nenhuma delas pelo id
+        gerar_mensalidades_mes(4, 2025, hoje=date(2025, 1, 1))
+        abril = mensalidades.get(competencia=date(2025, 4, 1))
+        self.assertIsNone(abril.turma_id)
+        self.assertEqual(self.consolidados()[(date(2025, 4, 1), None)][0], 2)
+
+        outra = Turma.objects.create(nome='2º Ano A', ano_letivo=2025)
+        abril.turma = outra
+        with self.assertRaises(ValidationError):
+            abril.full_clean()
+        abril.turma = self.manha
+        abril.full_clean()
+        abril.save()
+        self.assertEqual(self.consolidados()[(date(2025, 4, 1), self.manha.pk)][0], 2)
+        self.assertConfereComReconstrucao()
+
+        # Ao sair da turma atribuída, as mensalidades vão para a turma que restou
+        self.tarde.alunos.remove(self.bruno)
+        self.assertEqual(set(mensalidades.values_list('turma', flat=True)), {self.manha.pk})
+        self.assertEqual(self.consolidados()[(date(2025, 1, 1), self.manha.pk)][0], 2)
+        self.assertNotIn((date(2025, 1, 1), self.tarde.pk), self.consolidados())
+        self.assertConfereComReconstrucao()
+
+    def test_turma_da_mensalidade_pela_api(self):
+        mensalidade = Mensalidade.objects.get(aluno=self.bruno, vencimento=date(2025, 1, 10))
+        url = f'/api/mensalidades/{mensalidade.pk}/'
+        resposta = self.client.patch(url, {'turma': self.manha.pk}, content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('turma', resposta.json())
+
+        self.manha.alunos.add(self.bruno)
+        resposta = self.client.patch(url, {'turma': self.manha.pk}, content_type='application/json')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['turma'], self.manha.pk)
+
+    def test_operacoes_em_lote(self):
+        from .cobranca import alterar_status_em_lote
+
+        ids = Mensalidade.objects.filter(vencimento=date(2025, 3, 10)).values_list('id', flat=True)
+        alterar_status_em_lote(list(ids), 'pago')
+        gerar_mensalidades_mes(4, 2025)
+        self.assertEqual(self.consolidados()[(date(2025, 3, 1), self.tarde.pk)][1], 1)
+        self.assertConfereComReconstrucao()
+
+    def test_leitura_nao_percorre_as_mensalidades(self):
+        from .relatorios import relatorio_mensal
+
+        relatorio_mensal(2025)
+        with CaptureQueriesContext(connection) as queries:
+            linhas = relatorio_mensal(2025)
+        self.assertEqual(len(linhas), 9)
+        self.assertFalse(any('escola_mensalidade' in q['sql'] for q in queries))
+
+    def test_leitura_nao_grava(self):
+        ConsolidadoMensal.objects.update(calculado_em=date(2025, 1, 1))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('relatorio_financeiro'), {'ano': 2025})
+            self.client.get('/api/relatorios/financeiro/', {'ano': 2025})
+        self.assertEqual(response.status_code, 200)
+        escritas = [q for q in queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+                    and 'escola_consolidadomensal' in q['sql']]
+        self.assertEqual(escritas, [])
+        self.assertFalse(ConsolidadoMensal.objects.exclude(calculado_em=date(2025, 1, 1)).exists())
+
+    def test_consolidacao_trava_as_competencias(self):
+        from unittest import mock
+        from .relatorios import consolidar
+
+        with mock.patch('escola.relatorios.travar') as travar:
+            consolidar(celulas={(date(2025, 3, 1), None), (date(2025, 1, 1), self.manha.pk), (date(2025, 1, 1), None)})
+        self.assertEqual(travar.call_args_list, [
+            mock.call('consolidado', compartilhado=True),
+            mock.call('consolidado', date(2025, 1, 1)),
+            mock.call('consolidado', date(2025, 3, 1)),
+        ])
+
+        with mock.patch('escola.relatorios.travar') as travar:
+            consolidar(tudo=True)
+        self.assertEqual(travar.call_args_list, [mock.call('consolidado', compartilhado=False)])
+        self.assertConfereComReconstrucao()
+
+    def test_uma_linha_sem_turma_por_competencia(self):
+        from django.db import IntegrityError, transaction
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ConsolidadoMensal.objects.create(competencia=date(2025, 1, 1), turma=None, calculado_em=date(2025, 1, 1))
+        ConsolidadoMensal.objects.create(competencia=date(2025, 1, 1), turma=self.antiga, calculado_em=date(2025, 1, 1))
+
+    def test_view_exportacao_e_api(self):
+        response = self.client.get(reverse('relatorio_financeiro'), {'ano': 2025, 'agrupar': 'ano_letivo'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total']['valor_faturado'], Decimal('900.00'))
+        self.assertEqual([l['grupo'] for l in response.context['linhas']][:2], ['Sem turma', '2025'])
+
+        response = self.client.get(reverse('exportar_relatorio_financeiro'), {'ano': 2025, 'mes': 1})
+        linhas = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(linhas[0].startswith('competencia,grupo,turma'))
+        self.assertEqual(len(linhas), 4)
+
+        response = self.client.get('/api/relatorios/financeiro/', {'ano': 2025, 'turma': self.manha.pk})
+        self.assertEqual(len(response.json()), 3)
+        self.assertEqual(response.json()[0]['grupo'], '1º Ano A - 2025')
+        self.assertEqual(response.json()[0]['valor_faturado'], '100.00')
+
+        response = self.client.get('/api/relatorios/financeiro/exportar/', {'ano': 2025, 'formato': 'ndjson'})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 9)
+
+        response = self.client.get('/api/relatorios/financeiro/', {'agrupar': 'professor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command(self):
+        ConsolidadoMensal.objects.update(calculado_em=date(2025, 1, 1))
+        saida = StringIO()
+        call_command('consolidar_relatorios', stdout=saida)
+        self.assertIn('9 linha(s)', saida.getvalue())
+        self.assertFalse(ConsolidadoMensal.objects.exclude(calculado_em=timezone.localdate()).exists())
+
+        call_command('consolidar_relatorios', tudo=True, data='2025-02-01', stdout=saida)
+        self.assertEqual(ConsolidadoMensal.objects.filter(calculado_em=date(2025, 2, 1)).count(), 9)
+
+
+class RecibosTest(TestCase):
+    """Testes da emissão de recibos individuais e em lote, com cache"""
+
+    databases = {'default', 'leitura'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('tesouraria', password='senha')
+        cls.turma = Turma.objects.create(nome='3º Ano A', ano_letivo=2025, periodo='matutino')
+        alunos = criar_alunos(4, valor_mensalidade=Decimal('150.50'), nome_pai='Responsável')
+        cls.turma.alunos.add(*alunos[:3])
+        gerar_mensalidades_mes(3, 2025, hoje=date(2025, 3, 1))
+        Mensalidade.objects.filter(aluno__in=alunos[1:]).update(status='pago', data_pagamento=date(2025, 3, 5))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def paginas(self, response):
+        return b''.join(response.streaming_content).decode().count('class="pagina-recibo"')
+
+    def test_recibo_individual_usa_cache(self):
+        from unittest import mock
+        from . import recibos
+
+        mensalidade = Mensalidade.objects.get(aluno__documento='DOC-00001')
+        url = reverse('recibo', args=[mensalidade.pk])
+        response = self.client.get(url, {'forma': 'PIX'})
+        self.assertContains(response, 'cento e cinquenta reais e cinquenta centavos')
+        self.assertContains(response, 'PIX')
+
+        with mock.patch.object(recibos, 'renderizar', wraps=recibos.renderizar) as renderizar:
+            self.client.get(url, {'forma': 'PIX'})
+            self.assertEqual(renderizar.call_count, 0)
+
+            # Qualquer dado exibido no recibo muda a chave
+            Aluno.objects.filter(pk=mensalidade.aluno_id).update(nome='Outro Nome')
+            response = self.client.get(url, {'forma': 'PIX'})
+            self.assertEqual(renderizar.call_count, 1)
+            self.assertContains(response, 'Outro Nome')
+
+    def test_lote_filtra_por_turma_e_somente_pagas(self):
+        response = self.client.get(reverse('recibos_em_lote'), {'mes_inicial': 3, 'ano_inicial': 2025,
+                                                                 'mes_final': 3, 'ano_final': 2025})
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+        self.assertEqual(self.paginas(response), 3)
+
+        response = self.client.get(reverse('recibos_em_lote'), {'turma': self.turma.pk})
+        self.assertEqual(self.paginas(response), 2)
+
+        response = self.client.get(reverse('recibos_em_lote'), {'status': 'pendente'})
+        self.assertEqual(self.paginas(response), 1)
+
+    def test_lote_reaproveita_recibos_do_cache(self):
+        from unittest import mock
+        from .recibos import documento_recibos
+        from . import recibos
+
+        pagas = Mensalidade.objects.filter(status='pago')
+        emissao = timezone.now()
+        primeiro = ''.join(documento_recibos(pagas, chunk_size=2, emitido_em=emissao))
+        with mock.patch.object(recibos, 'renderizar', wraps=recibos.renderizar) as renderizar:
+            segundo = ''.join(documento_recibos(pagas, chunk_size=2, emitido_em=emissao))
+            self.assertEqual(renderizar.call_count, 0)
+        self.assertEqual(primeiro, segundo)
+
+    @override_settings(ESCOLA_RECIBOS_WORKERS=2)
+    def test_pool_de_processos_gera_o_mesmo_documento(self):
+        from .recibos import documento_recibos, pool
+
+        self.addCleanup(pool.descartar)
+        pagas = Mensalidade.objects.filter(status='pago')
+        emissao = timezone.now()
+        em_paralelo = ''.join(documento_recibos(pagas, emitido_em=emissao))
+        cache.clear()
+        no_processo = ''.join(documento_recibos(pagas, workers=1, emitido_em=emissao))
+        self.assertEqual(em_paralelo, no_processo)
+        self.assertIsNotNone(pool.executor)
+
+    def test_command(self):
+        import os
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'recibos.html')
+            saida = StringIO()
+            call_command('emitir_recibos', caminho, mes=3, ano=2025, turma=self.turma.pk, stdout=saida)
+            self.assertIn('2 recibo(s)', saida.getvalue())
+            with open(caminho, encoding='utf-8') as arquivo:
+                self.assertEqual(arquivo.read().count('class="pagina-recibo"'), 2)
+
+
+class ExtensoTest(TestCase):
+    """Testes do valor por extenso dos recibos"""
+
+    VALORES = {
+        'zero': 0, 'um': 1, 'dois': 2, 'três': 3, 'quatro': 4, 'cinco': 5, 'seis': 6, 'sete': 7, 'oito': 8,
+        'nove': 9, 'dez': 10, 'onze': 11, 'doze': 12, 'treze': 13, 'quatorze': 14, 'quinze': 15,
+        'dezesseis': 16, 'dezessete': 17, 'dezoito': 18, 'dezenove': 19, 'vinte': 20, 'trinta': 30,
+        'quarenta': 40, 'cinquenta': 50, 'sessenta': 60, 'setenta': 70, 'oitenta': 80, 'noventa': 90,
+        'cem': 100, 'cento': 100, 'duzentos': 200, 'trezentos': 300, 'quatrocentos': 400, 'quinhentos': 500,
+        'seiscentos': 600, 'setecentos': 700, 'oitocentos': 800, 'novecentos': 900,
+    }
+    ESCALAS = {'mil': 1000, 'milhão': 10 ** 6, 'milhões': 10 ** 6, 'bilhão': 10 ** 9, 'bilhões': 10 ** 9}
+
+    def ler(self, texto):
+        """Lê de volta um inteiro escrito por extenso, conferindo os conectores"""
+        total = grupo = 0
+        anterior = None
+        for palavra in texto.split():
+            if palavra == 'e':
+                self.assertIn(anterior, ('valor', 'escala'), texto)
+                anterior = 'e'
+                continue
+            if palavra in self.ESCALAS:
+                escala = self.ESCALAS[palavra]
+                singular = palavra in ('mil', 'milhão', 'bilhão')
+                if palavra == 'mil':
+                    self.assertNotEqual(grupo, 1, texto)  # "mil", nunca "um mil"
+                    grupo = grupo or 1
+                elif palavra != 'mil':
+                    self.assertEqual(grupo == 1, singular, texto)
+                total += grupo * escala
+                grupo = 0
+                anterior = 'escala'
+                continue
+            # Dentro de um grupo, partes seguidas só com "e" entre elas
+            self.assertNotEqual(anterior, 'valor', texto)
+            grupo += self.VALORES[palavra]
+            anterior = 'valor'
+        return total + grupo
+
+    def test_tabela_de_0_a_999(self):
+        from .extenso import inteiro_por_extenso
+
+        for n in range(1000):
+            texto = inteiro_por_extenso(n)
+            self.assertEqual(self.ler(texto), n, texto)
+            self.assertEqual(texto == 'cem', n == 100)
+        self.assertEqual(inteiro_por_extenso(101), 'cento e um')
+        self.assertEqual(inteiro_por_extenso(115), 'cento e quinze')
+        self.assertEqual(inteiro_por_extenso(999), 'novecentos e noventa e nove')
+
+    def test_milhares_milhoes_e_bilhoes(self):
+        from .extenso import LIMITE, inteiro_por_extenso
+
+        numeros = [n * 1000 + m for n in range(1000) for m in (0, 1, 15, 100, 110, 999)]
+        numeros += [n * 10 ** 6 + m for n in range(1, 1000, 7) for m in (0, 1, 1000, 500000, 123456)]
+        numeros += [n * 10 ** 9 + m for n in range(1, 1000, 13) for m in (0, 5, 2 * 10 ** 6, 987654321)]
+        numeros.append(LIMITE)
+        for n in numeros:
+            texto = inteiro_por_extenso(n)
+            self.assertEqual(self.ler(texto), n, texto)
+
+        self.assertEqual(inteiro_por_extenso(1000), 'mil')
+        self.assertEqual(inteiro_por_extenso(1005), 'mil e cinco')
+        self.assertEqual(inteiro_por_extenso(1300), 'mil e trezentos')
+        self.assertEqual(inteiro_por_extenso(1310), 'mil trezentos e dez')
+        self.assertEqual(inteiro_por_extenso(2_000_001), 'dois milhões e um')
+        self.assertEqual(inteiro_por_extenso(1_500_000), 'um milhão e quinhentos mil')
+        with self.assertRaises(ValueError):
+            inteiro_por_extenso(LIMITE + 1)
+
+    def test_reais_e_centavos(self):
+        from .extenso import reais_por_extenso
+
+        for centavos in range(100):
+            texto = reais_por_extenso(Decimal(12) + Decimal(centavos) / 100)
+            if centavos:
+                reais, _, resto = texto.partition(' reais e ')
+                self.assertEqual(self.ler(resto.rsplit(' ', 1)[0]), centavos, texto)
+                self.assertEqual(resto.endswith(' centavo'), centavos == 1, texto)
+            else:
+                self.assertEqual(texto, 'doze reais')
+
+        casos = {
+            Decimal('0.29'): 'vinte e nove centavos',
+            Decimal('0.01'): 'um centavo',
+            Decimal('1.00'): 'um real',
+            Decimal('1.01'): 'um real e um centavo',
+            Decimal('0'): 'zero reais',
+            Decimal('150.50'): 'cento e cinquenta reais e cinquenta centavos',
+            Decimal('1000000'): 'um milhão de reais',
+            Decimal('3000000000'): 'três bilhões de reais',
+            Decimal('1250000'): 'um milhão duzentos e cinquenta mil reais',
+            Decimal('2.005'): 'dois reais e um centavo',
+            0.29: 'vinte e nove centavos',
+            '1.234,56': 'mil duzentos e trinta e quatro reais e cinquenta e seis centavos',
+            '-5': 'menos cinco reais',
+        }
+        for valor, esperado in casos.items():
+            self.assertEqual(reais_por_extenso(valor), esperado, valor)
+
+    def test_filtro(self):
+        from django.template import Context, Template
+
+        template = Template('{% load custom_filters %}{{ valor|extenso }}')
+        self.assertEqual(template.render(Context({'valor': Decimal('2.50')})), 'dois reais e cinquenta centavos')
+        self.assertEqual(template.render(Context({'valor': 'abc'})), 'abc')
+        self.assertEqual(template.render(Context({'valor': Decimal('1e15')})), '1E+15')
+
+
+class MiniaturasTest(TestCase):
+    """Testes das miniaturas das fotos dos alunos"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        configuracao = override_settings(MEDIA_ROOT=pasta, ESCOLA_MINIATURAS_WORKERS=0)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.usuario = Usuario.objects.create_user('secretaria', password='senha')
+        self.client.force_login(self.usuario)
+
+    def foto(self, nome='foto.jpg', largura=1200, altura=800):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+
+        conteudo = BytesIO()
+        Image.new('RGB', (largura, altura), (200, 30, 30)).save(conteudo, 'JPEG')
+        return SimpleUploadedFile(nome, conteudo.getvalue(), content_type='image/jpeg')
+
+    def test_upload_gera_miniaturas_apos_o_commit(self):
+        from unittest import mock
+        from PIL import Image
+        from .miniaturas import TAMANHOS_MINIATURA, nome_miniatura
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('aluno_criar'), {
+                'nome': 'Aluno com Foto', 'documento': 'FOTO-1', 'valor_mensalidade': '450.00',
+                'foto': self.foto(),
+            })
+
+        aluno = Aluno.objects.get(documento='FOTO-1')
+        self.assertEqual(aluno.foto_miniaturas, aluno.foto.name)
+        for tamanho in TAMANHOS_MINIATURA:
+            nome = nome_miniatura(aluno.foto.name, tamanho)
+            self.assertTrue(nome.endswith(f'.{tamanho}.webp'))
+            with aluno.foto.storage.open(nome) as arquivo, Image.open(arquivo) as imagem:
+                self.assertEqual(imagem.size, (tamanho, tamanho))
+                self.assertEqual(imagem.format, 'WEBP')
+
+        # Salvar de novo sem trocar a foto não agenda nada
+        with mock.patch('escola.miniaturas.fila.enviar') as enviar:
+            with self.captureOnCommitCallbacks(execute=True):
+                aluno.save()
+        enviar.assert_not_called()
+
+        response = self.client.get(reverse('aluno_lista'))
+        self.assertContains(response, aluno.foto.storage.url(nome_miniatura(aluno.foto.name, 128)))
+        self.assertNotContains(response, f'src="{aluno.foto.url}"')
+
+    def test_filtro_usa_a_original_enquanto_nao_ha_miniaturas(self):
+        from django.template import Context, Template
+
+        with self.captureOnCommitCallbacks(execute=False):
+            aluno = Aluno.objects.create(nome='Sem Miniatura', documento='FOTO-2', foto=self.foto())
+        template = Template('{% load custom_filters %}{{ aluno.foto|miniatura:35 }}')
+        self.assertEqual(template.render(Context({'aluno': aluno})), aluno.foto.url)
+        self.assertEqual(template.render(Context({'aluno': Aluno(nome='x')})), '')
+
+    @override_settings(ESCOLA_MINIATURAS_FORMATO='JPEG')
+    def test_comando_gera_as_fotos_pendentes(self):
+        from .miniaturas import nome_miniatura
+
+        with self.captureOnCommitCallbacks(execute=False):
+            alunos = [
+                Aluno.objects.create(nome=f'Aluno {i}', documento=f'FOTO-{i}', foto=self.foto(f'f{i}.jpg', 300, 900))
+                for i in range(3)
+            ]
+        Aluno.objects.create(nome='Sem Foto', documento='FOTO-X')
+
+        saida = StringIO()
+        call_command('gerar_miniaturas', workers=2, stdout=saida)
+        self.assertIn('3 foto(s)', saida.getvalue())
+        for aluno in alunos:
+            aluno.refresh_from_db()
+            self.assertEqual(aluno.foto_miniaturas, aluno.foto.name)
+            self.assertTrue(aluno.foto.storage.exists(nome_miniatura(aluno.foto.name, 64)))
+            self.assertTrue(nome_miniatura(aluno.foto.name, 64).endswith('.64.jpg'))
+
+        call_command('gerar_miniaturas', stdout=saida)
+        self.assertIn('0 foto(s)', saida.getvalue())
+
+
+class BancoSqliteTest(TestCase):
+    """Testes dos ajustes de conexão do SQLite"""
+
+    def pragma(self, conexao, nome):
+        with conexao.cursor() as cursor:
+            cursor.execute(f'PRAGMA {nome}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_na_conexao_principal(self):
+        self.assertEqual(self.pragma(connection, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(connection, 'busy_timeout'), 5000)
+        self.assertEqual(self.pragma(connection, 'cache_size'), -64000)
+
+    def test_arquivo_em_wal_e_conexao_de_leitura(self):
+        import os
+        import tempfile
+        from pathlib import Path
+        from django.db import OperationalError
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        with tempfile.TemporaryDirectory() as pasta:
+            arquivo = Path(pasta) / 'teste.sqlite3'
+            base = {**connection.settings_dict, 'TEST': {**connection.settings_dict['TEST'], 'MIRROR': None}}
+            principal = DatabaseWrapper({**base, 'NAME': arquivo}, alias='teste')
+            leitura = DatabaseWrapper({**base, 'NAME': f'{arquivo.as_uri()}?mode=ro', 'OPTIONS': {}}, alias='teste_ro')
+            try:
+                self.assertEqual(self.pragma(principal, 'journal_mode'), 'wal')
+                with principal.cursor() as cursor:
+                    cursor.execute('CREATE TABLE t (x INTEGER)')
+                    cursor.execute('INSERT INTO t VALUES (1)')
+                with leitura.cursor() as cursor:
+                    cursor.execute('SELECT COUNT(*) FROM t')
+                    self.assertEqual(cursor.fetchone()[0], 1)
+                    with self.assertRaises(OperationalError):
+                        cursor.execute('INSERT INTO t VALUES (2)')
+                self.assertTrue(os.path.exists(f'{arquivo}-wal'))
+            finally:
+                principal.close()
+                leitura.close()
+
+
+class ViewsAssincronasTest(TestCase):
+    """Testes das views assíncronas, opcionais no servidor ASGI"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create_user('secretaria', password='senha')
+        alunos = criar_alunos(7)
+        turma = Turma.objects.create(nome='1º Ano A', ano_letivo=2025)
+        turma.alunos.add(*alunos[:4])
+        Turma.objects.create(nome='2º Ano A', ano_letivo=2024, ativa=False)
+        for i, aluno in enumerate(alunos):
+            Mensalidade.objects.create(aluno=aluno, valor=100 + i, vencimento=date(2025, 1 + i % 3, 10),
+                                       status=('pago', 'pendente', 'atrasado')[i % 3])
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        descartar_autocompletar()
+
+    def test_desligadas_por_padrao_mesmo_em_asgi(self):
+        import importlib
+        import os
+        from django.conf import settings
+
+        importlib.import_module('sistema_escolar.asgi')
+
+        self.assertNotIn('ESCOLA_VIEWS_ASSINCRONAS', os.environ)
+        self.assertFalse(settings.ESCOLA_VIEWS_ASSINCRONAS)
+
+    def requisicao(self, url, params=None):
+        from django.test import AsyncRequestFactory
+
+        request = AsyncRequestFactory().get(url, params or {})
+
+        async def auser():
+            return self.usuario
+        request.auser = auser
+        return request
+
+    async def comparar(self, nome, params=None):
+        """Renderiza a página com a view síncrona e com a assíncrona e compara o HTML"""
+        import re
+        from asgiref.sync import sync_to_async
+        from . import views, views_assincronas
+
+        request = self.requisicao(reverse(nome), params)
+        request.user = self.usuario
+        sincrona = await sync_to_async(getattr(views, nome))(request)
+        await sync_to_async(cache.clear)()
+        assincrona = await getattr(views_assincronas, nome)(self.requisicao(reverse(nome), params))
+
+        self.assertEqual(assincrona.status_code, 200)
+        sem_csrf = lambda r: re.sub(r'name="csrfmiddlewaretoken" value="[^"]+"', '', r.content.decode())
+        self.assertEqual(sem_csrf(assincrona), sem_csrf(sincrona))
+        return assincrona
+
+    async def test_paginas_iguais_as_da_view_sincrona(self):
+        self.assertContains(await self.comparar('home'), '1º Ano A')
+        self.assertContains(await self.comparar('turma_lista'), '2º Ano A')
+        await self.comparar('aluno_lista', {'por_pagina': 3})
+        self.assertContains(await self.comparar('aluno_lista', {'q': 'aluno 00004'}), 'DOC-00004')
+        await self.comparar('mensalidade_lista', {'status': 'pago', 'por_pagina': 2})
+        await self.comparar('mensalidade_lista', {'turma': (await Turma.objects.aget(ativa=True)).pk})
+
+    def test_dashboard_em_cache(self):
+        from asgiref.sync import async_to_sync
+        from .dashboard import acalcular_dashboard, adados_dashboard, calcular_dashboard
+
+        dados = async_to_sync(acalcular_dashboard)()
+        esperado = calcular_dashboard()
+        self.assertEqual(dados['total_alunos'], 7)
+        self.assertEqual(dados['total_turmas'], 1)
+        self.assertEqual(dados['mensalidades_pagas'], esperado['mensalidades_pagas'])
+        self.assertEqual(dados['mensalidades_atrasadas'], esperado['mensalidades_atrasadas'])
+
+        async_to_sync(adados_dashboard)()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(async_to_sync(adados_dashboard)()['total_alunos'], 7)
+        self.assertEqual(len(queries), 0)
+
+    def test_autocompletar(self):
+        import json
+        from asgiref.sync import async_to_sync
+        from .views_assincronas import autocompletar
+
+        def sugestoes(**params):
+            return async_to_sync(autocompletar)(self.requisicao(reverse('autocompletar'), params))
+
+        response = sugestoes(q='aluno 0000', limite=2)
+        self.assertEqual([item['nome'] for item in json.loads(response.content)['resultados']],
+                         ['Aluno 00000', 'Aluno 00001'])
+
+        # Com o índice já montado a busca roda no loop de eventos, sem acessar o banco
+        with CaptureQueriesContext(connection) as queries:
+            response = sugestoes(q='aluno 00006')
+        self.assertEqual(len(json.loads(response.content)['resultados']), 1)
+        self.assertEqual(len(queries), 0)
+
+        self.assertEqual(sugestoes(tipo='professor').status_code, 400)
+
+
+class CacheEscolaTest(TestCase):
+    """Testes das chaves versionadas e da invalidação de escola.em_cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.force_login(Usuario.objects.create_user('secretaria', password='senha'))
+
+    def test_invalidar_descarta_so_o_grupo(self):
+        from .em_cache import em_cache, invalidar
+
+        calculos = []
+        def calcular(valor):
+            return lambda: calculos.append(valor) or valor
+
+        self.assertEqual(em_cache('turmas', 'lista', calcular(1)), 1)
+        self.assertEqual(em_cache('turmas', 'lista', calcular(2)), 1)
+        self.assertEqual(em_cache('anos', 'lista', calcular(3)), 3)
+
+        invalidar('turmas')
+        self.assertEqual(em_cache('turmas', 'lista', calcular(4)), 4)
+        self.assertEqual(em_cache('anos', 'lista', calcular(5)), 3)
+        self.assertEqual(calculos, [1, 3, 4])
+
+    def test_geracao_perdida_nao_reaproveita_chaves_antigas(self):
+        from .em_cache import chave, em_cache
+
+        em_cache('turmas', 'lista', lambda: 'antiga')
+        cache.delete(chave('turmas', 'geracao'))
+        self.assertEqual(em_cache('turmas', 'lista', lambda: 'nova'), 'nova')
+
+    def test_listas_invalidadas_por_signals_e_lotes(self):
+        aluno = criar_alunos(1)[0]
+        turma = Turma.objects.create(nome='1º Ano A', ano_letivo=2025)
+        Mensalidade.objects.create(aluno=aluno, valor=100, vencimento=date(2025, 3, 10))
+
+        response = self.client.get(reverse('mensalidade_lista'))
+        self.assertEqual([d.year for d in response.context['anos_disponiveis']], [2025])
+        self.assertEqual(self.client.get(reverse('turma_lista')).context['turmas'][0].total_alunos, 0)
+
+        # Segunda visita: anos e turmas vêm do cache
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('mensalidade_lista'))
+            self.client.get(reverse('turma_lista'))
+        self.assertFalse([q for q in queries if 'escola_turma' in q['sql'] or 'django_date_trunc' in q['sql']])
+
+        turma.alunos.add(aluno)
+        self.assertEqual(self.client.get(reverse('turma_lista')).context['turmas'][0].total_alunos, 1)
+
+        gerar_mensalidades_mes(1, 2026)
+        response = self.client.get(reverse('mensalidade_lista'))
+        self.assertEqual([d.year for d in response.context['anos_disponiveis']], [2026, 2025])
+
+        Mensalidade.objects.filter(vencimento__year=2026).delete()
+        response = self.client.get(reverse('mensalidade_lista'))
+        self.assertEqual([d.year for d in response.context['anos_disponiveis']], [2025])
+
+    def test_cache_em_arquivo_compartilhado_entre_processos(self):
+        import tempfile
+        from django.core.cache import caches
+        from .em_cache import chave, em_cache
+
+        with tempfile.TemporaryDirectory() as pasta, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': pasta,
+        }}):
+            em_cache('dashboard', 'dados', lambda: {'total_alunos': 1})
+            # Outro worker: uma instância nova do backend sobre o mesmo diretório
+            outro = caches.create_connection('default')
+            geracao = outro.get(chave('dashboard', 'geracao'))
+            self.assertEqual(outro.get(chave('dashboard', 'dados'), version=geracao), {'total_alunos': 1})
+
+            outro.incr(chave('dashboard', 'geracao'))
+            self.assertEqual(em_cache('dashboard', 'dados', lambda: {'total_alunos': 2}), {'total_alunos': 2})
+
+
+@override_settings(ESCOLA_INSTRUMENTACAO=True)
+class InstrumentacaoTest(TestCase):
+    """Testes do middleware de medição de tempo e SQL por requisição"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.equipe = Usuario.objects.create_user('direcao', password='senha', is_staff=True)
+        criar_alunos(3)
+        Turma.objects.create(nome='1º Ano A', ano_letivo=2025)
+
+    def setUp(self):
+        from .instrumentacao import estatisticas
+        estatisticas.limpar()
+        self.addCleanup(estatisticas.limpar)
+        self.client.force_login(self.equipe)
+
+    @staticmethod
+    def server_timing(response):
+        """{'total': {'dur': ...}, 'sql': {'dur': ..., 'desc': ...}, ...}"""
+        metricas = {}
+        for metrica in response['Server-Timing'].split(', '):
+            nome, *partes = metrica.split(';')
+            metricas[nome] = dict(parte.split('=', 1) for parte in partes)
+        return metricas
+
+    def test_desligada_fica_fora_da_cadeia(self):
+        with override_settings(ESCOLA_INSTRUMENTACAO=False):
+            from django.test import Client
+            cliente = Client()
+            cliente.force_login(self.equipe)
+            response = cliente.get(reverse('turma_lista'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('InstrumentacaoMiddleware', repr(cliente.handler._middleware_chain))
+
+    def test_cabecalho_e_log_com_consultas_da_requisicao(self):
+        import json
+
+        with CaptureQueriesContext(connection) as queries, self.assertLogs('escola.instrumentacao') as logs:
+            response = self.client.get(reverse('aluno_lista'))
+        metricas = self.server_timing(response)
+        self.assertEqual(metricas['sql']['desc'], f'"{len(queries)} consultas"')
+        self.assertGreaterEqual(float(metricas['total']['dur']), float(metricas['sql']['dur']))
+
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual(registro['view'], 'aluno_lista')
+        self.assertEqual(registro['status'], 200)
+        self.assertEqual(registro['consultas'], len(queries))
+
+    def test_consultas_repetidas(self):
+        from .instrumentacao import ativar_medidor, medir
+
+        ativar_medidor()
+        with medir() as medicao:
+            list(Aluno.objects.filter(pk=1))
+            list(Aluno.objects.filter(pk=1))
+            list(Aluno.objects.filter(pk=2))
+        list(Aluno.objects.all())
+
+        self.assertEqual(medicao.consultas, 3)
+        self.assertEqual(medicao.duplicadas, 1)
+
+    def test_servidor_assincrono(self):
+        from asgiref.sync import async_to_sync
+
+        self.async_client.force_login(self.equipe)
+        with self.assertLogs('escola.instrumentacao'):
+            response = async_to_sync(self.async_client.get)(reverse('turma_lista'))
+        # As consultas rodam em outra thread e ainda assim entram na medição
+        self.assertNotEqual(self.server_timing(response)['sql']['desc'], '"0 consultas"')
+
+    def test_estatisticas_por_view_somente_para_equipe(self):
+        with self.assertLogs('escola.instrumentacao'):
+            for _ in range(3):
+                self.client.get(reverse('turma_lista'))
+            self.client.get(reverse('home'))
+            dados = self.client.get(reverse('estatisticas_requisicoes')).json()
+
+        self.assertTrue(dados['ativa'])
+        por_view = {linha['view']: linha for linha in dados['views']}
+        self.assertEqual(por_view['turma_lista']['requisicoes'], 3)
+        self.assertEqual(por_view['home']['requisicoes'], 1)
+        self.assertLessEqual(por_view['turma_lista']['p50_ms'], por_view['turma_lista']['p99_ms'])
+
+        self.client.force_login(Usuario.objects.create_user('professor', password='senha'))
+        with self.assertLogs('escola.instrumentacao'):
+            self.assertEqual(self.client.get(reverse('estatisticas_requisicoes')).status_code, 403)
+
+
+class DadosSinteticosEBenchmarkTest(TestCase):
+    """Testes do gerador de dados sintéticos e do benchmark de endpoints"""
+
+    def gerar(self, **opcoes):
+        saida = StringIO()
+        call_command(
+            'gerar_dados_sinteticos', alunos=30, professores=3, turmas=2, anos=2, data='2025-06-15',
+            lote=7, stdout=saida, **opcoes,
+        )
+        return saida.getvalue()
+
+    def test_gera_base_reproduzivel(self):
+        self.gerar()
+        self.assertEqual(Usuario.objects.filter(tipo='professor').count(), 3)
+        self.assertEqual(Turma.objects.filter(ano_letivo=2024).count(), 2)
+        self.assertEqual(Turma.alunos.through.objects.count(), 60)  # uma turma por aluno e ano
+        # Ativos com 24 meses, inativos só com os do primeiro ano
+        inativos = Aluno.objects.filter(ativo=False).count()
+        self.assertEqual(Mensalidade.objects.count(), 24 * 30 - 12 * inativos)
+        self.assertFalse(Mensalidade.objects.filter(vencimento__gt=date(2025, 6, 15)).exclude(status='pendente').exists())
+        self.assertFalse(Mensalidade.objects.filter(status='pago', data_pagamento__isnull=True).exists())
+        self.assertEqual(ResumoFinanceiroAluno.objects.count(), 30)
+        self.assertTrue(ConsolidadoMensal.objects.exists())
+
+        primeira = list(Aluno.objects.order_by('documento').values_list('nome', 'valor_mensalidade'))
+        with self.assertRaises(CommandError):
+            self.gerar()
+        self.gerar(limpar=True)
+        self.assertEqual(list(Aluno.objects.order_by('documento').values_list('nome', 'valor_mensalidade')), primeira)
+        self.assertEqual(Usuario.objects.filter(tipo='professor').count(), 3)
+
+    def test_benchmark_grava_json_e_aponta_regressoes(self):
+        import json
+        import os
+        import tempfile
+
+        self.gerar()
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'resultado.json')
+            call_command('benchmark_endpoints', repeticoes=2, saida=caminho, endpoint=['turma'], stdout=StringIO())
+            with open(caminho, encoding='utf-8') as arquivo:
+                dados = json.load(arquivo)
+
+            self.assertEqual(dados['ambiente']['alunos'], 30)
+            self.assertEqual(set(dados['endpoints']), {'web:turmas', 'web:turma_detalhe', 'api:turmas', 'api:turma_detalhe'})
+            for resultado in dados['endpoints'].values():
+                self.assertEqual(resultado['status'], 200)
+                self.assertGreater(resultado['consultas'], 0)
+                self.assertGreater(resultado['memoria_pico_kib'], 0)
+            self.assertFalse(Usuario.objects.filter(username='benchmark-endpoints').exists())
+
+            # Uma versão anterior com menos consultas em uma rota
+            dados['endpoints']['api:turmas']['consultas'] -= 1
+            dados['endpoints']['api:turmas']['p50_ms'] = 1000
+            anterior = os.path.join(pasta, 'anterior.json')
+            with open(anterior, 'w', encoding='utf-8') as arquivo:
+                json.dump(dados, arquivo)
+            saida = StringIO()
+            with self.assertRaisesMessage(CommandError, '1 endpoint(s) com regressão'):
+                call_command(
+                    'benchmark_endpoints', repeticoes=1, saida=caminho, endpoint=['api:turmas'],
+                    comparar=anterior, falhar_em_regressao=True, stdout=saida,
+                )
+            self.assertIn('api:turmas: consultas', saida.getvalue())
+
+
+class MigracoesTest(TestCase):
+    """Migrações congeladas: não dependem do código atual da aplicação"""
+
+    def test_migracoes_nao_importam_o_app(self):
+        from pathlib import Path
+
+        for migracao in sorted(Path(__file__).parent.joinpath('migrations').glob('0*.py')):
+            with self.subTest(migracao=migracao.name):
+                codigo = migracao.read_text(encoding='utf-8')
+                self.assertNotRegex(codigo, r'(?m)^\s*(from|import) escola\b')
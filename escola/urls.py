@@ -1,16 +1,28 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, views_assincronas
+
+# No servidor ASGI as páginas de leitura mais acessadas usam as views assíncronas
+leitura = views_assincronas if settings.ESCOLA_VIEWS_ASSINCRONAS else views
 
 urlpatterns = [
-    path('', views.home, name='home'),
-    path('alunos/', views.aluno_lista, name='aluno_lista'),
+    path('', leitura.home, name='home'),
+    path('autocompletar/', leitura.autocompletar, name='autocompletar'),
+    path('alunos/', leitura.aluno_lista, name='aluno_lista'),
     path('alunos/novo/', views.aluno_criar, name='aluno_criar'),
+    path('alunos/exportar/', views.exportar_alunos, name='exportar_alunos'),
     path('alunos/<int:pk>/', views.aluno_detalhe, name='aluno_detalhe'),
     path('alunos/<int:pk>/editar/', views.aluno_editar, name='aluno_editar'),
     path('alunos/<int:pk>/historico/', views.historico_pagamentos, name='historico_pagamentos'),
-    path('turmas/', views.turma_lista, name='turma_lista'),
+    path('turmas/', leitura.turma_lista, name='turma_lista'),
     path('turmas/<int:pk>/', views.turma_detalhe, name='turma_detalhe'),
-    path('mensalidades/', views.mensalidade_lista, name='mensalidade_lista'),
+    path('mensalidades/', leitura.mensalidade_lista, name='mensalidade_lista'),
     path('mensalidades/gerar/', views.gerar_mensalidades, name='gerar_mensalidades'),
+    path('mensalidades/exportar/', views.exportar_mensalidades, name='exportar_mensalidades'),
+    path('mensalidades/conciliacao/', views.conciliacao_bancaria, name='conciliacao_bancaria'),
+    path('mensalidades/recibos/', views.recibos_em_lote, name='recibos_em_lote'),
     path('mensalidades/<int:pk>/recibo/', views.recibo, name='recibo'),
+    path('relatorios/financeiro/', views.relatorio_financeiro, name='relatorio_financeiro'),
+    path('estatisticas/requisicoes/', views.estatisticas_requisicoes, name='estatisticas_requisicoes'),
+    path('relatorios/financeiro/exportar/', views.exportar_relatorio_financeiro, name='exportar_relatorio_financeiro'),
 ]
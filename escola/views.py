@@ -1,48 +1,34 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Sum
 from django.contrib import messages
 from .models import Aluno, Turma, Mensalidade
+from .dashboard import dados_dashboard
+from .em_cache import queryset_em_cache
+from .filtros import filtrar_alunos, filtrar_mensalidades
+from .paginacao import paginar_por_chave
 
 
 @login_required
 def home(request):
     """View para página inicial com dashboard"""
-    total_alunos = Aluno.objects.filter(ativo=True).count()
-    total_turmas = Turma.objects.filter(ativa=True).count()
-    mensalidades_pendentes = Mensalidade.objects.filter(status='pendente').count()
-    mensalidades_pagas = Mensalidade.objects.filter(status='pago').count()
-    mensalidades_atrasadas = Mensalidade.objects.filter(status='atrasado').order_by('vencimento')[:5]
-    turmas_ativas = Turma.objects.filter(ativa=True).prefetch_related('alunos')[:5]
-    
-    context = {
-        'total_alunos': total_alunos,
-        'total_turmas': total_turmas,
-        'mensalidades_pendentes': mensalidades_pendentes,
-        'mensalidades_pagas': mensalidades_pagas,
-        'mensalidades_atrasadas': mensalidades_atrasadas,
-        'turmas_ativas': turmas_ativas,
-    }
+    context = dados_dashboard()
     return render(request, 'home.html', context)
 
 
 @login_required
 def aluno_lista(request):
     """View para listagem de alunos"""
-    alunos = Aluno.objects.all().order_by('nome')
-    
-    # Filtro de busca
-    query = request.GET.get('q')
-    if query:
-        alunos = alunos.filter(
-            Q(nome__icontains=query) |
-            Q(documento__icontains=query) |
-            Q(nome_pai__icontains=query) |
-            Q(nome_mae__icontains=query)
-        )
+    from .busca import ORDENACAO_RELEVANCIA
+    
+    alunos = filtrar_alunos(Aluno.objects.all(), request.GET)
+    
+    # Com busca, os resultados mais relevantes vêm primeiro
+    ordenacao = ORDENACAO_RELEVANCIA if 'relevancia' in alunos.query.annotations else ('nome', 'id')
+    pagina = paginar_por_chave(request, alunos, ordenacao)
     
     context = {
-        'alunos': alunos,
+        'alunos': pagina,
+        'pagina': pagina,
     }
     return render(request, 'aluno_lista.html', context)
 
@@ -50,9 +36,12 @@ def aluno_lista(request):
 @login_required
 def aluno_detalhe(request, pk):
     """View para detalhes de um aluno"""
+    from .resumos import resumo_do_aluno
+    
     aluno = get_object_or_404(Aluno, pk=pk)
     context = {
         'aluno': aluno,
+        'resumo': resumo_do_aluno(aluno),
     }
     return render(request, 'aluno_detalhe.html', context)
 
@@ -119,10 +108,10 @@ def aluno_editar(request, pk):
 @login_required
 def turma_lista(request):
     """View para listagem de turmas"""
-    turmas = Turma.objects.all().prefetch_related('alunos', 'professor_responsavel').order_by('-ano_letivo', 'nome')
+    turmas = Turma.objects.com_total_alunos().order_by('-ano_letivo', 'nome')
     
     context = {
-        'turmas': turmas,
+        'turmas': queryset_em_cache('turmas', 'lista', turmas),
     }
     return render(request, 'turma_lista.html', context)
 
@@ -130,7 +119,7 @@ def turma_lista(request):
 @login_required
 def turma_detalhe(request, pk):
     """View para detalhes de uma turma"""
-    turma = get_object_or_404(Turma.objects.prefetch_related('alunos'), pk=pk)
+    turma = get_object_or_404(Turma.objects.com_total_alunos().prefetch_related('alunos'), pk=pk)
     context = {
         'turma': turma,
     }
@@ -140,80 +129,52 @@ def turma_detalhe(request, pk):
 @login_required
 def mensalidade_lista(request):
     """View para listagem de mensalidades"""
-    from django.contrib import messages
-    from django.shortcuts import redirect
-    from django.utils import timezone
-    
-    # Ação rápida para mudar status
+    # Ação rápida para mudar status de uma ou várias mensalidades
     if request.method == 'POST' and 'mensalidade_id' in request.POST:
-        mensalidade_id = request.POST.get('mensalidade_id')
-        novo_status = request.POST.get('status')
-        mensalidade = get_object_or_404(Mensalidade, pk=mensalidade_id)
+        from .cobranca import STATUS_VALIDOS, alterar_status_em_lote
         
-        mensalidade.status = novo_status
-        if novo_status == 'pago':
-            mensalidade.data_pagamento = timezone.now().date()
+        enviados = set(request.POST.getlist('mensalidade_id'))
+        ids = [i for i in enviados if i.isdigit()]
+        novo_status = request.POST.get('status')
+        if novo_status not in STATUS_VALIDOS:
+            messages.error(request, 'Status inválido.')
         else:
-            mensalidade.data_pagamento = None
-        mensalidade.save()
-        
-        messages.success(request, f'Status atualizado para {mensalidade.get_status_display()}!')
-        return redirect('mensalidade_lista')
-    
-    mensalidades = Mensalidade.objects.all().select_related('aluno').order_by('-vencimento')
-    
-    # Filtro de busca por nome
-    query = request.GET.get('q')
-    if query:
-        mensalidades = mensalidades.filter(aluno__nome__icontains=query)
-    
-    # Filtro por status da mensalidade
-    status = request.GET.get('status')
-    if status:
-        mensalidades = mensalidades.filter(status=status)
-    
-    # Filtro por período (mês/ano inicial e final)
-    mes_inicial = request.GET.get('mes_inicial')
-    ano_inicial = request.GET.get('ano_inicial')
-    mes_final = request.GET.get('mes_final')
-    ano_final = request.GET.get('ano_final')
-    
-    if mes_inicial and ano_inicial:
-        from datetime import date
-        data_inicial = date(int(ano_inicial), int(mes_inicial), 1)
-        mensalidades = mensalidades.filter(vencimento__gte=data_inicial)
-    
-    if mes_final and ano_final:
-        from datetime import date
-        import calendar
-        ultimo_dia = calendar.monthrange(int(ano_final), int(mes_final))[1]
-        data_final = date(int(ano_final), int(mes_final), ultimo_dia)
-        mensalidades = mensalidades.filter(vencimento__lte=data_final)
-    
-    # Filtro por status do aluno (ativo/inativo)
-    aluno_ativo = request.GET.get('aluno_ativo')
-    if aluno_ativo:
-        if aluno_ativo == '1':
-            mensalidades = mensalidades.filter(aluno__ativo=True)
-        elif aluno_ativo == '0':
-            mensalidades = mensalidades.filter(aluno__ativo=False)
-    
-    # Cálculo dos totais
-    total_pago = mensalidades.filter(status='pago').aggregate(total=Sum('valor'))['total'] or 0
-    total_pendente = mensalidades.filter(status='pendente').aggregate(total=Sum('valor'))['total'] or 0
-    total_atrasado = mensalidades.filter(status='atrasado').aggregate(total=Sum('valor'))['total'] or 0
-    total_geral = total_pago + total_pendente + total_atrasado
+            atualizadas = alterar_status_em_lote(ids, novo_status)
+            status_display = dict(Mensalidade.STATUS_CHOICES)[novo_status]
+            if atualizadas == 0:
+                messages.error(request, 'Nenhuma mensalidade encontrada para atualizar.')
+            elif atualizadas < len(enviados):
+                messages.warning(
+                    request,
+                    f'{atualizadas} de {len(enviados)} mensalidade(s) atualizada(s) para {status_display}; '
+                    f'as demais não foram encontradas.'
+                )
+            elif atualizadas == 1:
+                messages.success(request, f'Status atualizado para {status_display}!')
+            else:
+                messages.success(request, f'{atualizadas} mensalidade(s) atualizada(s) para {status_display}!')
+        return redirect(request.get_full_path())
+    
+    mensalidades = filtrar_mensalidades(
+        Mensalidade.objects.all().select_related('aluno'),
+        request.GET,
+    )
+    
+    # Cálculo dos totais em uma única consulta
+    totais = mensalidades.totais()
     
     # Anos disponíveis para o filtro
     anos_disponiveis = Mensalidade.objects.dates('vencimento', 'year', order='DESC')
+    turmas = Turma.objects.only('id', 'nome', 'ano_letivo')
+    
+    pagina = paginar_por_chave(request, mensalidades, ('-vencimento', '-id'))
     
     context = {
-        'mensalidades': mensalidades,
-        'total_pago': total_pago,
-        'total_pendente': total_pendente,
-        'total_atrasado': total_atrasado,
-        'total_geral': total_geral,
-        'anos_disponiveis': anos_disponiveis,
+        'mensalidades': pagina,
+        'pagina': pagina,
+        **totais,
+        'anos_disponiveis': queryset_em_cache('anos', 'lista', anos_disponiveis),
+        'turmas': queryset_em_cache('turmas', 'opcoes', turmas),
     }
     return render(request, 'mensalidade_lista.html', context)
 
@@ -222,60 +183,60 @@ def mensalidade_lista(request):
 def recibo(request, pk):
     """View para emissão de recibo de mensalidade"""
     from django.utils import timezone
-    mensalidade = get_object_or_404(Mensalidade, pk=pk)
+    from .recibos import recibo_da_mensalidade
+    
+    mensalidade = get_object_or_404(Mensalidade.objects.select_related('aluno'), pk=pk)
     context = {
         'mensalidade': mensalidade,
+        'recibo_html': recibo_da_mensalidade(mensalidade, request.GET.get('forma') or 'Dinheiro'),
         'hoje': timezone.now(),
-        'forma_pagamento': request.GET.get('forma', 'Dinheiro'),
     }
     return render(request, 'recibo.html', context)
 
 
+@login_required
+def recibos_em_lote(request):
+    """View que emite, em um único documento paginado, os recibos das mensalidades filtradas"""
+    from django.http import StreamingHttpResponse
+    from .recibos import documento_recibos
+    
+    # Sem status informado, somente as mensalidades pagas
+    params = request.GET.copy()
+    params.setdefault('status', 'pago')
+    mensalidades = filtrar_mensalidades(Mensalidade.objects.all(), params)
+    
+    conteudo = documento_recibos(mensalidades, request.GET.get('forma') or 'Dinheiro')
+    return StreamingHttpResponse(conteudo, content_type='text/html; charset=utf-8')
+
+
 @login_required
 def historico_pagamentos(request, pk):
     """View para histórico de pagamentos de um aluno"""
     from django.utils import timezone
-    from django.db.models import Count, Avg
+    
+    from .resumos import resumo_do_aluno
     
     aluno = get_object_or_404(Aluno, pk=pk)
     mensalidades = aluno.mensalidades.all().order_by('-vencimento')
     
-    # Estatísticas
-    total_pagas = mensalidades.filter(status='pago').count()
-    total_pendentes = mensalidades.filter(status='pendente').count()
-    total_atrasadas = mensalidades.filter(status='atrasado').count()
-    total_mensalidades = mensalidades.count()
-    
-    valor_pago = sum(m.valor for m in mensalidades.filter(status='pago'))
-    valor_pendente = sum(m.valor for m in mensalidades.filter(status='pendente'))
-    valor_atrasado = sum(m.valor for m in mensalidades.filter(status='atrasado'))
-    valor_total = valor_pago + valor_pendente + valor_atrasado
-    
-    # Percentual de pagamento
-    percentual_pagamento = (total_pagas / total_mensalidades * 100) if total_mensalidades > 0 else 0
-    
-    # Ticket médio
-    ticket_medio = mensalidades.aggregate(media=Avg('valor'))['media'] or 0
-    
-    # Meses consecutivos em dia (simplificado)
-    meses_consecutivos = 0
-    for mens in mensalidades.filter(status='pago').order_by('-vencimento'):
-        meses_consecutivos += 1
+    # Estatísticas lidas da tabela de resumo em vez de agregar as mensalidades
+    resumo = resumo_do_aluno(aluno)
     
     context = {
         'aluno': aluno,
         'mensalidades': mensalidades,
-        'total_pagas': total_pagas,
-        'total_pendentes': total_pendentes,
-        'total_atrasadas': total_atrasadas,
-        'total_mensalidades': total_mensalidades,
-        'valor_pago': valor_pago,
-        'valor_pendente': valor_pendente,
-        'valor_atrasado': valor_atrasado,
-        'valor_total': valor_total,
-        'percentual_pagamento': percentual_pagamento,
-        'ticket_medio': ticket_medio,
-        'meses_consecutivos': meses_consecutivos,
+        'total_pagas': resumo.quantidade_pago,
+        'total_pendentes': resumo.quantidade_pendente,
+        'total_atrasadas': resumo.quantidade_atrasado,
+        'total_mensalidades': resumo.quantidade_total,
+        'valor_pago': resumo.total_pago,
+        'valor_pendente': resumo.total_pendente,
+        'valor_atrasado': resumo.total_atrasado,
+        'valor_total': resumo.total_geral,
+        'percentual_pagamento': resumo.percentual_pagamento,
+        'ticket_medio': resumo.valor_medio,
+        'meses_consecutivos': resumo.sequencia_em_dia,
+        'ultimo_pagamento': resumo.ultimo_pagamento,
         'hoje': timezone.now(),
     }
     return render(request, 'historico_pagamentos.html', context)
@@ -287,7 +248,7 @@ def gerar_mensalidades(request):
     from django.contrib import messages
     from django.utils import timezone
     from datetime import date
-    from decimal import Decimal
+    from .cobranca import gerar_mensalidades_mes
     
     hoje = date.today()
     
@@ -295,41 +256,9 @@ def gerar_mensalidades(request):
         mes = int(request.POST.get('mes'))
         ano = int(request.POST.get('ano'))
         
-        # Data de vencimento: dia 10 do mês
-        vencimento = date(ano, mes, 10)
-        
-        alunos_ativos = Aluno.objects.filter(ativo=True)
-        criadas = 0
-        ja_existentes = 0
-        
-        for aluno in alunos_ativos:
-            # Verifica se já existe mensalidade para este mês
-            existe = Mensalidade.objects.filter(
-                aluno=aluno,
-                vencimento__year=ano,
-                vencimento__month=mes
-            ).exists()
-            
-            if not existe:
-                # Determina o status baseado na data
-                if vencimento < hoje:
-                    status = 'atrasado'
-                else:
-                    status = 'pendente'
-                
-                # Usa o valor individual do aluno
-                valor_aluno = aluno.valor_mensalidade
-                
-                Mensalidade.objects.create(
-                    aluno=aluno,
-                    valor=valor_aluno,
-                    vencimento=vencimento,
-                    status=status,
-                    observacoes=f'Mensalidade gerada automaticamente - {mes:02d}/{ano}'
-                )
-                criadas += 1
-            else:
-                ja_existentes += 1
+        resultado = gerar_mensalidades_mes(mes, ano, hoje=hoje)
+        criadas = resultado.criadas
+        ja_existentes = resultado.ja_existentes
         
         if criadas > 0:
             messages.success(request, f'✅ {criadas} mensalidade(s) gerada(s) com sucesso para {mes:02d}/{ano}!')
@@ -351,3 +280,161 @@ def gerar_mensalidades(request):
         ).count(),
     }
     return render(request, 'gerar_mensalidades.html', context)
+
+
+def _exportacao(request, queryset, colunas, nome):
+    from django.http import HttpResponseBadRequest
+    from .exportacao import exportar, resposta_exportacao
+    
+    formato = request.GET.get('formato', 'csv')
+    try:
+        conteudo = exportar(queryset, colunas, formato)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return resposta_exportacao(conteudo, nome, formato)
+
+
+@login_required
+def exportar_mensalidades(request):
+    """View para exportação em streaming (CSV/NDJSON) das mensalidades filtradas"""
+    from .exportacao import COLUNAS_MENSALIDADES, mensalidades_para_exportar
+    
+    return _exportacao(request, mensalidades_para_exportar(request.GET), COLUNAS_MENSALIDADES, 'mensalidades')
+
+
+@login_required
+def exportar_alunos(request):
+    """View para exportação em streaming (CSV/NDJSON) dos alunos filtrados"""
+    from .exportacao import COLUNAS_ALUNOS, alunos_para_exportar
+    
+    return _exportacao(request, alunos_para_exportar(request.GET), COLUNAS_ALUNOS, 'alunos')
+
+
+@login_required
+def conciliacao_bancaria(request):
+    """View para upload do arquivo de retorno bancário e baixa das mensalidades"""
+    from .conciliacao import LEITORES, abrir_texto, conciliar
+    
+    # Quantidade máxima de divergências exibidas na página
+    limite_exibicao = 200
+    divergencias = []
+    resultado = None
+    
+    def registrar(divergencia):
+        if len(divergencias) < limite_exibicao:
+            divergencias.append(divergencia)
+    
+    if request.method == 'POST':
+        arquivo = request.FILES.get('arquivo')
+        if not arquivo:
+            messages.error(request, 'Selecione o arquivo de retorno.')
+        else:
+            try:
+                resultado = conciliar(
+                    abrir_texto(arquivo, request.POST.get('encoding') or 'utf-8'),
+                    formato=request.POST.get('formato', 'auto'),
+                    nome_arquivo=arquivo.name,
+                    registrar_divergencia=registrar,
+                    simular=request.POST.get('simular') == 'on',
+                )
+            except (ValueError, LookupError) as e:
+                messages.error(request, f'Erro ao processar o arquivo: {str(e)}')
+            else:
+                if resultado.simulacao:
+                    messages.info(request, f'Simulação: {resultado.conciliadas} mensalidade(s) seriam baixadas.')
+                elif resultado.conciliadas:
+                    messages.success(request, f'✅ {resultado.conciliadas} mensalidade(s) baixada(s) com sucesso!')
+                if resultado.total_divergencias:
+                    messages.warning(request, f'⚠️ {resultado.total_divergencias} linha(s) com divergência.')
+    
+    context = {
+        'resultado': resultado,
+        'divergencias': divergencias,
+        'limite_exibicao': limite_exibicao,
+        'formatos': list(LEITORES),
+    }
+    return render(request, 'conciliacao.html', context)
+
+
+@login_required
+def autocompletar(request):
+    """Sugestões de alunos ou turmas para campos de busca (JSON)"""
+    from django.http import JsonResponse
+    from .autocompletar import LIMITE_MAXIMO, LIMITE_PADRAO, autocompletar as indice
+    
+    tipo = request.GET.get('tipo', 'aluno')
+    try:
+        limite = max(1, min(int(request.GET.get('limite', LIMITE_PADRAO)), LIMITE_MAXIMO))
+    except ValueError:
+        limite = LIMITE_PADRAO
+    
+    try:
+        resultados = indice.sugestoes(
+            tipo,
+            request.GET.get('q', ''),
+            limite,
+            somente_ativos=request.GET.get('ativo') == '1',
+        )
+    except ValueError as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+    return JsonResponse({'resultados': resultados})
+
+
+@login_required
+def relatorio_financeiro(request):
+    """View do relatório mensal de faturamento e inadimplência"""
+    from .models import Turma
+    from .relatorios import PERIODOS, parametros_relatorio, relatorio_mensal, totalizar
+    
+    try:
+        parametros = parametros_relatorio(request.GET)
+    except ValueError as e:
+        messages.error(request, str(e))
+        parametros = parametros_relatorio({})
+    linhas = relatorio_mensal(**parametros)
+    
+    context = {
+        'linhas': linhas,
+        'total': totalizar(linhas),
+        'parametros': parametros,
+        'periodos': PERIODOS,
+        'meses': range(1, 13),
+        'turmas': queryset_em_cache(
+            'turmas', 'relatorio', Turma.objects.order_by('-ano_letivo', 'nome').values_list('id', 'nome', 'ano_letivo'),
+        ),
+    }
+    return render(request, 'relatorio_financeiro.html', context)
+
+
+@login_required
+def exportar_relatorio_financeiro(request):
+    """View para exportação (CSV/NDJSON) do relatório mensal com os mesmos filtros da página"""
+    from django.http import HttpResponseBadRequest
+    from .exportacao import exportar_linhas, resposta_exportacao
+    from .relatorios import COLUNAS_RELATORIO, linhas_para_exportar, parametros_relatorio, relatorio_mensal
+    
+    formato = request.GET.get('formato', 'csv')
+    try:
+        linhas = relatorio_mensal(**parametros_relatorio(request.GET))
+        conteudo = exportar_linhas(COLUNAS_RELATORIO, linhas_para_exportar(linhas), formato)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return resposta_exportacao(conteudo, 'relatorio_financeiro', formato)
+
+
+@login_required
+def estatisticas_requisicoes(request):
+    """Percentis de duração e consultas SQL por view, medidos neste processo (JSON, somente equipe)"""
+    import os
+    from django.conf import settings
+    from django.http import JsonResponse
+    from .instrumentacao import estatisticas
+    
+    if not request.user.is_staff:
+        return JsonResponse({'erro': 'Acesso restrito à equipe.'}, status=403)
+    return JsonResponse({
+        'ativa': settings.ESCOLA_INSTRUMENTACAO,
+        # Cada worker tem as suas estatísticas
+        'processo': os.getpid(),
+        'views': estatisticas.resumo(),
+    })
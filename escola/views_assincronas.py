@@ -0,0 +1,110 @@
+"""
+Versões assíncronas das páginas de leitura mais acessadas.
+
+Substituem as views equivalentes de views.py com ESCOLA_VIEWS_ASSINCRONAS=True,
+opção que só faz sentido com o projeto rodando em um servidor ASGI
+(SERVIDOR=asgi no gunicorn.conf.py).
+Todas as consultas usam o ORM assíncrono e o conteúdo é lido por completo
+antes de renderizar, já que o template não pode acessar o banco dentro do
+loop de eventos.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import render
+
+from . import views
+from .autocompletar import LIMITE_MAXIMO, LIMITE_PADRAO, autocompletar as indice
+from .busca import ORDENACAO_RELEVANCIA
+from .dashboard import adados_dashboard
+from .em_cache import aqueryset_em_cache
+from .filtros import filtrar_alunos, filtrar_mensalidades
+from .models import Aluno, Turma, Mensalidade
+from .paginacao import apaginar_por_chave
+
+
+async def _render(request, template_name, context):
+    """render() com o usuário já carregado: o template usa request.user"""
+    request.user = await request.auser()
+    return render(request, template_name, context)
+
+
+@login_required
+async def home(request):
+    """View para página inicial com dashboard"""
+    return await _render(request, 'home.html', await adados_dashboard())
+
+
+@login_required
+async def aluno_lista(request):
+    """View para listagem de alunos"""
+    # Na primeira busca do processo, filtrar verifica se há índice FTS5 no banco
+    alunos = await sync_to_async(filtrar_alunos)(Aluno.objects.all(), request.GET)
+
+    ordenacao = ORDENACAO_RELEVANCIA if 'relevancia' in alunos.query.annotations else ('nome', 'id')
+    pagina = await apaginar_por_chave(request, alunos, ordenacao)
+
+    context = {
+        'alunos': pagina,
+        'pagina': pagina,
+    }
+    return await _render(request, 'aluno_lista.html', context)
+
+
+@login_required
+async def turma_lista(request):
+    """View para listagem de turmas"""
+    turmas = Turma.objects.com_total_alunos().order_by('-ano_letivo', 'nome')
+
+    context = {
+        'turmas': await aqueryset_em_cache('turmas', 'lista', turmas),
+    }
+    return await _render(request, 'turma_lista.html', context)
+
+
+@login_required
+async def mensalidade_lista(request):
+    """View para listagem de mensalidades"""
+    if request.method == 'POST':
+        # A alteração rápida de status grava no banco: fica com a view síncrona
+        return await sync_to_async(views.mensalidade_lista)(request)
+
+    mensalidades = filtrar_mensalidades(
+        Mensalidade.objects.all().select_related('aluno'),
+        request.GET,
+    )
+
+    totais = await mensalidades.atotais()
+    anos_disponiveis = Mensalidade.objects.dates('vencimento', 'year', order='DESC')
+    turmas = Turma.objects.only('id', 'nome', 'ano_letivo')
+    pagina = await apaginar_por_chave(request, mensalidades, ('-vencimento', '-id'))
+
+    context = {
+        'mensalidades': pagina,
+        'pagina': pagina,
+        **totais,
+        'anos_disponiveis': await aqueryset_em_cache('anos', 'lista', anos_disponiveis),
+        'turmas': await aqueryset_em_cache('turmas', 'opcoes', turmas),
+    }
+    return await _render(request, 'mensalidade_lista.html', context)
+
+
+@login_required
+async def autocompletar(request):
+    """Sugestões de alunos ou turmas para campos de busca (JSON)"""
+    tipo = request.GET.get('tipo', 'aluno')
+    try:
+        limite = max(1, min(int(request.GET.get('limite', LIMITE_PADRAO)), LIMITE_MAXIMO))
+    except ValueError:
+        limite = LIMITE_PADRAO
+
+    try:
+        resultados = await indice.asugestoes(
+            tipo,
+            request.GET.get('q', ''),
+            limite,
+            somente_ativos=request.GET.get('ativo') == '1',
+        )
+    except ValueError as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+    return JsonResponse({'resultados': resultados})
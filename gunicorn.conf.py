@@ -0,0 +1,28 @@
+"""
+Configuração do gunicorn, lida automaticamente quando ele roda na raiz do projeto.
+
+SERVIDOR=wsgi (padrão): workers síncronos com sistema_escolar.wsgi.
+SERVIDOR=asgi: workers do uvicorn com sistema_escolar.asgi. As views
+assíncronas das páginas de leitura (escola/views_assincronas.py) continuam
+desligadas até ESCOLA_VIEWS_ASSINCRONAS=True.
+A quantidade de workers vem de WEB_CONCURRENCY, como de costume no gunicorn.
+"""
+# Nomes do módulo que coincidem com settings do gunicorn (como config) viram configuração
+from decouple import config as _config
+
+
+SERVIDOR = _config('SERVIDOR', default='wsgi')
+
+if SERVIDOR == 'asgi':
+    wsgi_app = 'sistema_escolar.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+elif SERVIDOR == 'wsgi':
+    wsgi_app = 'sistema_escolar.wsgi:application'
+else:
+    raise ValueError(f'SERVIDOR inválido: {SERVIDOR}. Use wsgi ou asgi')
+
+
+def post_worker_init(worker):
+    """Monta o índice do autocompletar em segundo plano assim que o worker sobe"""
+    from escola.autocompletar import autocompletar
+    autocompletar.aquecer()
@@ -12,7 +12,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from decouple import config, Csv
+from django.contrib.messages import constants as message_constants
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -45,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Só atua com ESCOLA_INSTRUMENTACAO ligada; desligado, o Django o descarta
+    'escola.instrumentacao.InstrumentacaoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Para servir arquivos estáticos
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -73,19 +77,140 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'sistema_escolar.wsgi.application'
+ASGI_APPLICATION = 'sistema_escolar.asgi.application'
+
+# Views assíncronas nas páginas de leitura mais acessadas (dashboard, listas,
+# autocompletar). Desligadas por padrão, inclusive com SERVIDOR=asgi: ligue só
+# junto com o servidor ASGI, já que sob WSGI cada requisição a uma view
+# assíncrona precisaria de um loop de eventos.
+ESCOLA_VIEWS_ASSINCRONAS = config('ESCOLA_VIEWS_ASSINCRONAS', default=False, cast=bool)
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
-
-DATABASES = {
-    'default': {
+#
+# SQLite por padrão. Com DB_ENGINE=postgresql os dados de acesso vêm de
+# DB_NAME, DB_USER, DB_PASSWORD, DB_HOST e DB_PORT.
+#
+# O alias "leitura" é usado pelos relatórios e exportações: no SQLite abre
+# o mesmo arquivo somente para leitura; no PostgreSQL pode apontar para uma
+# réplica (DB_LEITURA_HOST) e sempre abre transações somente leitura.
+
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+# Segundos que cada worker mantém a conexão aberta entre requisições
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=600, cast=int)
+
+if DB_ENGINE == 'postgresql':
+    _banco = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': config('DB_NAME', default='sistema_escolar'),
+        'USER': config('DB_USER', default='postgres'),
+        'PASSWORD': config('DB_PASSWORD', default=''),
+        'HOST': config('DB_HOST', default='localhost'),
+        'PORT': config('DB_PORT', default='5432'),
+        'OPTIONS': {},
+    }
+    if config('DB_POOL', default=False, cast=bool):
+        # Pool de conexões do psycopg 3 (pip install "psycopg[pool]");
+        # substitui as conexões persistentes
+        _banco['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX', default=10, cast=int),
+        }
+        DB_CONN_MAX_AGE = 0
+    _leitura = {
+        **_banco,
+        'HOST': config('DB_LEITURA_HOST', default=_banco['HOST']),
+        'OPTIONS': {**_banco['OPTIONS'], 'options': '-c default_transaction_read_only=on'},
+    }
+else:
+    _arquivo = Path(config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3'))).resolve()
+    _banco = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': _arquivo,
+        'OPTIONS': {
+            # A transação já começa com o lock de escrita: com WAL, duas
+            # transações que leem e depois escrevem esperam o busy_timeout
+            # em vez de falhar com "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
+    _leitura = {**_banco, 'NAME': f'{_arquivo.as_uri()}?mode=ro', 'OPTIONS': {}}
+
+DATABASES = {
+    'default': {**_banco, 'CONN_MAX_AGE': DB_CONN_MAX_AGE, 'CONN_HEALTH_CHECKS': True},
+    'leitura': {
+        **_leitura,
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        # Nos testes usa o próprio banco default
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+# PRAGMAs aplicados a cada conexão SQLite (veja escola/banco.py)
+ESCOLA_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': config('DB_SQLITE_BUSY_TIMEOUT', default=5000, cast=int),
+    'mmap_size': config('DB_SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    # Negativo: tamanho em KiB (aqui, 64 MiB por conexão)
+    'cache_size': config('DB_SQLITE_CACHE_SIZE', default=-64000, cast=int),
+    'temp_store': 'MEMORY',
 }
 
 
+# Cache
+# CACHE_BACKEND escolhe onde ficam os dados em cache (dashboard, recibos,
+# versão do autocompletar, listas de escola.em_cache):
+#   memoria (padrão): na memória de cada processo; os workers não compartilham
+#   arquivo: arquivos em CACHE_DIR, compartilhados pelos workers da máquina
+#   banco: tabela CACHE_TABELA do banco (crie com python manage.py createcachetable)
+#   redis: servidor em REDIS_URL (pip install redis); escolhido sempre que REDIS_URL é definida
+# O padrão do Django (memória local) guarda só 300 itens; os recibos em lote
+# precisam de espaço para um mês inteiro de mensalidades pagas.
+
+REDIS_URL = config('REDIS_URL', default='')
+CACHE_BACKEND = 'redis' if REDIS_URL else config('CACHE_BACKEND', default='memoria')
+_limite_cache = {'MAX_ENTRIES': config('ESCOLA_CACHE_MAX_ENTRIES', default=10000, cast=int)}
+
+if CACHE_BACKEND == 'redis':
+    _cache = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+elif CACHE_BACKEND == 'arquivo':
+    _cache = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'sistema_escolar_cache')),
+        'OPTIONS': _limite_cache,
+    }
+elif CACHE_BACKEND == 'banco':
+    _cache = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': config('CACHE_TABELA', default='escola_cache'),
+        'OPTIONS': _limite_cache,
+    }
+elif CACHE_BACKEND == 'memoria':
+    _cache = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': _limite_cache,
+    }
+else:
+    raise ValueError(f'CACHE_BACKEND inválido: {CACHE_BACKEND}. Use memoria, arquivo, banco ou redis')
+
+CACHES = {'default': _cache}
+
+# Tempo de vida (segundos) das listas guardadas por escola.em_cache (anos das
+# mensalidades, turmas); elas também são invalidadas pelos signals
+ESCOLA_CACHE_TTL = config('ESCOLA_CACHE_TTL', default=3600, cast=int)
+
+# Com o cache de cada processo (memoria) a versão do autocompletar não chega
+# aos outros workers: cada um remonta o índice, em segundo plano, a cada
+# tantos segundos (0 desliga)
+ESCOLA_AUTOCOMPLETAR_TTL = config('ESCOLA_AUTOCOMPLETAR_TTL', default=300, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -137,6 +262,9 @@ LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
 
+# Mensagens de erro com a classe alert-danger do Bootstrap
+MESSAGE_TAGS = {message_constants.ERROR: 'danger'}
+
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -146,7 +274,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'escola.paginacao.PaginacaoApi',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -158,3 +286,56 @@ REST_FRAMEWORK = {
 # Configuração de arquivos estáticos para produção
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# Paginação por chave das listagens web (alunos e mensalidades)
+ESCOLA_TAMANHO_PAGINA = config('ESCOLA_TAMANHO_PAGINA', default=50, cast=int)
+ESCOLA_TAMANHO_PAGINA_MAXIMO = config('ESCOLA_TAMANHO_PAGINA_MAXIMO', default=200, cast=int)
+
+# Medição de tempo e SQL por requisição (escola/instrumentacao.py): cabeçalho
+# Server-Timing, log JSON em escola.instrumentacao e percentis por view em
+# /estatisticas/requisicoes/ (somente equipe). A janela é a quantidade de
+# requisições recentes de cada view usadas nos percentis, por processo.
+ESCOLA_INSTRUMENTACAO = config('ESCOLA_INSTRUMENTACAO', default=False, cast=bool)
+ESCOLA_INSTRUMENTACAO_JANELA = config('ESCOLA_INSTRUMENTACAO_JANELA', default=1000, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'escola.instrumentacao': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Tempo máximo (em segundos) que os dados do dashboard ficam em cache.
+# O cache também é invalidado sempre que alunos, turmas ou mensalidades mudam.
+ESCOLA_DASHBOARD_CACHE_TTL = config('ESCOLA_DASHBOARD_CACHE_TTL', default=300, cast=int)
+
+# Paginação por cursor da API (?paginacao=cursor), usada pelas sincronizações
+ESCOLA_API_CURSOR_PAGE_SIZE = config('ESCOLA_API_CURSOR_PAGE_SIZE', default=100, cast=int)
+ESCOLA_API_CURSOR_MAX_PAGE_SIZE = config('ESCOLA_API_CURSOR_MAX_PAGE_SIZE', default=1000, cast=int)
+
+# Quantidade de linhas lidas do banco por vez nas exportações em streaming
+ESCOLA_EXPORTACAO_CHUNK_SIZE = config('ESCOLA_EXPORTACAO_CHUNK_SIZE', default=2000, cast=int)
+
+# Linhas do arquivo de retorno bancário processadas por lote na conciliação
+ESCOLA_CONCILIACAO_CHUNK_SIZE = config('ESCOLA_CONCILIACAO_CHUNK_SIZE', default=1000, cast=int)
+
+# Linhas da planilha processadas por lote na importação de alunos
+ESCOLA_IMPORTACAO_CHUNK_SIZE = config('ESCOLA_IMPORTACAO_CHUNK_SIZE', default=1000, cast=int)
+
+# Alunos recalculados por consulta ao atualizar os resumos financeiros
+ESCOLA_RESUMOS_CHUNK_SIZE = config('ESCOLA_RESUMOS_CHUNK_SIZE', default=500, cast=int)
+
+# Recibos em lote: processos que renderizam os recibos (1 = no próprio processo),
+# mensalidades lidas por bloco e tempo de vida (segundos) de cada recibo no cache
+ESCOLA_RECIBOS_WORKERS = config('ESCOLA_RECIBOS_WORKERS', default=1, cast=int)
+ESCOLA_RECIBOS_CHUNK_SIZE = config('ESCOLA_RECIBOS_CHUNK_SIZE', default=500, cast=int)
+ESCOLA_RECIBOS_CACHE_TTL = config('ESCOLA_RECIBOS_CACHE_TTL', default=7 * 24 * 3600, cast=int)
+
+# Miniaturas das fotos dos alunos: threads que as geram após o upload
+# (0 = na própria requisição) e formato (WEBP ou JPEG)
+ESCOLA_MINIATURAS_WORKERS = config('ESCOLA_MINIATURAS_WORKERS', default=2, cast=int)
+ESCOLA_MINIATURAS_FORMATO = config('ESCOLA_MINIATURAS_FORMATO', default='WEBP')